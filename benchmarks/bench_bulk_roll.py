@@ -0,0 +1,38 @@
+# Benchmark of rolling dice one at a time against the bulk `MultiDie.roll_bulk` path.
+#
+# NOTE: `MultiDie.roll` takes the bulk path itself for enough dice, so the per-die side rolls
+#       each die explicitly, the way `roll` does for a few dice, rather than calling it.
+#
+# Usage: python benchmarks/bench_bulk_roll.py [iterations]
+import sys
+import timeit
+
+from discord_lab.dice import DieType, MultiDie
+
+MULTI_DICE = [
+    MultiDie(DieType.D20, 1),
+    MultiDie(DieType.D6, 3),
+    MultiDie(DieType.D6, 100),
+    MultiDie(DieType.D100, 100),
+    MultiDie(DieType.D6, 10_000),
+]
+
+
+def roll_per_die(multi_die: MultiDie) -> int:
+    rolls = [multi_die.type.roll() for _ in range(multi_die.multiplier)]
+    return sum(r.value for r in rolls)
+
+
+def main(iterations: int) -> None:
+    print(f"{'dice':<10} {'per-die usec':>12} {'bulk usec':>10} {'speedup':>8}")
+
+    for multi_die in MULTI_DICE:
+        number = max(1, iterations // multi_die.multiplier)
+        per_die_usecs = timeit.timeit(lambda: roll_per_die(multi_die), number=number) / number * 1_000_000
+        bulk_usecs = timeit.timeit(lambda: multi_die.roll_bulk().value, number=number) / number * 1_000_000
+
+        print(f"{str(multi_die):<10} {per_die_usecs:>12.1f} {bulk_usecs:>10.1f} {per_die_usecs / bulk_usecs:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
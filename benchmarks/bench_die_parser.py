@@ -0,0 +1,37 @@
+# Micro-benchmark of the pyparsing and hand-written die expression parsers.
+#
+# Usage: python benchmarks/bench_die_parser.py [iterations]
+import sys
+import timeit
+
+from discord_lab.dice import DieExprParser, DieExprScanParser
+
+EXPR_STRS = [
+    'D20',
+    '2D6 + 1 (STR)',
+    'D20 - 2 (INT) + D4 (Acid) + 2D6 (Fire)',
+    '10D100 - 3D6 + 4',
+]
+
+
+def main(iterations: int) -> None:
+    parsers = {
+        'pyparsing': DieExprParser(),
+        'scan': DieExprScanParser(),
+    }
+
+    print(f"{'expression':<42} {'parser':<10} {'usec/parse':>10} {'speedup':>8}")
+
+    for expr_str in EXPR_STRS:
+        baseline = None
+
+        for name, parser in parsers.items():
+            secs = timeit.timeit(lambda: parser.parse(expr_str), number=iterations)
+            usecs = secs / iterations * 1_000_000
+            baseline = baseline or usecs
+
+            print(f"{expr_str:<42} {name:<10} {usecs:>10.2f} {baseline / usecs:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,63 @@
+# Micro-benchmark of serializing the askroll message and adjust modal from dicts, as the
+# handlers used to, against rendering them from their pre-serialized templates.
+#
+# Usage: python benchmarks/bench_response_templates.py [iterations]
+import os
+import sys
+import timeit
+
+STATE_CUSTOM_ID = 'roll_click:Ab3dEf6hIj0~1a2b3c4d5e6f7~-~12~D20 + 2 (DEX)~+1 (Bless)'
+
+FIELDS = [
+    {'name': 'Player', 'value': '<@1200000000000000002>', 'inline': True},
+    {'name': 'Dice', 'value': 'D20 + 2 (DEX)', 'inline': True},
+    {'name': 'Must Beat', 'value': 12, 'inline': True},
+]
+
+
+def main(iterations: int) -> None:
+    from discord_lab.interactions import jsonio
+    from discord_lab.interactions.aws_lambda import ADJUST_ROLL_MODAL, ASKROLL_RESPONSE
+
+    cases = {
+        'askroll': (ASKROLL_RESPONSE, {
+            'description': 'Make a stealth check',
+            'image': {'url': 'https://cdn.discordapp.com/attachments/1/2/map.png'},
+            'fields': FIELDS,
+            'special_roll_types_custom_id': STATE_CUSTOM_ID.replace('roll_click', 'special_roll_types'),
+            'roll_click_custom_id': STATE_CUSTOM_ID,
+            'adjust_roll_click_custom_id': STATE_CUSTOM_ID.replace('roll_click', 'adjust_roll_click'),
+        }),
+        'adjust_roll_click': (ADJUST_ROLL_MODAL, {
+            'custom_id': STATE_CUSTOM_ID.replace('roll_click', 'adjust_roll_save'),
+            'value': '+1 (Bless)',
+        }),
+    }
+
+    print(f'backend: {jsonio.BACKEND}')
+    print(f"{'response':<20} {'bytes':>6} {'dumps usec':>10} {'render usec':>11} {'saved usec':>10} {'speedup':>8}")
+
+    for name, (template, values) in cases.items():
+        res_body = template.fill(**values)
+        res_body_str = template.render(**values)
+        assert res_body_str == jsonio.dumps(res_body)
+
+        dumps_usecs = timeit.timeit(lambda: jsonio.dumps(res_body), number=iterations) / iterations * 1_000_000
+        render_usecs = timeit.timeit(lambda: template.render(**values), number=iterations) / iterations * 1_000_000
+
+        print(
+            f'{name:<20} {len(res_body_str.encode()):>6} {dumps_usecs:>10.2f} {render_usecs:>11.2f} '
+            f'{dumps_usecs - render_usecs:>10.2f} {dumps_usecs / render_usecs:>7.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    # Must all be set before the handler module, and its settings, are imported
+    os.environ.update(
+        DISCORD_APP_ID=os.environ.get('DISCORD_APP_ID', '1'),
+        DISCORD_APP_PUBLIC_KEY=os.environ.get('DISCORD_APP_PUBLIC_KEY', '00' * 32),
+        DISCORD_APP_BOT_AUTH_TOKEN=os.environ.get('DISCORD_APP_BOT_AUTH_TOKEN', 'bench'),
+        DISCORD_OAUTH2_CLIENT_SECRET=os.environ.get('DISCORD_OAUTH2_CLIENT_SECRET', 'bench'),
+    )
+
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,139 @@
+# Reports cold start import cost of `aws_lambda.handler`, per interaction type.
+#
+# Each scenario runs in a fresh interpreter under `python -X importtime`, imports the handler
+# module, and handles one signed interaction. DynamoDB calls are answered from a botocore
+# `before-call` hook, so no AWS access is needed, but boto3 is imported and its client built
+# for real.
+#
+# Usage: python benchmarks/importtime_handler.py [--top N]
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from nacl.signing import SigningKey
+
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+INTERACTIONS: dict[str, dict] = {
+    'ping': {
+        'type': 1,
+    },
+    'roll': {
+        'type': 2,
+        'data': {'name': 'roll', 'options': [{'name': 'dice', 'value': '2D6 + 1 (STR)'}]},
+    },
+    'askroll': {
+        'type': 2,
+        'id': '1300000000000000001',
+        'member': {'user': {'id': '1200000000000000001'}},
+        'data': {
+            'name': 'askroll',
+            'options': [
+                {'name': 'user', 'value': '1200000000000000002'},
+                {'name': 'dice', 'value': 'D20 + 2 (DEX)'},
+            ],
+        },
+    },
+    'adjust_roll_click': {
+        'type': 3,
+        'member': {'user': {'id': '1200000000000000002'}},
+        'message': {'interaction': {'id': '1300000000000000001', 'name': 'askroll'}},
+        'data': {'custom_id': 'adjust_roll_click'},
+    },
+}
+
+# DynamoDB responses to stub out, per interaction type
+DYNAMODB_RESPONSES: dict[str, list[tuple[str, dict]]] = {
+    'askroll': [('PutItem', {})],
+    'adjust_roll_click': [('GetItem', {'Item': {'interaction_id': {'N': '1300000000000000001'}}})],
+}
+
+SCENARIO_CODE = '''
+import json, os
+from discord_lab.interactions import aws_lambda
+
+class StubHttpResponse:
+    status_code = 200
+
+stubbed_calls = iter(json.loads(os.environ['BENCH_DYNAMODB_RESPONSES']))
+def stub_dynamodb_call(model, **kwargs):
+    operation, response = next(stubbed_calls)
+    assert model.name == operation, f'Expected {operation}, got {model.name}'
+    return StubHttpResponse(), response
+
+# Only touch DynamoDB for the scenarios that use it, so the client isn't built for the others
+if os.environ['BENCH_DYNAMODB_RESPONSES'] != '[]':
+    aws_lambda.dynamodb_client().meta.events.register('before-call.dynamodb', stub_dynamodb_call)
+
+result = aws_lambda.handler(json.loads(os.environ['BENCH_EVENT']), None)
+assert result['statusCode'] == 200, result
+'''
+
+
+def signed_event(signing_key: SigningKey, req_body: dict) -> dict:
+    body = json.dumps(req_body)
+    timestamp = str(int(time.time()))
+    signature = signing_key.sign(f'{timestamp}{body}'.encode()).signature.hex()
+
+    return {
+        'headers': {
+            'x-signature-ed25519': signature,
+            'x-signature-timestamp': timestamp,
+        },
+        'body': body,
+    }
+
+
+def run_scenario(name: str, signing_key: SigningKey) -> tuple[float, list[tuple[int, int, str]]]:
+    env = dict(
+        os.environ,
+        DISCORD_APP_ID=os.environ.get('DISCORD_APP_ID', '1'),
+        DISCORD_APP_PUBLIC_KEY=signing_key.verify_key.encode().hex(),
+        DISCORD_APP_BOT_AUTH_TOKEN=os.environ.get('DISCORD_APP_BOT_AUTH_TOKEN', 'bench'),
+        DISCORD_OAUTH2_CLIENT_SECRET=os.environ.get('DISCORD_OAUTH2_CLIENT_SECRET', 'bench'),
+        AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+        AWS_ACCESS_KEY_ID=os.environ.get('AWS_ACCESS_KEY_ID', 'bench'),
+        AWS_SECRET_ACCESS_KEY=os.environ.get('AWS_SECRET_ACCESS_KEY', 'bench'),
+        BENCH_EVENT=json.dumps(signed_event(signing_key, INTERACTIONS[name])),
+        BENCH_DYNAMODB_RESPONSES=json.dumps(DYNAMODB_RESPONSES.get(name, [])),
+    )
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', SCENARIO_CODE], env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    if proc.returncode != 0:
+        raise RuntimeError(f'Scenario `{name}` failed:\n{proc.stderr[-2000:]}')
+
+    # Only top-level imports, so nested imports aren't counted twice
+    top_level_imports = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match and len(match.group(3)) == 1:
+            top_level_imports.append((int(match.group(1)), int(match.group(2)), match.group(4)))
+
+    return wall_ms, top_level_imports
+
+
+def main(top: int) -> None:
+    signing_key = SigningKey.generate()
+
+    for name in INTERACTIONS:
+        wall_ms, imports = run_scenario(name, signing_key)
+        import_ms = sum(cumulative for _, cumulative, _ in imports) / 1000
+
+        print(f'== {name}: {import_ms:.1f} ms importing, {wall_ms:.1f} ms wall')
+        for _, cumulative, module in sorted(imports, key=lambda i: i[1], reverse=True)[:top]:
+            print(f'   {cumulative / 1000:>8.1f} ms  {module}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--top', type=int, default=8, help='Slowest top-level imports to list per scenario')
+    args = arg_parser.parse_args()
+
+    main(args.top)
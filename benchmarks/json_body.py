@@ -0,0 +1,126 @@
+# Micro-benchmark of parsing interaction request bodies and serializing responses, on the
+# recorded askroll flows (see `benchmarks/flows/`).
+#
+# Each flow is replayed through `aws_lambda.handle_interaction` once, to get the exact bodies
+# Discord would send for each step, rendered messages and all, and the responses to them. Then
+# each step's parse and serialize are timed with the standard library defaults the handler used
+# to use, and with `jsonio` and its current backend. Deferred steps are forwarded to SQS as
+# received, so the re-encode they no longer do is timed too.
+#
+# Usage: python benchmarks/json_body.py [--iterations N] [FLOW ...]
+import argparse
+import io
+import json
+import os
+from pathlib import Path
+import timeit
+from typing import Any
+
+from load_handler import DEFAULT_FLOWS, FIRST_INTERACTION_ID, component_custom_ids, fill_template
+
+
+def record_flow(handle_interaction: Any, flow: dict, interaction_id: str) -> list[tuple[str, str, dict]]:
+    steps = []
+    message = None
+    custom_ids: dict[str, str] = {}
+
+    for step in flow['steps']:
+        req_body = fill_template(step['request'], interaction_id, message)
+
+        data = req_body.get('data', {})
+        if 'custom_id' in data:
+            data['custom_id'] = custom_ids.get(data['custom_id'], data['custom_id'])
+
+        # As Discord sends them, without spaces
+        req_body_str = json.dumps(req_body, separators=(',', ':'))
+        res_code, res_body_str = handle_interaction({}, req_body_str)
+        if res_code != 200:
+            raise RuntimeError(f'Step {step["name"]} of flow {flow["command"]} failed with {res_code}: {res_body_str}')
+
+        res_body = json.loads(res_body_str)
+        steps.append((step['name'], req_body_str, res_body))
+
+        if res_body['type'] in (4, 7):
+            message = {
+                'interaction': {'id': interaction_id, 'name': flow['command']},
+                'embeds': res_body['data']['embeds'],
+                'components': res_body['data']['components'],
+            }
+            custom_ids = component_custom_ids(message['components'])
+        elif res_body['type'] == 9:
+            custom_ids = {**custom_ids, **component_custom_ids([{'components': [res_body['data']]}])}
+
+    return steps
+
+
+def usecs(func: Any, iterations: int) -> float:
+    return timeit.timeit(func, number=iterations) / iterations * 1_000_000
+
+
+def main(flow_paths: list[str], iterations: int) -> None:
+    from discord_lab.interactions import aws_lambda, jsonio
+
+    aws_lambda.DEV_MODE = True
+    aws_lambda.request_logger.stream = io.StringIO()
+
+    steps = []
+    for i, path in enumerate(flow_paths):
+        flow = json.loads(Path(path).read_text())
+        steps += record_flow(aws_lambda.handle_interaction, flow, str(FIRST_INTERACTION_ID + i))
+
+    print(f'backend: {jsonio.BACKEND}, {iterations} iterations per step')
+    print(
+        f"{'step':<20} {'req B':>6} {'res B':>6} {'new B':>6} "
+        f"{'parse us':>8} {'new us':>8} {'dumps us':>8} {'new us':>8} {'saved us':>8} {'defer us':>8}"
+    )
+
+    totals = [0.0] * 7
+    for step_name, req_body_str, res_body in steps:
+        req_body = json.loads(req_body_str)
+        old_res_str = json.dumps(res_body)
+        new_res_str = jsonio.dumps(res_body)
+
+        row = [
+            len(req_body_str.encode()),
+            len(old_res_str.encode()),
+            len(new_res_str.encode()),
+            usecs(lambda: json.loads(req_body_str), iterations),
+            usecs(lambda: jsonio.loads(req_body_str), iterations),
+            usecs(lambda: json.dumps(res_body), iterations),
+            usecs(lambda: jsonio.dumps(res_body), iterations),
+        ]
+        saved = row[3] + row[5] - row[4] - row[6]
+        defer_saved = usecs(lambda: json.dumps(req_body), iterations)
+
+        print(
+            f'{step_name:<20} {row[0]:>6} {row[1]:>6} {row[2]:>6} '
+            f'{row[3]:>8.2f} {row[4]:>8.2f} {row[5]:>8.2f} {row[6]:>8.2f} {saved:>8.2f} {defer_saved:>8.2f}'
+        )
+        totals = [total + value for total, value in zip(totals, row)]
+
+    n = len(steps)
+    saved = (totals[3] + totals[5] - totals[4] - totals[6]) / n
+    print(
+        f"{'mean':<20} {totals[0] / n:>6.0f} {totals[1] / n:>6.0f} {totals[2] / n:>6.0f} "
+        f'{totals[3] / n:>8.2f} {totals[4] / n:>8.2f} {totals[5] / n:>8.2f} {totals[6] / n:>8.2f} {saved:>8.2f}'
+    )
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('flows', nargs='*', default=DEFAULT_FLOWS, help='Recorded flow files to replay')
+    arg_parser.add_argument('--iterations', type=int, default=20_000, help='Times to time each parse and serialize')
+    args = arg_parser.parse_args()
+
+    # Must all be set before the handler module, and its settings, are imported
+    os.environ.update(
+        DISCORD_APP_ID=os.environ.get('DISCORD_APP_ID', '1'),
+        DISCORD_APP_PUBLIC_KEY=os.environ.get('DISCORD_APP_PUBLIC_KEY', '00' * 32),
+        DISCORD_APP_BOT_AUTH_TOKEN=os.environ.get('DISCORD_APP_BOT_AUTH_TOKEN', 'bench'),
+        DISCORD_OAUTH2_CLIENT_SECRET=os.environ.get('DISCORD_OAUTH2_CLIENT_SECRET', 'bench'),
+        DYNAMODB_BACKEND='memory',
+        DYNAMODB_MEMORY_LATENCY_MS='0',
+        DYNAMODB_MEMORY_LATENCY_JITTER_MS='0',
+    )
+
+    main(args.flows, args.iterations)
@@ -0,0 +1,190 @@
+# Load test of `aws_lambda.handler` against the in-memory DynamoDB stand-in.
+#
+# Replays recorded interaction flows (see `benchmarks/flows/`) at a target request rate, each
+# flow with its own interaction id, and reports p50/p95/p99 handler latency per step. Each step
+# is signed and verified for real, and component steps are sent the message from the previous
+# step's response, just like Discord would. Flows start open-loop, so a slow handler doesn't
+# lower the offered load.
+#
+# NOTE: All flows share one process, so they share the container's item cache and write-behind
+#       queue, where in Lambda each container handles one request at a time.
+#
+# Usage: python benchmarks/load_handler.py [--rps N] [--duration SECS] [--latency-ms MS] [--jitter-ms MS] [--error-rate RATE] [FLOW ...]
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import json
+from math import ceil
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Any, Callable
+
+from nacl.signing import SigningKey
+
+DEFAULT_FLOWS = sorted(str(p) for p in (Path(__file__).parent / 'flows').glob('*.json'))
+
+FIRST_INTERACTION_ID = 1_300_000_000_000_000_000
+
+
+def signed_event(signing_key: SigningKey, req_body: dict) -> dict:
+    body = json.dumps(req_body)
+    timestamp = str(int(time.time()))
+    signature = signing_key.sign(f'{timestamp}{body}'.encode()).signature.hex()
+
+    return {
+        'headers': {
+            'x-signature-ed25519': signature,
+            'x-signature-timestamp': timestamp,
+        },
+        'body': body,
+    }
+
+
+def fill_template(template: Any, interaction_id: str, message: dict|None) -> Any:
+    match template:
+        case '{message}':
+            return message
+        case str():
+            return template.replace('{interaction_id}', interaction_id)
+        case dict():
+            return {k: fill_template(v, interaction_id, message) for k, v in template.items()}
+        case list():
+            return [fill_template(v, interaction_id, message) for v in template]
+        case _:
+            return template
+
+
+def component_custom_ids(action_rows: list[dict]) -> dict[str, str]:
+    return {c['custom_id'].partition(':')[0]: c['custom_id'] for row in action_rows for c in row['components']}
+
+
+def run_flow(handler: Callable, signing_key: SigningKey, flow: dict, interaction_id: str) -> list[tuple[str, float, bool]]:
+    results = []
+    message = None
+    custom_ids: dict[str, str] = {}
+
+    for step in flow['steps']:
+        req_body = fill_template(step['request'], interaction_id, message)
+
+        # Click what the last response showed, state and all, like Discord would
+        data = req_body.get('data', {})
+        if 'custom_id' in data:
+            data['custom_id'] = custom_ids.get(data['custom_id'], data['custom_id'])
+
+        event = signed_event(signing_key, req_body)
+
+        start = time.perf_counter()
+        try:
+            result = handler(event, None)
+            ok = result['statusCode'] == 200
+        except Exception:
+            ok = False
+        latency_secs = time.perf_counter() - start
+
+        results.append((step['name'], latency_secs, ok))
+        if not ok:
+            break
+
+        # Later steps are clicks on the message as of the last response that changed it
+        res_body = json.loads(result['body'])
+        if res_body['type'] in (4, 7):
+            message = {
+                'interaction': {'id': interaction_id, 'name': flow['command']},
+                'embeds': res_body['data']['embeds'],
+                'components': res_body['data']['components'],
+            }
+            custom_ids = component_custom_ids(message['components'])
+        elif res_body['type'] == 9:
+            custom_ids = {**custom_ids, **component_custom_ids([{'components': [res_body['data']]}])}
+
+    return results
+
+
+def percentile_ms(latencies: list[float], pct: float) -> float:
+    # Nearest-rank percentile
+    ordered = sorted(latencies)
+    return ordered[max(1, ceil(len(ordered) * pct / 100)) - 1] * 1000
+
+
+def main(flow_paths: list[str], rps: float, duration_secs: float, concurrency: int) -> None:
+    signing_key = SigningKey.generate()
+    os.environ['DISCORD_APP_PUBLIC_KEY'] = signing_key.verify_key.encode().hex()
+
+    from discord_lab.interactions import aws_lambda
+
+    flows = [json.loads(Path(path).read_text()) for path in flow_paths]
+    steps_per_flow = sum(len(flow['steps']) for flow in flows) / len(flows)
+    flow_count = max(1, round(rps * duration_secs / steps_per_flow))
+    flow_interval_secs = duration_secs / flow_count
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+
+    # The handler logs a line for every request, which would swamp the report
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            for i in range(flow_count):
+                delay = start + i * flow_interval_secs - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+                flow = flows[i % len(flows)]
+                futures.append(executor.submit(run_flow, aws_lambda.handler, signing_key, flow, str(FIRST_INTERACTION_ID + i)))
+
+            for future in futures:
+                for step_name, latency_secs, ok in future.result():
+                    latencies[step_name].append(latency_secs)
+                    if not ok:
+                        errors[step_name] += 1
+        elapsed_secs = time.perf_counter() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    request_count = sum(len(step_latencies) for step_latencies in latencies.values())
+    print(f'{flow_count} flows, {request_count} requests in {elapsed_secs:.1f}s ({request_count / elapsed_secs:.1f} req/s, target {rps:g})')
+    print(f"{'step':<20} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+    all_latencies = [latency for step_latencies in latencies.values() for latency in step_latencies]
+    for step_name, step_latencies in [*latencies.items(), ('all', all_latencies)]:
+        step_errors = errors[step_name] if step_name != 'all' else sum(errors.values())
+        print(
+            f'{step_name:<20} {len(step_latencies):>6} {step_errors:>6} '
+            f'{percentile_ms(step_latencies, 50):>8.2f} {percentile_ms(step_latencies, 95):>8.2f} {percentile_ms(step_latencies, 99):>8.2f}'
+        )
+
+    db_stats = aws_lambda.dynamodb_client().stats
+    write_stats = aws_lambda.askroll_writes.stats
+    print(f'dynamodb: {db_stats.calls} calls, {db_stats.injected_errors} injected errors, {db_stats.conditional_check_failures} conditional check failures')
+    print(f'writes: {write_stats.written} written, {write_stats.coalesced} coalesced, {write_stats.retried} retried, {write_stats.dropped} dropped, flush p95 {write_stats.flush_ms(95):.2f} ms')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('flows', nargs='*', default=DEFAULT_FLOWS, help='Recorded flow files to replay')
+    arg_parser.add_argument('--rps', type=float, default=50, help='Target requests per second')
+    arg_parser.add_argument('--duration', type=float, default=10, help='Seconds to offer load for')
+    arg_parser.add_argument('--concurrency', type=int, default=16, help='Flows in flight at once, at most')
+    arg_parser.add_argument('--latency-ms', type=float, default=5, help='Latency added to every DynamoDB call')
+    arg_parser.add_argument('--jitter-ms', type=float, default=5, help='Up to this much more random latency per DynamoDB call')
+    arg_parser.add_argument('--error-rate', type=float, default=0, help='Fraction of DynamoDB calls that fail with throttling errors')
+    args = arg_parser.parse_args()
+
+    # Must all be set before the handler module, and its settings, are imported
+    os.environ.update(
+        DISCORD_APP_ID=os.environ.get('DISCORD_APP_ID', '1'),
+        DISCORD_APP_BOT_AUTH_TOKEN=os.environ.get('DISCORD_APP_BOT_AUTH_TOKEN', 'bench'),
+        DISCORD_OAUTH2_CLIENT_SECRET=os.environ.get('DISCORD_OAUTH2_CLIENT_SECRET', 'bench'),
+        DYNAMODB_BACKEND='memory',
+        DYNAMODB_MEMORY_LATENCY_MS=str(args.latency_ms),
+        DYNAMODB_MEMORY_LATENCY_JITTER_MS=str(args.jitter_ms),
+        DYNAMODB_MEMORY_ERROR_RATE=str(args.error_rate),
+    )
+
+    main(args.flows, args.rps, args.duration, args.concurrency)
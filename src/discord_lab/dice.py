@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+from array import array
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
 from enum import Enum, IntEnum
+from functools import cache, cached_property
 import re
-from secrets import randbelow
-from typing import override, ClassVar
+from secrets import randbelow, token_bytes
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, override, ClassVar
 
-from pyparsing import CaselessLiteral, Combine, Optional, ParseException, ParseResults, Suppress, ZeroOrMore, alphas, nums, Literal, Word
+from discord_lab.tracing import traced
+
+if TYPE_CHECKING:
+    from pyparsing import ParseResults
+
+    from discord_lab.distribution import Distribution
+    from discord_lab.simulation import RollStats
 
 
 class DieParseException(Exception):
@@ -31,6 +41,36 @@ class DieType(IntEnum):
     def roll(self) -> DieRoll:
         return DieRoll(randbelow(self) + 1, self)
 
+    def roll_bulk(self, count: int) -> BulkDieRoll:
+        return BulkDieRoll(self, sample_die_values(self, count))
+
+
+@cache
+def _byte_sampling_tables(sides: int) -> tuple[bytes, bytes]:
+    # Only bytes below the largest multiple of `sides` are kept, so every face is equally
+    # likely. Kept bytes are mapped straight to a face value, rejected ones are deleted.
+    limit = 256 - 256 % sides
+    faces = bytes((b % sides) + 1 if b < limit else 0 for b in range(256))
+    rejected = bytes(range(limit, 256))
+
+    return faces, rejected
+
+
+def sample_die_values(sides: int, count: int, randbytes: Callable[[int], bytes] = token_bytes) -> array[int]:
+    faces, rejected = _byte_sampling_tables(sides)
+    acceptance = (256 - len(rejected)) / 256
+    values = array('B')
+
+    # Rejection sampling over whole buffers of random bytes. `bytes.translate` does the
+    # rejecting and mapping in one C-level pass, instead of one `randbelow` call per die.
+    while len(values) < count:
+        needed = count - len(values)
+        values.frombytes(randbytes(int(needed / acceptance) + 8).translate(faces, rejected))
+
+    del values[count:]
+
+    return values
+
 
 @dataclass(frozen=True)
 class MultiDieRoll:
@@ -39,6 +79,28 @@ class MultiDieRoll:
     details: list[DieRoll]
 
 
+# Compact, array-backed roll of many dice of a single type. Has the same `value` and `details`
+# as `MultiDieRoll`, but only builds `DieRoll`s if `details` is actually asked for.
+@dataclass(frozen=True)
+class BulkDieRoll:
+    type: DieType
+    values: array[int]
+
+    @cached_property
+    def value(self) -> int:
+        return sum(self.values)
+
+    @property
+    def details(self) -> list[DieRoll]:
+        return [DieRoll(value, self.type) for value in self.values]
+
+    def counts(self) -> Counter[int]:
+        return Counter(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
 @dataclass(frozen=True)
 class MultiDie:
     type: DieType
@@ -48,12 +110,21 @@ class MultiDie:
         if self.multiplier < 1:
             raise ValueError(f'Die multiplier {self.multiplier} is less than 1')
 
-    def roll(self) -> MultiDieRoll:
+    # Rolls of at least this many dice take the bulk path, so they're stored as one compact
+    # array instead of a `DieRoll` per die
+    bulk_roll_min_dice: ClassVar[int] = 16
+
+    def roll(self) -> MultiDieRoll|BulkDieRoll:
+        if self.multiplier >= self.bulk_roll_min_dice:
+            return self.roll_bulk()
+
         rolls = [self.type.roll() for x in range(self.multiplier)]
         total = sum(r.value for r in rolls)
 
         return MultiDieRoll(total, rolls)
 
+    def roll_bulk(self) -> BulkDieRoll:
+        return self.type.roll_bulk(self.multiplier)
 
     @staticmethod
     def parse(multi_die_expr: str) -> MultiDie:
@@ -105,10 +176,10 @@ class Operation(Enum):
 class TermRoll:
     # FIXME: This should be calculated
     value: int
-    details: int|MultiDieRoll
+    details: int|MultiDieRoll|BulkDieRoll
 
 
-@dataclass
+@dataclass(frozen=True)
 class LabeledTerm:
     term: int|MultiDie
     label: str|None = None
@@ -135,7 +206,7 @@ class LabeledTerm:
         return _str
 
 
-@dataclass
+@dataclass(frozen=True)
 class TermOperation:
     operation: Operation
     labeled_term: LabeledTerm
@@ -161,7 +232,7 @@ class IntTermOperationResult(TermOperationResult):
 
 @dataclass
 class MultiDieTermOperationResult(TermOperationResult):
-    rolls: MultiDieRoll
+    rolls: MultiDieRoll|BulkDieRoll
 
 
 @dataclass
@@ -174,6 +245,9 @@ class DieExprRoll:
 class DieExprParser:
 
     def __init__(self):
+        # pyparsing is slow to import, so only pay for it when this parser is actually used
+        from pyparsing import CaselessLiteral, Combine, Optional, Suppress, ZeroOrMore, alphas, nums, Literal, Word
+
         d4 = Literal('4')
         d6 = Literal('6')
         d8 = Literal('8')
@@ -205,18 +279,171 @@ class DieExprParser:
 
     @staticmethod
     def tokens_to_term(tokens: ParseResults) -> LabeledTerm:
-        term = LabeledTerm(tokens[0])
         try:
-            term.label = tokens[1]
+            label = tokens[1]
         except IndexError:
-            pass
+            label = None
+
+        return LabeledTerm(tokens[0], label)
+
+    def parse(self, expr_str: str) -> DieExpr:
+        from pyparsing import ParseException
+
+        try:
+            return self.expr.parse_string(expr_str)[0]
+        except ParseException as pe:
+            raise DieParseException(f"Invalid die roll expression `{expr_str}`") from pe
 
-        return term
+
+# Regex building blocks for `DieExprScanParser`. These mirror the pyparsing grammar in
+# `DieExprParser` token for token, including its default whitespace and `max=20` label,
+# which rejects a longer run of label characters outright rather than truncating it.
+_WS = r'[ \n\t\r]*+'
+_LABELED_TERM = (
+    rf'{_WS}(?:([0-9]*+)[dD](100|20|12|10|8|6|4)|([0-9]++))'
+    rf'(?:{_WS}\({_WS}([A-Za-z _\-:]{{1,20}}+)(?![A-Za-z _\-:]){_WS}\))?'
+)
+
+# Single pass, recursive descent parser for the same grammar as `DieExprParser`, minus
+# pyparsing's per-token `ParseResults` and parse action overhead. Like `parse_string`
+# without `parse_all`, it stops at the first text it can't parse and ignores the rest.
+class DieExprScanParser:
+
+    first_term_re = re.compile(_LABELED_TERM)
+    term_op_re = re.compile(rf'{_WS}([+-]){_LABELED_TERM}')
+
+    die_type_by_sides: ClassVar[dict[str, DieType]] = {str(die_type.value): die_type for die_type in DieType}
+    op_by_symbol: ClassVar[dict[str, Operation]] = {'+': Operation.ADD, '-': Operation.SUB}
+
+    def labeled_term(self, multiplier: str|None, sides: str|None, integer: str|None, label: str|None) -> LabeledTerm:
+        if sides:
+            return LabeledTerm(MultiDie(self.die_type_by_sides[sides], int(multiplier or '1')), label)
+
+        return LabeledTerm(int(integer), label) # type: ignore[arg-type]
 
     def parse(self, expr_str: str) -> DieExpr:
-        return self.expr.parse_string(expr_str)[0]
+        # pyparsing expands tabs before parsing, which matters for labels
+        text = expr_str.expandtabs() if '\t' in expr_str else expr_str
+
+        match = self.first_term_re.match(text)
+        if not match:
+            raise DieParseException(f"Invalid die roll expression `{expr_str}`")
+
+        first_term = self.labeled_term(*match.groups())
+        term_ops = []
+        pos = match.end()
+
+        term_op_match = self.term_op_re.match
+        while match := term_op_match(text, pos):
+            op_symbol, *term_groups = match.groups()
+            term_ops.append(TermOperation(self.op_by_symbol[op_symbol], self.labeled_term(*term_groups)))
+            pos = match.end()
+
+        return DieExpr(first_term, term_ops)
 
-die_expr_parser = DieExprParser()
+die_expr_parser = DieExprScanParser()
+
+
+@dataclass(frozen=True)
+class DieExprCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    max_size: int
+
+
+# Bounded LRU cache of parsed `DieExpr`s, keyed on the normalized expression string.
+# Each `get` hands out a copy, so callers can't corrupt what's cached.
+class DieExprCache:
+
+    def __init__(self, max_size: int = 256):
+        if max_size < 0:
+            raise ValueError(f'Cache size {max_size} is less than 0')
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._exprs: OrderedDict[str, DieExpr] = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def normalize(expr_str: str) -> str:
+        # Parser skips leading whitespace and stops before trailing whitespace,
+        # so stripping both ends can never change the parse result.
+        return expr_str.strip()
+
+    def get(self, expr_str: str) -> DieExpr|None:
+        key = self.normalize(expr_str)
+
+        with self._lock:
+            expr = self._exprs.get(key)
+            if expr is None:
+                self.misses += 1
+                return None
+
+            self._exprs.move_to_end(key)
+            self.hits += 1
+
+        return expr.copy()
+
+    def put(self, expr_str: str, expr: DieExpr) -> None:
+        if not self.max_size:
+            return
+
+        key = self.normalize(expr_str)
+
+        with self._lock:
+            self._exprs[key] = expr.copy()
+            self._exprs.move_to_end(key)
+
+            while len(self._exprs) > self.max_size:
+                self._exprs.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._exprs.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> DieExprCacheStats:
+        with self._lock:
+            return DieExprCacheStats(self.hits, self.misses, self.evictions, len(self._exprs), self.max_size)
+
+    def __len__(self) -> int:
+        return len(self._exprs)
+
+die_expr_cache = DieExprCache()
+
+
+@dataclass(frozen=True)
+class DieExprCost:
+    total_dice: int
+    term_count: int
+    expr_length: int
+
+
+@dataclass(frozen=True)
+class DieExprLimits:
+    max_dice: int = 1000
+    max_terms: int = 20
+    max_expr_length: int = 256
+
+    def check_length(self, expr_str: str) -> None:
+        if len(expr_str) > self.max_expr_length:
+            raise DieParseException(f"Die roll expression is {len(expr_str)} characters long. Must be at most {self.max_expr_length}.")
+
+    def check(self, expr: DieExpr) -> None:
+        cost = expr.cost()
+
+        if cost.total_dice > self.max_dice:
+            raise DieParseException(f"`{expr}` rolls {cost.total_dice} dice. Must be at most {self.max_dice}.")
+
+        if cost.term_count > self.max_terms:
+            raise DieParseException(f"`{expr}` has {cost.term_count} terms. Must be at most {self.max_terms}.")
 
 
 @dataclass
@@ -224,15 +451,42 @@ class DieExpr:
     # TODO: Convert this over to just a single list?
     first_term: LabeledTerm
     term_ops: list[TermOperation] = field(default_factory=list)
-    parser: ClassVar[DieExprParser] = die_expr_parser
+    parser: ClassVar[DieExprParser|DieExprScanParser] = die_expr_parser
+    cache: ClassVar[DieExprCache] = die_expr_cache
+    limits: ClassVar[DieExprLimits] = DieExprLimits()
 
     @classmethod
+    @traced('DieExpr.parse')
     def parse(cls, expr_str: str) -> DieExpr:
-        try:
-            return cls.parser.parse(expr_str)
-        except ParseException as pe:
-            raise DieParseException(f"Invalid die roll expression `{expr_str}`") from pe
+        # Fail fast on anything pathological, before spending any time on it
+        cls.limits.check_length(expr_str)
+
+        expr = cls.cache.get(expr_str)
+        if expr is None:
+            try:
+                expr = cls.parser.parse(expr_str)
+            except ValueError as ve:
+                raise DieParseException(f"Invalid die roll expression `{expr_str}`. {ve}.") from ve
+
+            cls.limits.check(expr)
+            cls.cache.put(expr_str, expr)
+        else:
+            # Limits may have changed since this was cached
+            cls.limits.check(expr)
+
+        return expr
+
+    def cost(self) -> DieExprCost:
+        terms = [self.first_term.term, *(t.labeled_term.term for t in self.term_ops)]
+        total_dice = sum(term.multiplier for term in terms if isinstance(term, MultiDie))
+
+        return DieExprCost(total_dice, len(terms), len(str(self)))
+
+    def copy(self) -> DieExpr:
+        # Terms are frozen, so copying the list is enough to keep copies independent
+        return DieExpr(self.first_term, list(self.term_ops))
 
+    @traced('DieExpr.roll')
     def roll(self) -> DieExprRoll:
         first_term = self.first_term
         first_term_term = first_term.term
@@ -262,6 +516,16 @@ class DieExpr:
 
         return DieExprRoll(total, term_op_results)
 
+    def distribution(self, multi_roll_type: DieExprMultiRollType|None = None) -> Distribution:
+        from discord_lab.distribution import die_expr_distribution
+
+        return die_expr_distribution(self, multi_roll_type)
+
+    def simulate(self, n: int, seed: int|str|None = None, multi_roll_type: DieExprMultiRollType|None = None, processes: int|None = None) -> RollStats:
+        from discord_lab.simulation import simulate_die_expr
+
+        return simulate_die_expr(self, n, seed, multi_roll_type, processes)
+
     @override
     def __str__(self) -> str:
         _str = str(self.first_term)
@@ -309,3 +573,6 @@ class DieExprMultiRoll:
         roll_2 = self.die_expr.roll()
 
         return self.type.resolve(roll_1, roll_2)
+
+    def distribution(self) -> Distribution:
+        return self.die_expr.distribution(self.type)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from itertools import accumulate
+from math import fsum
+from typing import override
+
+from discord_lab.dice import DieExpr, DieExprMultiRollType, DieType, MultiDie, Operation
+
+
+def poly_mul(a: tuple[int, ...], b: tuple[int, ...]) -> tuple[int, ...]:
+    # Kronecker substitution: pack each polynomial's coefficients into one big int, with slots
+    # wide enough that no product coefficient can spill into its neighbour, then let CPython's
+    # Karatsuba big int multiply do the convolution. Coefficients must be non-negative.
+    slot_bytes = ((sum(a) * sum(b)).bit_length() + 8) // 8
+
+    packed_a = int.from_bytes(b''.join(c.to_bytes(slot_bytes, 'little') for c in a), 'little')
+    packed_b = int.from_bytes(b''.join(c.to_bytes(slot_bytes, 'little') for c in b), 'little')
+
+    product_len = len(a) + len(b) - 1
+    product_bytes = (packed_a * packed_b).to_bytes(product_len * slot_bytes, 'little')
+
+    return tuple(
+        int.from_bytes(product_bytes[i:i + slot_bytes], 'little')
+        for i in range(0, product_len * slot_bytes, slot_bytes)
+    )
+
+
+# Probabilities are convolved as fixed-point integers with this many bits after the point. That's
+# well past a float's 53, so the rounding doesn't show once they're floats again, and unlike exact
+# counts, the integers don't grow with every die convolved in.
+FIXED_POINT_BITS = 64
+
+
+def convolve(a: array[float], b: array[float]) -> array[float]:
+    one = 1 << FIXED_POINT_BITS
+    product = poly_mul(tuple(int(p * one) for p in a), tuple(int(p * one) for p in b))
+
+    # Dividing ints rounds correctly, so each is the nearest float
+    scale = one * one
+    return array('d', (c / scale for c in product))
+
+
+@dataclass(frozen=True)
+class Distribution:
+    # `probs[i]` is the probability of getting `offset + i`, in a compact array since big
+    # expressions have thousands
+    offset: int
+    probs: array[float]
+
+    @property
+    def min(self) -> int:
+        return self.offset
+
+    @property
+    def max(self) -> int:
+        return self.offset + len(self.probs) - 1
+
+    @cached_property
+    def mean(self) -> float:
+        return fsum(i * p for i, p in enumerate(self.probs)) + self.offset
+
+    def probability(self, value: int) -> float:
+        idx = value - self.offset
+        return self.probs[idx] if 0 <= idx < len(self.probs) else 0.0
+
+    def pmf(self) -> dict[int, float]:
+        return {self.offset + i: p for i, p in enumerate(self.probs) if p}
+
+    @cached_property
+    def survival(self) -> array[float]:
+        # `survival[i]` is the probability of getting `offset + i` or more
+        return array('d', accumulate(reversed(self.probs)))[::-1]
+
+    def chance_to_beat(self, target: int) -> float:
+        # "Beat" as in `roll_click`'s must-beat check, so strictly greater than
+        first_beating_idx = max(target + 1 - self.offset, 0)
+        if first_beating_idx >= len(self.probs):
+            return 0.0
+
+        return min(self.survival[first_beating_idx], 1.0)
+
+    def shift(self, amount: int) -> Distribution:
+        return Distribution(self.offset + amount, self.probs)
+
+    def best_of_2(self) -> Distribution:
+        # P(max(X1, X2) <= k) = P(X <= k)^2
+        cumulative = [c * c for c in accumulate(self.probs)]
+        return Distribution(self.offset, array('d', (c - p for c, p in zip(cumulative, [0.0] + cumulative))))
+
+    def worst_of_2(self) -> Distribution:
+        # P(min(X1, X2) >= k) = P(X >= k)^2
+        survival = [s * s for s in self.survival]
+        return Distribution(self.offset, array('d', (s - n for s, n in zip(survival, survival[1:] + [0.0]))))
+
+    def __add__(self, other: Distribution|int) -> Distribution:
+        if isinstance(other, int):
+            return self.shift(other)
+        # Constants are certain, so adding one only shifts
+        if len(other.probs) == 1:
+            return self.shift(other.offset)
+        if len(self.probs) == 1:
+            return other.shift(self.offset)
+
+        return Distribution(self.offset + other.offset, convolve(self.probs, other.probs))
+
+    def __neg__(self) -> Distribution:
+        return Distribution(-self.max, self.probs[::-1])
+
+    def __sub__(self, other: Distribution|int) -> Distribution:
+        return self + (-other)
+
+    @override
+    def __str__(self) -> str:
+        return ', '.join(f'{value}: {p:.4%}' for value, p in self.pmf().items())
+
+CONSTANT_ZERO = Distribution(0, array('d', [1.0]))
+
+# The most totals an expression's distribution may have, e.g. `100D100`'s 9,901. Convolutions
+# cost about O(n^1.6) in these, so this bounds how long a cold distribution takes.
+DISTRIBUTION_MAX_OUTCOMES = 10_001
+
+# Enough for every power along one squaring chain, up to the most dice an expression may have,
+# for each die type. Each is at most DISTRIBUTION_MAX_OUTCOMES floats, 80KB.
+MULTI_DIE_DISTRIBUTION_CACHE_SIZE = 2 * DieExpr.limits.max_dice.bit_length() * len(DieType)
+
+
+def multi_die_distribution(die_type: DieType, multiplier: int) -> Distribution:
+    # Past the limit on dice, nothing a user rolls needs it again, so it isn't memoized
+    if multiplier > DieExpr.limits.max_dice:
+        return square_multi_die_distribution(die_type, multiplier)
+
+    return cached_multi_die_distribution(die_type, multiplier)
+
+
+@lru_cache(maxsize=MULTI_DIE_DISTRIBUTION_CACHE_SIZE)
+def cached_multi_die_distribution(die_type: DieType, multiplier: int) -> Distribution:
+    return square_multi_die_distribution(die_type, multiplier)
+
+
+def square_multi_die_distribution(die_type: DieType, multiplier: int) -> Distribution:
+    # Exponentiation by squaring, memoized, so `10D100` costs 4 multiplies and every power
+    # along the way is there for the next expression that needs it.
+    if multiplier == 1:
+        return Distribution(1, array('d', [1 / die_type]) * die_type)
+
+    half = multi_die_distribution(die_type, multiplier // 2)
+    dist = half + half
+    if multiplier % 2:
+        dist = dist + multi_die_distribution(die_type, 1)
+
+    return dist
+
+
+# Whole expressions are memoized too, so repeat questions, like a must-beat preview, are answered
+# without convolving. At most DISTRIBUTION_MAX_OUTCOMES floats each, so at most 5MB in all.
+EXPR_DISTRIBUTION_CACHE_SIZE = 64
+
+
+def die_expr_distribution(die_expr: DieExpr, multi_roll_type: DieExprMultiRollType|None = None) -> Distribution:
+    # Labels don't change the math, so leave them out of the memo key
+    terms = ((Operation.ADD, die_expr.first_term.term), *((t.operation, t.labeled_term.term) for t in die_expr.term_ops))
+
+    # Checked up front, since it's the work that takes long
+    outcomes = 1 + sum(term.multiplier * (term.type - 1) for _, term in terms if isinstance(term, MultiDie))
+    if outcomes > DISTRIBUTION_MAX_OUTCOMES:
+        raise ValueError(f'Die expression has {outcomes} possible totals. A distribution can have at most {DISTRIBUTION_MAX_OUTCOMES}.')
+
+    return terms_distribution(terms, multi_roll_type)
+
+
+@lru_cache(maxsize=EXPR_DISTRIBUTION_CACHE_SIZE)
+def terms_distribution(terms: tuple[tuple[Operation, int|MultiDie], ...], multi_roll_type: DieExprMultiRollType|None = None) -> Distribution:
+    dist = CONSTANT_ZERO
+    for operation, term in terms:
+        term_dist: Distribution|int
+        match term:
+            case int():
+                term_dist = term
+            case MultiDie():
+                term_dist = multi_die_distribution(term.type, term.multiplier)
+            case _:
+                raise ValueError(f"Term type {type(term)} not supported")
+
+        match operation:
+            case Operation.ADD:
+                dist = dist + term_dist
+            case Operation.SUB:
+                dist = dist - term_dist
+            case _:
+                raise ValueError(f"{operation.name} operation not supported")
+
+    match multi_roll_type:
+        case None:
+            return dist
+        case DieExprMultiRollType.BEST:
+            return dist.best_of_2()
+        case DieExprMultiRollType.WORST:
+            return dist.worst_of_2()
+        case _:
+            raise ValueError(f"{multi_roll_type} multi-roll type not supported")
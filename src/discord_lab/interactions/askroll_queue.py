@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from itertools import count
+import time
+from typing import Any, Callable, Iterable, Sequence
+
+from pynamodb.attributes import NumberAttribute, TTLAttribute, UnicodeAttribute, UnicodeSetAttribute
+from pynamodb.models import Model
+
+from discord_lab.interactions.item_cache import VERSION_ATTR, ItemCache
+from discord_lab.interactions.write_behind import WriteBehindQueue
+from discord_lab.tracing import span
+
+TABLE_NAME = 'rollit-askroll-queue'
+
+# DynamoDB's limit on keys per `BatchGetItem` request
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_BACKOFF_SECS = 0.05
+
+
+class AskRollRequest(Model):
+    class Meta:
+        table_name = TABLE_NAME
+
+    interaction_id = NumberAttribute(hash_key=True)
+    from_user_id = NumberAttribute()
+    to_user_id = NumberAttribute()
+    die_expr = UnicodeAttribute()
+    message_text = UnicodeAttribute(null=True)
+    must_beat = NumberAttribute(null=True)
+    success_text = UnicodeAttribute(null=True)
+    success_image_url = UnicodeAttribute(null=True)
+    failure_text = UnicodeAttribute(null=True)
+    failure_image_url = UnicodeAttribute(null=True)
+    special_roll_types = UnicodeSetAttribute(null=True)
+    player_roll_adjust = UnicodeAttribute(null=True)
+    # Bumped by `ItemCache.update`, so updates made from a cached copy can be conditional on it
+    version = NumberAttribute(default=1, attr_name=VERSION_ATTR)
+    expires_at = TTLAttribute(null=True)
+
+
+# All reads and writes of the askroll queue table. The model is only used to (de)serialize
+# items, while I/O goes through the low-level DynamoDB client, so writes can go out behind the
+# response and reads can be served from this container's cache or projected down to just the
+# attributes needed.
+class AskRollRepository:
+
+    def __init__(
+            self,
+            client_factory: Callable[[], Any],
+            writes: WriteBehindQueue,
+            cache: ItemCache,
+            ttl_secs: float,
+            flush_timeout_secs: float|None = None,
+            clock: Callable[[], float] = time.time):
+
+        self.client_factory = client_factory
+        self.writes = writes
+        self.cache = cache
+        self.ttl_secs = ttl_secs
+        self.flush_timeout_secs = flush_timeout_secs
+        self.clock = clock
+
+    def put(self, request: AskRollRequest) -> None:
+        # Expire the item eventually, whether or not it's ever rolled
+        request.version = 1
+        request.expires_at = datetime.fromtimestamp(self.clock() + self.ttl_secs, timezone.utc)
+
+        item = request.serialize()
+        self.cache.put(str(request.interaction_id), item)
+        self.writes.put_item(TABLE_NAME, item, AskRollRequest.interaction_id.attr_name)
+
+    def update(self, interaction_id: str, **values: Any) -> None:
+        # `None` or an empty set removes the attribute. When the item is cached, the update is
+        # conditional on the stored item still being at the cached version.
+        attributes = AskRollRequest.get_attributes()
+        attr_updates: dict[str, dict] = {}
+        for name, value in values.items():
+            attribute = attributes[name]
+            if value is None or value == set():
+                attr_updates[attribute.attr_name] = {'Action': 'DELETE'}
+            else:
+                attr_updates[attribute.attr_name] = {'Value': {attribute.attr_type: attribute.serialize(value)}, 'Action': 'PUT'}
+
+        attr_updates, expected = self.cache.update(interaction_id, attr_updates)
+        self.writes.update_item(TABLE_NAME, self.key(interaction_id), attr_updates, expected)
+
+    def get(
+            self,
+            interaction_id: str,
+            attributes: Sequence[str]|None = None,
+            is_current: Callable[[AskRollRequest], bool]|None = None) -> AskRollRequest:
+
+        # A cached item is only used if `is_current` agrees it's not stale
+        item = self.cache.get(interaction_id)
+        if item is not None:
+            request = AskRollRequest.from_raw_data(item)
+            if is_current is None or is_current(request):
+                return request
+
+        # Make sure any of this container's writes to it have landed first
+        self.writes.flush(self.flush_timeout_secs)
+
+        get_kwargs: dict[str, Any] = {'ConsistentRead': True, **self.projection(attributes)}
+        with span('dynamodb.GetItem', table=TABLE_NAME):
+            item = self.client_factory().get_item(TableName=TABLE_NAME, Key=self.key(interaction_id), **get_kwargs).get('Item')
+        if item is None:
+            raise AskRollRequest.DoesNotExist(f'No askroll request with interaction_id {interaction_id}')
+
+        # Only whole items are cached, so a projected read can never be mistaken for one
+        if attributes is None:
+            self.cache.put(interaction_id, item)
+
+        return AskRollRequest.from_raw_data(item)
+
+    def batch_get(self, interaction_ids: Iterable[str], attributes: Sequence[str]|None = None) -> dict[str, AskRollRequest]:
+        requests: dict[str, AskRollRequest] = {}
+
+        uncached_ids = []
+        for interaction_id in dict.fromkeys(interaction_ids):
+            item = self.cache.get(interaction_id)
+            if item is not None:
+                requests[interaction_id] = AskRollRequest.from_raw_data(item)
+            else:
+                uncached_ids.append(interaction_id)
+
+        if uncached_ids:
+            self.writes.flush(self.flush_timeout_secs)
+
+        # Include the key in any projection, so results can be matched back up to their ids
+        projection = self.projection([*attributes, AskRollRequest.interaction_id.attr_name] if attributes is not None else None)
+
+        for i in range(0, len(uncached_ids), BATCH_GET_MAX_KEYS):
+            keys = [self.key(interaction_id) for interaction_id in uncached_ids[i:i + BATCH_GET_MAX_KEYS]]
+
+            # Throttled keys come back unprocessed, to be asked for again after backing off
+            for attempt in count():
+                with span('dynamodb.BatchGetItem', table=TABLE_NAME, keys=len(keys)):
+                    response = self.client_factory().batch_get_item(
+                        RequestItems={TABLE_NAME: {'Keys': keys, 'ConsistentRead': True, **projection}}
+                    )
+
+                for item in response.get('Responses', {}).get(TABLE_NAME, []):
+                    request = AskRollRequest.from_raw_data(item)
+                    requests[str(request.interaction_id)] = request
+
+                keys = response.get('UnprocessedKeys', {}).get(TABLE_NAME, {}).get('Keys', [])
+                if not keys:
+                    break
+
+                time.sleep(min(BATCH_GET_BACKOFF_SECS * 2 ** attempt, 1.0))
+
+        return requests
+
+    @staticmethod
+    def key(interaction_id: str) -> dict[str, dict]:
+        return {AskRollRequest.interaction_id.attr_name: {'N': interaction_id}}
+
+    @staticmethod
+    def projection(attributes: Sequence[str]|None) -> dict[str, Any]:
+        if attributes is None:
+            return {}
+
+        # Name placeholders for every attribute, so none can clash with a DynamoDB reserved word
+        model_attributes = AskRollRequest.get_attributes()
+        attr_names = {f'#a{i}': model_attributes[name].attr_name for i, name in enumerate(dict.fromkeys(attributes))}
+
+        return {
+            'ProjectionExpression': ', '.join(attr_names),
+            'ExpressionAttributeNames': attr_names,
+        }
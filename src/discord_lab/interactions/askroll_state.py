@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+
+from discord_lab.interactions.custom_id import CustomIdSigner, custom_id_name
+
+SPECIAL_ROLL_TYPE_CODES = {None: '-', 'BEST': 'b', 'WORST': 'w'}
+SPECIAL_ROLL_TYPES_BY_CODE = {code: special_roll_type for special_roll_type, code in SPECIAL_ROLL_TYPE_CODES.items()}
+
+
+def to_base36(n: int) -> str:
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    out = ''
+    while True:
+        n, rem = divmod(n, 36)
+        out = digits[rem] + out
+        if not n:
+            return out
+
+
+# Everything a click on an askroll message needs, kept in its components' custom_ids so clicks
+# don't have to scrape the message's embeds or read DynamoDB
+@dataclass(frozen=True)
+class AskRollState:
+    to_user_id: int
+    die_expr: str
+    special_roll_type: str|None = None
+    player_roll_adjust: str|None = None
+    # None when there isn't one, or when it's hidden, since custom_ids aren't secret
+    must_beat: int|None = None
+    # Success and failure text and images, and hidden must beats, are only kept in DynamoDB
+    outcome_in_db: bool = False
+
+    def to_fields(self) -> list[str]:
+        # The special roll type's code, then `o` if the outcome is in DynamoDB
+        flags = SPECIAL_ROLL_TYPE_CODES[self.special_roll_type] + ('o' if self.outcome_in_db else '')
+
+        must_beat = str(self.must_beat) if self.must_beat is not None else ''
+
+        return [to_base36(self.to_user_id), flags, must_beat, self.die_expr, self.player_roll_adjust or '']
+
+    @classmethod
+    def from_fields(cls, fields: list[str]) -> AskRollState:
+        to_user_id, flags, must_beat, die_expr, player_roll_adjust = fields
+        special_roll_type_code, outcome_flag = flags[:1], flags[1:]
+        if outcome_flag not in ('', 'o'):
+            raise ValueError(f'Invalid askroll flags `{flags}`')
+
+        return cls(
+            to_user_id=int(to_user_id, 36),
+            die_expr=die_expr,
+            special_roll_type=SPECIAL_ROLL_TYPES_BY_CODE[special_roll_type_code],
+            player_roll_adjust=player_roll_adjust or None,
+            must_beat=int(must_beat) if must_beat else None,
+            outcome_in_db=outcome_flag == 'o',
+        )
+
+    def with_special_roll_type(self, special_roll_type: str|None) -> AskRollState:
+        return replace(self, special_roll_type=special_roll_type)
+
+    def with_player_roll_adjust(self, player_roll_adjust: str|None) -> AskRollState:
+        return replace(self, player_roll_adjust=player_roll_adjust)
+
+
+def encode_custom_id(signer: CustomIdSigner, name: str, state: AskRollState|None) -> str:
+    # Falls back to the plain name when the state doesn't fit, for the embed and DynamoDB path
+    if state is None:
+        return name
+
+    return signer.sign(name, state.to_fields()) or name
+
+
+def decode_custom_id(signer: CustomIdSigner, custom_id: str) -> AskRollState|None:
+    # Raises ValueError if the custom_id was tampered with
+    fields = signer.verify(custom_id)
+    if fields is None:
+        return None
+
+    try:
+        return AskRollState.from_fields(fields)
+    except (KeyError, ValueError) as e:
+        raise ValueError(f'Invalid askroll state in custom_id `{custom_id}`') from e
+
+
+def stamp_components(signer: CustomIdSigner, action_rows: list[dict], state: AskRollState|None) -> None:
+    for action_row in action_rows:
+        for component in action_row['components']:
+            component['custom_id'] = encode_custom_id(signer, custom_id_name(component['custom_id']), state)
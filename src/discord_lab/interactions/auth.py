@@ -1,11 +1,125 @@
-import requests as r
-from requests.auth import HTTPBasicAuth
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+import json
+import os
+from pathlib import Path
+from threading import Lock
+import time
+from typing import Callable, Iterable
+
+from discord_lab.interactions.env import DISCORD_OAUTH2_TOKEN_URL, DISCORD_OAUTH2_CLIENT_ID, DISCORD_OAUTH2_CLIENT_SECRET, DISCORD_APP_BOT_AUTH_TOKEN, DISCORD_OAUTH2_TOKEN_CACHE_PATH
+from discord_lab.interactions.rest import discord_rest
+
+
+@dataclass(frozen=True)
+class OAuth2Token:
+    access_token: str
+    expires_at: float
+
+
+# Client credentials tokens for `client_id`, keyed on their set of scopes, and reused until
+# `refresh_margin_secs` before they expire. With a `path`, tokens are also saved to that file, so
+# separate runs of the CLI can share them. The file may be shared by apps with other client IDs
+# too, so each token is saved with its client ID, and only this one's are used.
+class OAuth2TokenCache:
+
+    def __init__(self, client_id: str, refresh_margin_secs: float = 60, path: str|None = None, clock: Callable[[], float] = time.time):
+        self.client_id = client_id
+        self.refresh_margin_secs = refresh_margin_secs
+        self.path = Path(path) if path else None
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._tokens: dict[tuple[str, frozenset[str]], OAuth2Token]|None = None
+        self._lock = Lock()
+
+        # Held while fetching a token, so concurrent callers wait for it rather than all fetching
+        self.fetch_lock = Lock()
+
+    def key(self, scopes: Iterable[str]) -> tuple[str, frozenset[str]]:
+        return self.client_id, frozenset(scopes)
+
+    def get(self, scopes: Iterable[str]) -> str|None:
+        with self._lock:
+            token = self._load().get(self.key(scopes))
+            if token is None or token.expires_at - self.refresh_margin_secs <= self.clock():
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+            return token.access_token
+
+    def put(self, scopes: Iterable[str], access_token: str, expires_in: float) -> None:
+        with self._lock:
+            tokens = self._load()
+            tokens[self.key(scopes)] = OAuth2Token(access_token, self.clock() + expires_in)
+            self._save(tokens)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens = {}
+            self._save(self._tokens)
+
+    def _load(self) -> dict[tuple[str, frozenset[str]], OAuth2Token]:
+        if self._tokens is not None:
+            return self._tokens
+
+        self._tokens = {}
+        if self.path is not None and self.path.exists():
+            # A corrupt cache file is only a missed cache, never a failure
+            try:
+                for record in json.loads(self.path.read_text()):
+                    key = (record.pop('client_id'), frozenset(record.pop('scopes').split()))
+                    self._tokens[key] = OAuth2Token(**record)
+            except (ValueError, TypeError, AttributeError, KeyError) as e:
+                print(f'WARN: Ignoring unreadable OAuth2 token cache `{self.path}`: {e}')
+
+        return self._tokens
+
+    def _save(self, tokens: dict[tuple[str, frozenset[str]], OAuth2Token]) -> None:
+        if self.path is None:
+            return
+
+        now = self.clock()
+        tokens_json = [
+            {'client_id': client_id, 'scopes': ' '.join(sorted(scopes)), **asdict(token)}
+            for (client_id, scopes), token in tokens.items()
+            if token.expires_at > now
+        ]
+
+        # Tokens are secrets, so only the owner can read the file. Write then rename, so a
+        # concurrent run never reads a half written file.
+        tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(tokens_json, tmp_file)
+        os.replace(tmp_path, self.path)
+
+oauth2_token_cache = OAuth2TokenCache(DISCORD_OAUTH2_CLIENT_ID, path=DISCORD_OAUTH2_TOKEN_CACHE_PATH)
 
-from discord_lab.interactions.env import DISCORD_OAUTH2_TOKEN_URL, DISCORD_OAUTH2_CLIENT_ID, DISCORD_OAUTH2_CLIENT_SECRET, DISCORD_APP_BOT_AUTH_TOKEN
 
 def get_oauth2_access_token(scopes: list[str]) -> str:
+    access_token = oauth2_token_cache.get(scopes)
+    if access_token is not None:
+        return access_token
+
+    with oauth2_token_cache.fetch_lock:
+        # Another thread may have fetched it while this one waited
+        access_token = oauth2_token_cache.get(scopes)
+        if access_token is not None:
+            return access_token
+
+        res_data = fetch_oauth2_access_token(scopes)
+        oauth2_token_cache.put(scopes, res_data['access_token'], res_data['expires_in'])
+
+        return res_data['access_token']
+
+
+def fetch_oauth2_access_token(scopes: list[str]) -> dict:
 
-    req_auth = HTTPBasicAuth(DISCORD_OAUTH2_CLIENT_ID, DISCORD_OAUTH2_CLIENT_SECRET)
+    req_auth = (DISCORD_OAUTH2_CLIENT_ID, DISCORD_OAUTH2_CLIENT_SECRET)
 
     req_data = {
         'grant_type': 'client_credentials',
@@ -16,13 +130,13 @@ def get_oauth2_access_token(scopes: list[str]) -> str:
         'Content-Type': 'application/x-www-form-urlencoded'
     }
 
-    res: r.Response = r.post(DISCORD_OAUTH2_TOKEN_URL, auth=req_auth, headers=req_headers, data=req_data)
+    res = discord_rest.post(DISCORD_OAUTH2_TOKEN_URL, auth=req_auth, headers=req_headers, data=req_data)
     res_data = res.json()
 
-    if res.status_code != r.codes.ok:
+    if res.status_code != 200:
         raise RuntimeError(f'Failed to authenticate: {res_data}')
 
-    return res_data['access_token']
+    return res_data
 
 
 def get_oauth2_authn_header(scopes: list[str]) -> str:
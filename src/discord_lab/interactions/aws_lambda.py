@@ -1,189 +1,116 @@
-import json
-from typing import Any
-
-from nacl.signing import VerifyKey
-from nacl.exceptions import BadSignatureError
-
-import boto3
-
-import requests
-
-from discord_lab.dice import *
-from discord_lab.interactions.env import *
+from __future__ import annotations
+
+from functools import cache
+from typing import TYPE_CHECKING, Any, Mapping
+
+from discord_lab.dice import DieExpr, DieExprLimits, DieExprMultiRoll, DieExprMultiRollType, DieParseException
+from discord_lab.interactions.askroll_state import AskRollState, decode_custom_id, encode_custom_id, stamp_components
+from discord_lab.interactions.custom_id import CustomIdSigner, custom_id_name, derive_key
+from discord_lab.interactions.deferred import DeferralPolicy, DeferredQueue, DeferredResponder, LocalDeferredQueue, SqsDeferredQueue, deferred_ack, sqs_records_to_interactions, sqs_records_to_write_ops
+from discord_lab.interactions.env import ASKROLL_CACHE_TTL_SECS, ASKROLL_TTL_SECS, ASKROLL_WRITE_FLUSH_TIMEOUT_SECS, CUSTOM_ID_SIGNING_KEY, DEFER_HOLD_SECS, DEFER_LATENCY_BUDGET_MS, DEFER_MIN_SAMPLES, DEFERRED_QUEUE_URL, DEFERRED_WORKERS, DIE_EXPR_MAX_DICE, DIE_EXPR_MAX_LENGTH, DIE_EXPR_MAX_TERMS, DISCORD_APP_BOT_AUTH_TOKEN, DISCORD_APP_ID, DISCORD_APP_PUBLIC_KEY, DISCORD_SIGNATURE_MAX_SKEW_SECS, DYNAMODB_BACKEND, DYNAMODB_MAX_POOL_CONNECTIONS, DYNAMODB_MEMORY_ERROR_RATE, DYNAMODB_MEMORY_LATENCY_JITTER_MS, DYNAMODB_MEMORY_LATENCY_MS, REQUEST_LOG_PAYLOAD_SAMPLE_RATE, TRACE_CHROME_PATH, TRACE_EMF
+from discord_lab.interactions.item_cache import VERSION_ATTR, VERSION_BUMP, ItemCache
+from discord_lab.interactions.jsonio import InteractionBody, RawJson, raw_json
+from discord_lab.interactions.render import CONTENT_MAX_LEN, EMBED_DESCRIPTION_MAX_LEN, die_roll_to_md, plan_render_mode, render_expr_roll, render_multi_roll_results, render_multidie_roll
+from discord_lab.interactions.rest import discord_rest
+from discord_lab.interactions.request_log import RequestLogger, phase
+from discord_lab.interactions.router import InteractionRouter, InteractionType, ResponseBody, route_key
+from discord_lab.interactions.templates import JsonTemplate, Slot
+from discord_lab.interactions.verify import RequestVerifier, VerifyResult
+from discord_lab.interactions.write_behind import WriteBehindQueue, WriteOp
+from discord_lab.tracing import Tracer, span
+
+if TYPE_CHECKING:
+    from discord_lab.interactions.askroll_queue import AskRollRepository, AskRollRequest
+    from discord_lab.interactions.storage import DynamoDBBackend
+
+# NOTE: boto3, pynamodb and requests are imported where they're first needed rather than here.
+#       Each adds noticeably to Lambda cold starts, and many interactions never use them.
 
 DEV_MODE = False
 
-EMOJI_ID_BY_CODE = {
-    'D4_1':'<:d4_1:1282216833335955467>',
-    'D4_2':'<:d4_2:1282216846401208331>',
-    'D4_3':'<:d4_3:1282216862834495520>',
-    'D4_4':'<:d4_4:1282216878072135720>',
-    'D6_1':'<:d6_1:1282212244398276640>',
-    'D6_2':'<:d6_2:1282212258780418158>',
-    'D6_3':'<:d6_3:1282212272265232448>',
-    'D6_4':'<:d6_4:1282212289310621717>',
-    'D6_5':'<:d6_5:1282212308982169653>',
-    'D6_6':'<:d6_6:1282212638297817198>',
-    'D8_8':'<:d8_8:1282224447620776058>',
-    'D8_7':'<:d8_7:1282224433448091659>',
-    'D8_6':'<:d8_6:1282224414439641119>',
-    'D8_5':'<:d8_5:1282224400380203008>',
-    'D8_4':'<:d8_4:1282224384655757396>',
-    'D8_3':'<:d8_3:1282224372081233981>',
-    'D8_2':'<:d8_2:1282224356134617098>',
-    'D8_1':'<:d8_1:1282224323486023731>',
-    'D10_10':'<:d10_10:1282232213064253440>',
-    'D10_9':'<:d10_9:1282232197952045119>',
-    'D10_8':'<:d10_8:1282232181506183198>',
-    'D10_7':'<:d10_7:1282232165744246804>',
-    'D10_6':'<:d10_6:1282232150413803540>',
-    'D10_5':'<:d10_5:1282232135176159284>',
-    'D10_4':'<:d10_4:1282232120257019926>',
-    'D10_3':'<:d10_3:1282232104855408701>',
-    'D10_2':'<:d10_2:1282232090938708035>',
-    'D10_1':'<:d10_1:1282232071707824140>',
-    'D10_0':'<:d10_0:1282479588311830629>',
-    'D10_00':'<:d10_00:1282474745606049865>',
-    'D10_90':'<:d10_90:1282474994336796692>',
-    'D10_80':'<:d10_80:1282474906071728158>',
-    'D10_70':'<:d10_70:1282474883162574919>',
-    'D10_60':'<:d10_60:1282474867303907361>',
-    'D10_50':'<:d10_50:1282474851503706157>',
-    'D10_40':'<:d10_40:1282474836551139380>',
-    'D10_30':'<:d10_30:1282474822055624776>',
-    'D10_20':'<:d10_20:1282474763754803240>',
-    'D12_12':'<:d12_12:1282232530807951421>',
-    'D12_11':'<:d12_11:1282232516375478346>',
-    'D12_10':'<:d12_10:1282232497718951968>',
-    'D12_9':'<:d12_9:1282232461941669888>',
-    'D12_8':'<:d12_8:1282232418627227689>',
-    'D12_7':'<:d12_7:1282232395625664553>',
-    'D12_6':'<:d12_6:1282232379829780520>',
-    'D12_5':'<:d12_5:1282232364835016704>',
-    'D12_4':'<:d12_4:1282232349295247360>',
-    'D12_3':'<:d12_3:1282232328462270485>',
-    'D12_2':'<:d12_2:1282232312729305119>',
-    'D12_1':'<:d12_1:1282232295973195787>',
-    'D20_20':'<:d20_20:1282233169256382545>',
-    'D20_19':'<:d20_19:1282233139774623805>',
-    'D20_18':'<:d20_18:1282233124310356069>',
-    'D20_17':'<:d20_17:1282233108376059914>',
-    'D20_16':'<:d20_16:1282233092240703539>',
-    'D20_15':'<:d20_15:1282233077233615000>',
-    'D20_14':'<:d20_14:1282233060858789888>',
-    'D20_13':'<:d20_13:1282233045105119242>',
-    'D20_12':'<:d20_12:1282232901949198409>',
-    'D20_11':'<:d20_11:1282232844088774707>',
-    'D20_10':'<:d20_10:1282232824602034249>',
-    'D20_9':'<:d20_9:1282232803181723740>',
-    'D20_8':'<:d20_8:1282232786778066946>',
-    'D20_7':'<:d20_7:1282232770705358869>',
-    'D20_6':'<:d20_6:1282232755173855294>',
-    'D20_5':'<:d20_5:1282232739386363935>',
-    'D20_4':'<:d20_4:1282232728754061323>',
-    'D20_3':'<:d20_3:1282232708482863115>',
-    'D20_2':'<:d20_2:1282232694108979221>',
-    'D20_1':'<:d20_1:1282232679512805467>',
-}
-
-dynamodb_client = boto3.client('dynamodb')
-
-def die_roll_to_md(roll: DieRoll) -> str:
-    if roll.type == DieType.D100:       
-        if roll.value == 100:
-            tens_emoji_id = EMOJI_ID_BY_CODE["D10_00"]
-            ones_emoji_id = EMOJI_ID_BY_CODE["D10_0"]
-        else:
-            tens_val, ones_val = divmod(roll.value, 10)
-            tens_val *= 10
-
-            tens_emoji_id = EMOJI_ID_BY_CODE[f"D10_{tens_val}"] if tens_val else EMOJI_ID_BY_CODE["D10_00"]
-            ones_emoji_id = EMOJI_ID_BY_CODE[f"D10_{ones_val}"]
+DieExpr.limits = DieExprLimits(DIE_EXPR_MAX_DICE, DIE_EXPR_MAX_TERMS, DIE_EXPR_MAX_LENGTH)
 
-        md = tens_emoji_id + ones_emoji_id
+request_verifier = RequestVerifier(DISCORD_APP_PUBLIC_KEY, DISCORD_SIGNATURE_MAX_SKEW_SECS)
 
-    else:
-        md = EMOJI_ID_BY_CODE[f"{roll.type.name}_{roll.value}"]
-
-    return md
-
-
-def render_single_die_roll(roll: DieRoll) -> str:
-    return die_roll_to_md(roll)
-
-
-def render_multidie_roll(rolls: MultiDieRoll, include_total: bool) -> str:
-    roll_details = rolls.details
-    if len(roll_details) == 1:
-        return render_single_die_roll(roll_details[0])
-    else:
-        die_md = ' '.join([die_roll_to_md(roll) for roll in rolls.details])
-        if include_total:
-            die_md += f' {rolls.value}'
-        return die_md
+router = InteractionRouter()
 
+# Signs state kept in component custom_ids. Without a key of its own, one is derived from the
+# bot token, which every container already has.
+custom_id_signer = CustomIdSigner(CUSTOM_ID_SIGNING_KEY.encode() if CUSTOM_ID_SIGNING_KEY else derive_key(DISCORD_APP_BOT_AUTH_TOKEN, 'custom_id'))
 
+request_logger = RequestLogger(REQUEST_LOG_PAYLOAD_SAMPLE_RATE)
 
-def render_expr_roll(rolls: DieExprRoll, include_total: bool) -> str:
-    roll_results = rolls.results
+tracer = Tracer(TRACE_EMF, TRACE_CHROME_PATH)
 
-    # If only a single die is rolled, just show that roll without the math bits
-    # TODO: Move this one-off logic to its own function
-    if len(roll_results) == 1:
-        single_result = roll_results[0]
+@cache
+def dynamodb_client() -> DynamoDBBackend:
+    match DYNAMODB_BACKEND:
+        case 'aws':
+            with span('import boto3'):
+                import boto3
+                from botocore.config import Config # type: ignore[import-untyped]
 
-        match single_result:
-            case MultiDieTermOperationResult():
-                single_roll_details = single_result.rolls.details
-                if len(single_roll_details) == 1:
-                    return render_single_die_roll(single_roll_details[0])
+            return boto3.client('dynamodb', config=Config(max_pool_connections=DYNAMODB_MAX_POOL_CONNECTIONS))
+        case 'memory':
+            from discord_lab.interactions.storage import InMemoryDynamoDB
 
-    rr_mds = []
+            return InMemoryDynamoDB(
+                latency_secs=DYNAMODB_MEMORY_LATENCY_MS / 1000,
+                latency_jitter_secs=DYNAMODB_MEMORY_LATENCY_JITTER_MS / 1000,
+                error_rate=DYNAMODB_MEMORY_ERROR_RATE,
+            )
+        case _:
+            raise RuntimeError(f'Unknown DynamoDB backend `{DYNAMODB_BACKEND}`. Must be `aws` or `memory`.')
 
-    for rr in roll_results:        
-        match rr:
-            case IntTermOperationResult():
-                rr_md = str(rr.value)
-            case MultiDieTermOperationResult():
-                include_subtotals = len(roll_results) > 1
-                rr_md = render_multidie_roll(rr.rolls, include_subtotals)
+# Askroll items this container has written or read, so clicks on them can skip DynamoDB
+askroll_cache = ItemCache(ttl_secs=ASKROLL_CACHE_TTL_SECS)
 
-        op_symbol = rr.term_op.operation.value
-        if op_symbol:
-            rr_md = f"{op_symbol} {rr_md}"
+def askroll_write_conflict(op: WriteOp) -> WriteOp:
+    # Another container updated the item since it was cached here, so stop trusting the cached
+    # copy. The update still goes out, unconditionally, so the latest click wins like before,
+    # and still bumps the version, so any other cached copies go stale too.
+    askroll_cache.invalidate(op.key['interaction_id']['N'])
+    attr_updates = {**op.attr_updates, VERSION_ATTR: VERSION_BUMP}
 
-        label = rr.term_op.labeled_term.label
-        if label:
-            rr_md += f" ({label})"
+    return WriteOp(op.table, op.key, None, attr_updates, None, op.attempts)
 
-        rr_mds.append(rr_md)
+# Askroll writes go out in the background while the response is built, and are flushed
+# before the handler returns
+askroll_writes = WriteBehindQueue(dynamodb_client, on_conflict=askroll_write_conflict)
 
-    md = " ".join(rr_mds)
+@cache
+def askroll_repo() -> AskRollRepository:
+    with span('import askroll_queue'):
+        from discord_lab.interactions.askroll_queue import AskRollRepository
 
-    if include_total:
-         md += f"\n# {rolls.value}"
+    return AskRollRepository(dynamodb_client, askroll_writes, askroll_cache, ASKROLL_TTL_SECS, ASKROLL_WRITE_FLUSH_TIMEOUT_SECS)
 
-    return md
+# Routes that have been too slow lately are acked right away, then answered by editing the
+# original response from a worker. Lambda freezes the container, worker threads and all, once
+# the handler returns, so without SQS to hand them to, nothing is deferred. The server turns
+# deferral on for its own worker threads with `enable_local_deferral`.
+deferral_policy = DeferralPolicy(router, DEFER_LATENCY_BUDGET_MS if DEFERRED_QUEUE_URL else 0, DEFER_MIN_SAMPLES, hold_secs=DEFER_HOLD_SECS)
+deferred_responder = DeferredResponder(router)
 
+@cache
+def deferred_queue() -> DeferredQueue:
+    if DEFERRED_QUEUE_URL:
+        return SqsDeferredQueue(DEFERRED_QUEUE_URL, sqs_client)
 
-def render_multi_roll_results(multi_roll_results: DieExprMultiRollResult) -> str:
-    roll_1, roll_2 = multi_roll_results.rolls
-    resolved_roll = multi_roll_results.resolved_roll
-    
-    roll_1_md = render_expr_roll(roll_1, False)
-    if resolved_roll == roll_1:
-        roll_1_md = f"# {roll_1_md} :point_left:"
+    return LocalDeferredQueue(deferred_responder.respond, DEFERRED_WORKERS)
 
-    roll_2_md = render_expr_roll(roll_2, False)
-    if resolved_roll == roll_2:
-        roll_2_md = f"# {roll_2_md} :point_left:"
+def enable_local_deferral() -> None:
+    deferral_policy.budget_ms = DEFER_LATENCY_BUDGET_MS
 
-    content = f"{roll_1_md}\n{roll_2_md}\n# {resolved_roll.value}"
+@cache
+def sqs_client() -> Any:
+    with span('import boto3'):
+        import boto3
 
-    return content
+    return boto3.client('sqs')
 
 
-def slash_cmd_option_name_to_value(req_body: dict, option_name: str, required: bool = True) -> Any:
+def slash_cmd_option_name_to_value(req_body: Mapping[str, Any], option_name: str, required: bool = True) -> Any:
     try:
         for option in req_body['data']['options']:
             if option['name'] == option_name:
@@ -197,7 +124,7 @@ def slash_cmd_option_name_to_value(req_body: dict, option_name: str, required: b
         return None
 
 
-def slash_cmd_option_name_to_image_url(req_body: dict, option_name: str, required: bool = True) -> str|None:
+def slash_cmd_option_name_to_image_url(req_body: Mapping[str, Any], option_name: str, required: bool = True) -> str|None:
     attachment_id = slash_cmd_option_name_to_value(req_body, option_name, required)
     if attachment_id:
         url = req_body['data']['resolved']['attachments'][attachment_id]['url']
@@ -209,7 +136,7 @@ def slash_cmd_option_name_to_image_url(req_body: dict, option_name: str, require
 def component_to_select_options(action_rows: list[dict], custom_id: str, required: bool = True) -> list[str]|None:
     for action_row in action_rows:
         for component in action_row['components']:
-            if component['custom_id'] == custom_id:
+            if custom_id_name(component['custom_id']) == custom_id:
                 return component['options']
 
     if required:
@@ -217,6 +144,14 @@ def component_to_select_options(action_rows: list[dict], custom_id: str, require
     else:
         return None
 
+def component_custom_id(action_rows: list[dict], name: str) -> str|None:
+    for action_row in action_rows:
+        for component in action_row['components']:
+            if custom_id_name(component['custom_id']) == name:
+                return component['custom_id']
+
+    return None
+
 def embed_field_to_value(embeds: list[dict], field_name, required: bool = True) -> Any:
     for embed in embeds:
         if embed['name'] == field_name:
@@ -229,30 +164,63 @@ def embed_field_to_value(embeds: list[dict], field_name, required: bool = True)
 
 
 def get_interaction_message(interaction_token: str) -> dict:
-    message_url = f'{DISCORD_API_URL_BASE}/webhooks/{DISCORD_APP_ID}/{interaction_token}/messages/@original'
-
-    orig_msg_resp = requests.get(message_url)
+    orig_msg_resp = discord_rest.get(f'/webhooks/{DISCORD_APP_ID}/{interaction_token}/messages/@original')
     orig_msg = orig_msg_resp.json()
     orig_msg_resp.raise_for_status()
 
     return orig_msg
 
 
-def roll_cmd(req_body: dict) -> tuple[int,dict]:
+def askroll_state(custom_id: str) -> AskRollState|None:
+    # None for messages from before askroll state was kept in custom_ids, or whose state didn't
+    # fit, and for tampered custom_ids. Those all fall back to the embeds and DynamoDB.
+    try:
+        return decode_custom_id(custom_id_signer, custom_id)
+    except ValueError as ve:
+        print(f'WARN: {ve}')
+        return None
+
+
+def askroll_request_matches_embed(roll_req: AskRollRequest, req_embed_fields: list[dict]) -> bool:
+    # The message Discord sends with a click always shows the latest special roll types and
+    # adjustment, so a cached item that disagrees with it is stale
+    special_roll_types_md = '\n'.join(DieExprMultiRollType[x].value for x in sorted(roll_req.special_roll_types or []))
+    embed_special_roll_types_md = embed_field_to_value(req_embed_fields, 'Special Roll', False) or ''
+    if embed_special_roll_types_md == 'N/A':
+        embed_special_roll_types_md = ''
+
+    embed_player_roll_adjust = embed_field_to_value(req_embed_fields, 'Adjustment', False) or ''
+
+    return (
+        roll_req.die_expr == embed_field_to_value(req_embed_fields, 'Dice', False)
+        and special_roll_types_md == embed_special_roll_types_md
+        and (roll_req.player_roll_adjust or '') == embed_player_roll_adjust
+    )
+
+
+@router.route(InteractionType.APPLICATION_COMMAND, 'roll', deferrable=True)
+def roll_cmd(req_body: Mapping[str, Any]) -> tuple[int,dict]:
     die_expr_str = slash_cmd_option_name_to_value(req_body, 'dice')
     multi_roll_type_str = slash_cmd_option_name_to_value(req_body, 'multi-roll', False)
 
-    die_expr = DieExpr.parse(die_expr_str)
-
     try:
+        die_expr = DieExpr.parse(die_expr_str)
+
+        # Pick how much detail fits in a message before rolling, so nothing too big is rendered
+        render_mode = plan_render_mode(die_expr, CONTENT_MAX_LEN, bool(multi_roll_type_str))
+
         if multi_roll_type_str:
             multi_roll_type = DieExprMultiRollType[multi_roll_type_str]
-            multi_roll_results = DieExprMultiRoll(die_expr, multi_roll_type).roll()
+            with phase('roll'):
+                multi_roll_results = DieExprMultiRoll(die_expr, multi_roll_type).roll()
 
-            content = render_multi_roll_results(multi_roll_results)
+            with phase('render'):
+                content = render_multi_roll_results(multi_roll_results, render_mode)
         else:
-            die_expr_roll = die_expr.roll()
-            content = render_expr_roll(die_expr_roll, True)
+            with phase('roll'):
+                die_expr_roll = die_expr.roll()
+            with phase('render'):
+                content = render_expr_roll(die_expr_roll, True, render_mode)
     except DieParseException as dpe:
         content = f'# ???\n{dpe}'
 
@@ -266,7 +234,94 @@ def roll_cmd(req_body: dict) -> tuple[int,dict]:
     return 200, res_data
 
 
-def askroll_cmd(req_body: dict) -> tuple[int,dict]:
+# The askroll message and adjust modal are mostly the same every time, so only what changes is
+# serialized per request. See `JsonTemplate`.
+ASKROLL_RESPONSE = JsonTemplate({
+    'type': 4,
+    'data': {
+        'embeds': [
+            {
+                "description": Slot('description'),
+                "image": Slot('image'),
+                "color": 9807270, # Grey
+                "fields": Slot('fields'),
+            }
+        ],
+        'components': [
+            {
+                'type': 1,
+                'components': [
+                    {
+                        "type": 3,
+                        "custom_id": Slot('special_roll_types_custom_id'),
+                        "placeholder": "Special rolls",
+                        "options":[
+                            {
+                                "label": "Best of 2 / Advantage",
+                                "value": "BEST",
+                            },
+                            {
+                                "label": "Worst of 2 / Disadvantage",
+                                "value": "WORST",
+                            },
+                        ],
+                        "min_values": 0,
+                        "max_values": 1,
+                    }
+                ]
+            },
+            {
+                'type': 1,
+                'components': [
+                    {
+                        'type': 2, # Button
+                        'custom_id': Slot('roll_click_custom_id'),
+                        'label': 'Roll!',
+                        'emoji': {'name': '🎲'},
+                        'style': 1, # Primary
+                    },
+                    {
+                        'type': 2, # Button
+                        'custom_id': Slot('adjust_roll_click_custom_id'),
+                        'emoji': {'name': '🔧'},
+                        'label': 'Adjust',
+                        'style': 2, # Secondary
+                    },
+                ]
+            }
+        ]
+    }
+})
+
+ADJUST_ROLL_MODAL = JsonTemplate({
+    'type': 9, # Modal
+    'data': {
+        "title": "Adjust roll",
+        "custom_id": Slot('custom_id'),
+        "components": [
+            {
+                "type": 1,
+                "components": [
+                    {
+                        "type": 4,
+                        "custom_id": "adjust_roll_exp",
+                        "label": "Roll expression",
+                        "style": 1,
+                        "min_length": 2,
+                        "max_length": 100,
+                        "placeholder": "Example: +2 (Bless) -1 (Wisdom)",
+                        "required": True,
+                        "value": Slot('value'),
+                    }
+                ]
+            }
+        ]
+    }
+})
+
+
+@router.route(InteractionType.APPLICATION_COMMAND, 'askroll', deferrable=True)
+def askroll_cmd(req_body: Mapping[str, Any]) -> tuple[int,RawJson]:
     interaction_id = req_body['id']
     from_user_id = req_body['member']['user']['id']
     to_user_id = slash_cmd_option_name_to_value(req_body, 'user')
@@ -285,112 +340,56 @@ def askroll_cmd(req_body: dict) -> tuple[int,dict]:
         { "name": "Dice", "value": die_expr_str, "inline": True},
     ]
 
-    res_data = {
-        'type': 4,
-        'data': {
-            'embeds': [
-                {
-                    "description": message_text,
-                    "image": {"url": message_image_url} if message_image_url else None,
-                    "color": 9807270, # Grey
-                    "fields": fields,
-                }
-            ],
-            'components': [
-                {
-                    'type': 1,
-                    'components': [
-                        {
-                            "type": 3,
-                            "custom_id": "special_roll_types",
-                            "placeholder": "Special rolls",
-                            "options":[
-                                {
-                                    "label": "Best of 2 / Advantage",
-                                    "value": "BEST",
-                                },
-                                {
-                                    "label": "Worst of 2 / Disadvantage",
-                                    "value": "WORST",
-                                },
-                            ],
-                            "min_values": 0,
-                            "max_values": 1,
-                        }
-                    ]
-                },
-                {
-                    'type': 1,
-                    'components': [
-                        {
-                            'type': 2, # Button
-                            'custom_id': 'roll_click',
-                            'label': 'Roll!',
-                            'emoji': {'name': '🎲'},
-                            'style': 1, # Primary
-                        },
-                        {
-                            'type': 2, # Button
-                            'custom_id': 'adjust_roll_click',
-                            'emoji': {'name': '🔧'},
-                            'label': 'Adjust',
-                            'style': 2, # Secondary
-                        },
-                    ]
-                }
-            ]
-        }
-    }
+    from discord_lab.interactions.askroll_queue import AskRollRequest
 
-    dynamodb_item = {
-        "interaction_id": {"N":  interaction_id},
-        "from_user_id": {"N": from_user_id},
-        "to_user_id": {"N": to_user_id},
-        "die_expr": {"S": die_expr_str },
-    }
-
-    if message_text:
-        dynamodb_item['message_text'] = {"S": message_text }
+    roll_request = AskRollRequest(
+        interaction_id=int(interaction_id),
+        from_user_id=int(from_user_id),
+        to_user_id=int(to_user_id),
+        die_expr=die_expr_str,
+        message_text=message_text or None,
+    )
 
     if must_beat:
         must_bean_field_val = "???" if must_beat_hidden else must_beat
         fields.append({"name": "Must Beat", "value": must_bean_field_val, "inline": True})
 
-        dynamodb_item['must_beat'] = {"N": str(must_beat) }
-
-        if success_text:
-            dynamodb_item['success_text'] = {"S": success_text }
-
-        if success_image_url:
-            dynamodb_item['success_image_url'] = {"S": success_image_url }
-
-        if failure_text:
-            dynamodb_item['failure_text'] = {"S": failure_text }
-
-        if failure_image_url:
-            dynamodb_item['failure_image_url'] = {"S": failure_image_url }
-
-
-    dynamodb_client.put_item(
-        TableName="rollit-askroll-queue",
-        Item=dynamodb_item,
+        roll_request.must_beat = int(must_beat)
+        roll_request.success_text = success_text or None
+        roll_request.success_image_url = success_image_url or None
+        roll_request.failure_text = failure_text or None
+        roll_request.failure_image_url = failure_image_url or None
+
+    state = AskRollState(
+        to_user_id=int(to_user_id),
+        die_expr=die_expr_str,
+        must_beat=int(must_beat) if must_beat and not must_beat_hidden else None,
+        outcome_in_db=bool(must_beat) and bool(must_beat_hidden or success_text or success_image_url or failure_text or failure_image_url),
     )
 
-    return 200, res_data
+    askroll_repo().put(roll_request)
 
+    with phase('serialize'):
+        res_body_str = ASKROLL_RESPONSE.render(
+            description=message_text,
+            image={"url": message_image_url} if message_image_url else None,
+            fields=fields,
+            special_roll_types_custom_id=encode_custom_id(custom_id_signer, 'special_roll_types', state),
+            roll_click_custom_id=encode_custom_id(custom_id_signer, 'roll_click', state),
+            adjust_roll_click_custom_id=encode_custom_id(custom_id_signer, 'adjust_roll_click', state),
+        )
 
-def slash_command(req_body: dict) -> tuple[int,dict]:
-    cmd_name = req_body['data']['name']
-
-    return cmd_name_dispatch[cmd_name](req_body)
+    return 200, RawJson(res_body_str)
 
 
-def special_roll_types_select(req_body: dict) -> tuple[int,dict]:
+@router.route(InteractionType.MESSAGE_COMPONENT, 'askroll', 'special_roll_types', deferrable=True)
+def special_roll_types_select(req_body: Mapping[str, Any]) -> tuple[int,dict]:
     message = req_body['message']
     embeds = message['embeds']
     components = message['components']
     req_embed_fields = embeds[0]['fields']
     interaction_id = req_body['message']['interaction']['id']
+    state = askroll_state(req_body['data']['custom_id'])
 
     try:
         special_roll_types_selected = req_body['data']['values']
@@ -404,31 +403,11 @@ def special_roll_types_select(req_body: dict) -> tuple[int,dict]:
         else:
             option['default'] = False
 
-    if not special_roll_types_selected:
-        attr_updates = {
-            'special_roll_types': {
-                'Action': 'DELETE'
-            }
-        }
-    else:
-        attr_updates = {
-            'special_roll_types': {
-                'Value': {
-                    'SS': special_roll_types_selected,
-                },
-                'Action': 'PUT'
-            }
-        }
-
-    dynamodb_client.update_item(
-        TableName="rollit-askroll-queue",
-        Key={
-            'interaction_id': {
-                'N': interaction_id,
-            }
-        },
-        AttributeUpdates=attr_updates,
-    )
+    # No types selected removes them. DynamoDB is still kept up to date for whenever the state
+    # stops fitting in custom_ids.
+    askroll_repo().update(interaction_id, special_roll_types=set(special_roll_types_selected))
+    if state is not None:
+        stamp_components(custom_id_signer, components, state.with_special_roll_type(special_roll_types_selected[0] if special_roll_types_selected else None))
 
     special_roll_header = 'Special Roll'
 
@@ -459,7 +438,8 @@ def special_roll_types_select(req_body: dict) -> tuple[int,dict]:
     return 200, res_data
 
 
-def roll_click(req_body: dict) -> tuple[int,dict]:
+@router.route(InteractionType.MESSAGE_COMPONENT, 'askroll', 'roll_click', deferrable=True)
+def roll_click(req_body: Mapping[str, Any]) -> tuple[int,dict]:
     embeds = req_body['message']['embeds']
     req_embed_fields = embeds[0]['fields']
     interaction_id = req_body['message']['interaction']['id']
@@ -471,36 +451,31 @@ def roll_click(req_body: dict) -> tuple[int,dict]:
 
     res_embed_color = embeds[0]['color']
 
-    # Required options
-    die_expr_str = embed_field_to_value(req_embed_fields, 'Dice')
-    requested_roller_user_id = embed_field_to_value(req_embed_fields, 'Player')
-
-    # Optional options
-    adjust_expr_str: str = embed_field_to_value(req_embed_fields, 'Adjustment', False) or ''
-
+    state = askroll_state(req_body['data']['custom_id'])
+    roll_req = None
+
+    if state is None:
+        # Get roll req data from this container's cache, or just the attributes needed from the db
+        with phase('db'):
+            roll_req = askroll_repo().get(
+                interaction_id,
+                ['must_beat', 'special_roll_types', 'success_text', 'success_image_url', 'failure_text', 'failure_image_url'],
+                lambda cached: askroll_request_matches_embed(cached, req_embed_fields),
+            )
+
+        # Get special_roll_types from DB instead of embeds since easier to work with as a list
+        # instead of the `\n` separated string in the embed
+        db_special_roll_types = sorted(roll_req.special_roll_types or [])
+        state = AskRollState(
+            to_user_id=int(embed_field_to_value(req_embed_fields, 'Player').strip('<@>')),
+            die_expr=embed_field_to_value(req_embed_fields, 'Dice'),
+            special_roll_type=db_special_roll_types[0] if db_special_roll_types else None,
+            player_roll_adjust=embed_field_to_value(req_embed_fields, 'Adjustment', False),
+            # NumberAttribute reads back as a float
+            must_beat=int(roll_req.must_beat) if roll_req.must_beat is not None else None,
+        )
 
-    # Get roll req data from db
-    roll_req = dynamodb_client.get_item(
-        TableName='rollit-askroll-queue',
-        Key={
-            'interaction_id': {
-                'N': interaction_id,
-            }
-        },
-        ConsistentRead=True
-    )['Item']
-
-    # Get special_roll_types from DB instead of embeds since easier to work with as a list
-    # instead of the `\n` separated string in the embed
-    must_beat = roll_req.get('must_beat', {}).get('N', None)
-    special_roll_types = roll_req.get('special_roll_types', {}).get('SS', None)
-    success_text = roll_req.get('success_text', {}).get('S', None)
-    success_image_url = roll_req.get('success_image_url', {}).get('S', None)
-    failure_text = roll_req.get('failure_text', {}).get('S', None)
-    failure_image_url = roll_req.get('failure_image_url', {}).get('S', None)
-
-    # NOTE: button_clicker_user_id is an int, which requested_player_user_id is of for form <@{int}>
-    if button_clicker_user_id not in requested_roller_user_id:
+    if int(button_clicker_user_id) != state.to_user_id:
         res_data = {
             'type': 4,
             'data': {
@@ -511,6 +486,26 @@ def roll_click(req_body: dict) -> tuple[int,dict]:
 
         return 200, res_data
 
+    if roll_req is None and state.outcome_in_db:
+        # Only what doesn't fit, or can't be shown, in custom_ids. None of it ever changes.
+        with phase('db'):
+            roll_req = askroll_repo().get(
+                interaction_id,
+                ['must_beat', 'success_text', 'success_image_url', 'failure_text', 'failure_image_url'],
+            )
+
+    die_expr_str = state.die_expr
+    adjust_expr_str = state.player_roll_adjust or ''
+    special_roll_types = [state.special_roll_type] if state.special_roll_type else []
+    must_beat = state.must_beat
+    success_text = success_image_url = failure_text = failure_image_url = None
+    if roll_req is not None:
+        must_beat = int(roll_req.must_beat) if roll_req.must_beat is not None else None
+        success_text = roll_req.success_text
+        success_image_url = roll_req.success_image_url
+        failure_text = roll_req.failure_text
+        failure_image_url = roll_req.failure_image_url
+
     res_message = None
     res_image = None
 
@@ -518,24 +513,29 @@ def roll_click(req_body: dict) -> tuple[int,dict]:
         # FIXME: Improve merge of two expr strings
         die_expr_str_with_adjust = f"{die_expr_str} {adjust_expr_str}"
         die_expr = DieExpr.parse(die_expr_str_with_adjust)
+        render_mode = plan_render_mode(die_expr, EMBED_DESCRIPTION_MAX_LEN, bool(special_roll_types))
 
         # WARN: This will need special handling if special_roll_types supports types besides BEST and WORST
         if special_roll_types:
             multi_roll_type = DieExprMultiRollType[special_roll_types[0]]
-            multi_roll_results = DieExprMultiRoll(die_expr, multi_roll_type).roll()
+            with phase('roll'):
+                multi_roll_results = DieExprMultiRoll(die_expr, multi_roll_type).roll()
             die_roll_val = multi_roll_results.resolved_roll.value
-            result_md = render_multi_roll_results(multi_roll_results)
+            with phase('render'):
+                result_md = render_multi_roll_results(multi_roll_results, render_mode)
         else:
-            die_roll = die_expr.roll()
+            with phase('roll'):
+                die_roll = die_expr.roll()
             die_roll_val = die_roll.value
-            result_md = render_expr_roll(die_roll, True)
+            with phase('render'):
+                result_md = render_expr_roll(die_roll, True, render_mode)
 
     # FIXME: There are likely cases where this will render strangely
     except DieParseException as dpe:
         result_md = str(dpe)
 
     if must_beat:
-        if die_roll_val > int(must_beat):
+        if die_roll_val > must_beat:
             res_embed_color = 5763719 # Green
             res_message = success_text
             res_image = success_image_url
@@ -580,71 +580,38 @@ def roll_click(req_body: dict) -> tuple[int,dict]:
 
 
 
-def adjust_roll_click(req_body: dict) -> tuple[int,dict]:
+@router.route(InteractionType.MESSAGE_COMPONENT, 'askroll', 'adjust_roll_click')
+def adjust_roll_click(req_body: Mapping[str, Any]) -> tuple[int,RawJson]:
     interaction_id = req_body['message']['interaction']['id']
 
     # TODO: Check to make sure user allowed to make adjustments
     button_clicker_user_id = req_body['member']['user']['id']
 
-    # Get roll req data from db
-    roll_req = dynamodb_client.get_item(
-        TableName='rollit-askroll-queue',
-        Key={
-            'interaction_id': {
-                'N': interaction_id,
-            }
-        },
-        ConsistentRead=True
-    )['Item']
-
-    player_roll_adjust = roll_req.get('player_roll_adjust', {}).get('S', None)
-
-    res_data = {
-        'type': 9, # Modal
-        'data': {
-            "title": f"Adjust roll",
-            "custom_id": "adjust_roll_save",
-            "components": [
-                {
-                    "type": 1,
-                    "components": [
-                        {
-                            "type": 4,
-                            "custom_id": "adjust_roll_exp",
-                            "label": "Roll expression",
-                            "style": 1,
-                            "min_length": 2,
-                            "max_length": 100,
-                            "placeholder": "Example: +2 (Bless) -1 (Wisdom)",
-                            "required": True,
-                            "value": player_roll_adjust
-                        }
-                    ]
-                }
-            ]
-        }
-    }
-
-    return 200, res_data
-
-
-# FIXME: Make this flexible enough to accomidate other commands/components
-def message_component(req_body: dict) -> tuple[int,dict]:
-    cmd_name = req_body['message']['interaction']['name']
-    comp_id = req_body['data']['custom_id']
+    state = askroll_state(req_body['data']['custom_id'])
+    if state is not None:
+        player_roll_adjust = state.player_roll_adjust
+    else:
+        # Get roll req data from this container's cache, or just the adjustment from the db
+        with phase('db'):
+            roll_req = askroll_repo().get(
+                interaction_id,
+                ['player_roll_adjust'],
+                lambda cached: askroll_request_matches_embed(cached, req_body['message']['embeds'][0]['fields']),
+            )
+
+        player_roll_adjust = roll_req.player_roll_adjust
+
+    with phase('serialize'):
+        res_body_str = ADJUST_ROLL_MODAL.render(
+            custom_id=encode_custom_id(custom_id_signer, 'adjust_roll_save', state),
+            value=player_roll_adjust,
+        )
 
-    if cmd_name == 'askroll':
-        if comp_id == 'roll_click':
-            return roll_click(req_body)
-        if comp_id == 'adjust_roll_click':
-            return adjust_roll_click(req_body)
-        if comp_id == 'special_roll_types':
-            return special_roll_types_select(req_body)
-        
-    raise ValueError(f"Component `{comp_id}` not implemented for command `{cmd_name}`")
+    return 200, RawJson(res_body_str)
 
 
-def adjust_roll_modal_submit(req_body: dict) -> tuple[int,dict]:
+@router.route(InteractionType.MODAL_SUBMIT, 'askroll', 'adjust_roll_save', deferrable=True)
+def adjust_roll_modal_submit(req_body: Mapping[str, Any]) -> tuple[int,dict]:
     message = req_body['message']
     embeds = message['embeds']
     components = message['components']
@@ -652,22 +619,14 @@ def adjust_roll_modal_submit(req_body: dict) -> tuple[int,dict]:
     interaction_id = req_body['message']['interaction']['id']
     player_roll_adjust = req_body['data']['components'][0]['components'][0]['value']
 
-    dynamodb_client.update_item(
-        TableName="rollit-askroll-queue",
-        Key={
-            'interaction_id': {
-                'N': interaction_id,
-            }
-        },
-        AttributeUpdates={
-            'player_roll_adjust': {
-                'Value': {
-                    'S': player_roll_adjust,
-                },
-                'Action': 'PUT'
-            }
-        },
-    )
+    # The modal's own state is from when Adjust was clicked, and special roll types may have been
+    # picked since, so start from the message's current state instead
+    roll_click_custom_id = component_custom_id(components, 'roll_click')
+    state = askroll_state(roll_click_custom_id) if roll_click_custom_id is not None else None
+
+    askroll_repo().update(interaction_id, player_roll_adjust=player_roll_adjust)
+    if state is not None:
+        stamp_components(custom_id_signer, components, state.with_player_roll_adjust(player_roll_adjust))
 
     prev_adj_val = embed_field_to_value(req_embed_fields, 'Adjustment', False)
 
@@ -699,62 +658,103 @@ def adjust_roll_modal_submit(req_body: dict) -> tuple[int,dict]:
     return 200, res_data
 
 
-def modal_submit(req_body: dict) -> tuple[int,dict]:
-    cmd_name = req_body['message']['interaction']['name']
-    comp_id = req_body['data']['custom_id']
-
-    if cmd_name == 'askroll':
-        if comp_id == 'adjust_roll_save':
-            return adjust_roll_modal_submit(req_body)
+def flush_askroll_writes() -> bool:
+    # Lambda freezes the container once the handler returns, maybe for good, so writes that
+    # don't land in time are handed to SQS for `deferred_handler` to write, where there is one
+    if askroll_writes.flush(ASKROLL_WRITE_FLUSH_TIMEOUT_SECS):
+        return True
 
-    raise ValueError(f"Modal `{comp_id}` not implemented for command `{cmd_name}`")
+    if not DEFERRED_QUEUE_URL:
+        print(f'WARN: {askroll_writes.pending_count()} DynamoDB writes still pending after {ASKROLL_WRITE_FLUSH_TIMEOUT_SECS}s')
+        return False
 
-    
-def ping(req_body: dict) -> tuple[int,dict]:
+    ops = askroll_writes.take_unflushed()
+    try:
+        SqsDeferredQueue(DEFERRED_QUEUE_URL, sqs_client).send_writes(ops)
+    except Exception as e:
+        print(f'ERROR: Failed to send {len(ops)} unflushed DynamoDB writes to SQS: {type(e).__name__}: {e}')
+        for op in ops:
+            askroll_writes.enqueue(op)
+        return False
+
+    print(f'WARN: {len(ops)} DynamoDB writes still pending after {ASKROLL_WRITE_FLUSH_TIMEOUT_SECS}s, sent to SQS')
+    return False
+
+@router.route(InteractionType.PING)
+def ping(req_body: Mapping[str, Any]) -> tuple[int,dict]:
     return 200, {'type':1}
 
 
-cmd_name_dispatch={
-    'roll':roll_cmd,
-    'askroll':askroll_cmd
-}
+def handle_interaction(headers: Mapping[str, str], req_body_str: str, flush_writes: bool = True) -> tuple[int, str]:
+    # The whole verify, dispatch and render pipeline, shared by the Lambda handler and the server.
+    # `headers` must have lowercase names.
+    with tracer.trace('handler') as trace, request_logger.request() as log:
+        log.req_bytes = len(req_body_str)
+
+        # Verify before parsing, so forged and replayed requests are as cheap as possible
+        if not DEV_MODE:
+            with log.phase('verify'):
+                verify_result = request_verifier.verify(headers, req_body_str)
+            if verify_result != VerifyResult.OK:
+                print(f'WARN: Request failed signature verification: {verify_result.value}')
+                log.status = 401
+                return 401, 'invalid request signature'
+
+        # Routing is the first thing to look in the body, so it's what parses it
+        req_body = InteractionBody(req_body_str)
+        with log.phase('parse'):
+            key = route_key(req_body)
+        log.route = '/'.join(str(part) for part in key if part is not None)
+
+        # Only routes the router knows are metric dimensions, so junk custom_ids can't add more
+        if trace is not None:
+            trace.tags['Route'] = log.route if key in router.routes else 'unknown'
+        log.fields['interaction_id'] = req_body.get('id')
+
+        res_body: ResponseBody
+        if deferral_policy.should_defer(key):
+            deferred_queue().send(req_body)
+            res_code, res_body = 200, deferred_ack(req_body)
+            log.fields['deferred'] = True
+        else:
+            res_code, res_body = router.dispatch(req_body)
 
-interaction_type_dispatch={
-    1:ping,
-    2:slash_command,
-    3:message_component,
-    5:modal_submit,
-}
+        with log.phase('serialize'):
+            res_body_str = raw_json(res_body)
 
+        log.status = res_code
+        log.res_bytes = len(res_body_str)
+        log.attach_payload(headers=dict(headers), request=req_body, response=res_body)
 
-def handler(event, context):
-    print(event)
-    req_body_str = event['body']
-    print(req_body_str)
-
-    req_body = json.loads(req_body_str)
-
-    if not DEV_MODE:
-        try:
-            headers = event['headers']
-            signature = headers["x-signature-ed25519"]
-            timestamp = headers["x-signature-timestamp"]
-
-            verify_key = VerifyKey(bytes.fromhex(DISCORD_APP_PUBLIC_KEY))
-            verify_key.verify(f'{timestamp}{req_body_str}'.encode(), bytes.fromhex(signature))
-        except BadSignatureError:
-            print('WARN: Request failed signature verification')
-            return {
-                'statusCode': 401,
-                'body': 'invalid request signature'
-            }
+        # Lambda freezes the container once this returns, so give queued writes a chance to land
+        if flush_writes:
+            with log.phase('db'):
+                flush_askroll_writes()
 
-    interaction_type = req_body['type']
-    res_code, res_body = interaction_type_dispatch[interaction_type](req_body)
-    res_body_str = json.dumps(res_body)
-    print(res_body_str)
+        return res_code, res_body_str
+
+
+def handler(event, context):
+    res_code, res_body_str = handle_interaction(event.get('headers') or {}, event['body'])
 
     return {
         'statusCode': res_code,
         'body': res_body_str
     }
+
+
+def deferred_handler(event, context):
+    # Responds to interactions deferred through SQS, when DEFERRED_QUEUE_URL is set, and writes
+    # what other handlers couldn't flush in time
+    for op in sqs_records_to_write_ops(event):
+        askroll_writes.enqueue(op)
+
+    for req_body in sqs_records_to_interactions(event):
+        with tracer.trace('deferred'):
+            deferred_responder.respond(req_body)
+
+    flush_askroll_writes()
+
+
+# Imports and setup up to here are the cold start, reported with the first trace
+tracer.mark_initialized()
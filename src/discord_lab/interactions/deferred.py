@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from queue import Queue
+from threading import Thread
+import time
+from typing import Any, Callable, Mapping, Protocol
+
+from discord_lab.interactions.env import DISCORD_APP_ID
+from discord_lab.interactions.jsonio import InteractionBody, RawJson, dumps, loads, raw_json
+from discord_lab.interactions.rest import DiscordRestClient, discord_rest
+from discord_lab.interactions.router import InteractionResponseType, InteractionRouter, InteractionType, RouteKey
+from discord_lab.interactions.write_behind import WriteOp
+
+ERROR_CONTENT = "Sorry, something went wrong with that. Please try again."
+
+# Messages on the deferred queue are interactions, unless their `kind` attribute says otherwise
+WRITE_OP_MESSAGE_KIND = 'write_op'
+
+
+@dataclass
+class DeferredStats:
+    delivered: int = 0
+    failed: int = 0
+
+
+# Defers a route once its recent p95 latency is over budget, so it's acked well within Discord's
+# 3 second deadline. Routes are only judged once they've been handled `min_samples` times.
+#
+# Deferred requests may be timed somewhere else entirely, like an SQS worker, so the timings here
+# stop changing once a route is deferred. After `hold_secs` of deferring it, they're dropped, and
+# the route is handled inline until it has `min_samples` new ones to be judged on again.
+class DeferralPolicy:
+
+    def __init__(
+            self,
+            router: InteractionRouter,
+            budget_ms: float,
+            min_samples: int = 20,
+            pct: float = 95,
+            hold_secs: float = 60,
+            clock: Callable[[], float] = time.monotonic):
+
+        self.router = router
+        self.budget_ms = budget_ms
+        self.min_samples = min_samples
+        self.pct = pct
+        self.hold_secs = hold_secs
+        self.clock = clock
+        self._deferred_since: dict[RouteKey, float] = {}
+
+    def should_defer(self, key: RouteKey) -> bool:
+        if self.budget_ms <= 0 or key not in self.router.deferrable:
+            return False
+
+        stats = self.router.stats[key]
+        now = self.clock()
+
+        deferred_since = self._deferred_since.get(key)
+        if deferred_since is not None and now - deferred_since >= self.hold_secs:
+            stats.recent_ns.clear()
+            self._deferred_since.pop(key, None)
+
+        if len(stats.recent_ns) >= self.min_samples and stats.percentile_ms(self.pct) > self.budget_ms:
+            self._deferred_since.setdefault(key, now)
+            return True
+
+        return False
+
+
+def deferred_ack(req_body: Mapping[str, Any]) -> dict:
+    # Commands get a "thinking..." message to edit later. Components and modals on a message just
+    # get acked, and their response edits that message.
+    if req_body.get('type') == InteractionType.APPLICATION_COMMAND:
+        return {'type': InteractionResponseType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE}
+
+    return {'type': InteractionResponseType.DEFERRED_UPDATE_MESSAGE}
+
+
+class DeferredQueue(Protocol):
+
+    def send(self, req_body: Mapping[str, Any]) -> None: ...
+
+
+# Delivers a deferred interaction's real response through its webhook, which stays usable for
+# 15 minutes after the interaction.
+class DeferredResponder:
+
+    def __init__(self, router: InteractionRouter, app_id: str = DISCORD_APP_ID, rest: DiscordRestClient = discord_rest):
+        self.router = router
+        self.app_id = app_id
+        self.rest = rest
+        self.stats = DeferredStats()
+
+    def respond(self, req_body: Mapping[str, Any]) -> None:
+        ack_type = deferred_ack(req_body)['type']
+
+        try:
+            _, res_body = self.router.dispatch(req_body)
+        except Exception as e:
+            print(f'ERROR: Deferred interaction {req_body.get("id")} failed: {type(e).__name__}: {e}')
+            self.stats.failed += 1
+
+            # An acked command shows "thinking..." until it's edited, so don't leave it that way
+            if ack_type == InteractionResponseType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE:
+                self._send(req_body, 'PATCH', '/messages/@original', {'content': ERROR_CONTENT})
+            return
+
+        # Its parts are sent separately, so a response rendered straight to JSON has to be parsed
+        if isinstance(res_body, RawJson):
+            res_body = res_body.parse()
+
+        match res_body.get('type'), ack_type:
+            case InteractionResponseType.CHANNEL_MESSAGE_WITH_SOURCE, InteractionResponseType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE:
+                self._send(req_body, 'PATCH', '/messages/@original', res_body.get('data') or {})
+            case InteractionResponseType.CHANNEL_MESSAGE_WITH_SOURCE, InteractionResponseType.DEFERRED_UPDATE_MESSAGE:
+                # A new message, like an ephemeral "not yer roll", not an edit of the one clicked
+                self._send(req_body, 'POST', '', res_body.get('data') or {})
+            case InteractionResponseType.UPDATE_MESSAGE, InteractionResponseType.DEFERRED_UPDATE_MESSAGE:
+                self._send(req_body, 'PATCH', '/messages/@original', res_body.get('data') or {})
+            case res_type, _:
+                print(f'WARN: Deferred interaction {req_body.get("id")} responded with type {res_type}, which can not be sent after a type {ack_type} ack')
+                self.stats.failed += 1
+
+    def _send(self, req_body: Mapping[str, Any], method: str, path: str, data: dict) -> None:
+        res = self.rest.request(method, f'/webhooks/{self.app_id}/{req_body["token"]}{path}', json=data)
+        if res.status_code >= 400:
+            print(f'ERROR: Deferred response to interaction {req_body.get("id")} failed with {res.status_code}: {res.text}')
+            self.stats.failed += 1
+        else:
+            self.stats.delivered += 1
+
+
+# Stand-in for SQS, for the server and local runs. Deferred interactions are handled by worker
+# threads in this process, through the same router, so their timings count towards deferring.
+#
+# WARN: Not for Lambda, which freezes the container, workers and all, once the handler returns
+class LocalDeferredQueue:
+
+    def __init__(self, respond: Callable[[Mapping[str, Any]], None], workers: int = 2):
+        self.respond = respond
+        self._queue: Queue[Mapping[str, Any]] = Queue()
+        self._workers = [Thread(target=self._work, name=f'deferred-{i}', daemon=True) for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def send(self, req_body: Mapping[str, Any]) -> None:
+        self._queue.put(req_body)
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def _work(self) -> None:
+        while True:
+            req_body = self._queue.get()
+            try:
+                self.respond(req_body)
+            except Exception as e:
+                print(f'ERROR: Deferred interaction worker failed: {type(e).__name__}: {e}')
+            finally:
+                self._queue.task_done()
+
+
+# Sends deferred interactions to SQS, for a Lambda subscribed to the queue to respond to.
+#
+# DynamoDB writes a handler couldn't flush in time go the same way, for that Lambda to write.
+# SQS doesn't keep them in order, so one may land after a later write to the same item.
+class SqsDeferredQueue:
+
+    def __init__(self, queue_url: str, client_factory: Callable[[], Any]):
+        self.queue_url = queue_url
+        self.client_factory = client_factory
+
+    def send(self, req_body: Mapping[str, Any]) -> None:
+        self.client_factory().send_message(QueueUrl=self.queue_url, MessageBody=raw_json(req_body))
+
+    def send_writes(self, ops: list[WriteOp]) -> None:
+        kind = {'kind': {'DataType': 'String', 'StringValue': WRITE_OP_MESSAGE_KIND}}
+        for op in ops:
+            self.client_factory().send_message(QueueUrl=self.queue_url, MessageBody=dumps(asdict(op)), MessageAttributes=kind)
+
+
+def sqs_record_kind(record: dict) -> str|None:
+    return record.get('messageAttributes', {}).get('kind', {}).get('stringValue')
+
+
+def sqs_records_to_interactions(event: dict) -> list[InteractionBody]:
+    return [InteractionBody(record['body']) for record in event.get('Records', []) if sqs_record_kind(record) is None]
+
+
+def sqs_records_to_write_ops(event: dict) -> list[WriteOp]:
+    # They get a fresh set of attempts here
+    return [
+        WriteOp(**{**loads(record['body']), 'attempts': 0})
+        for record in event.get('Records', [])
+        if sqs_record_kind(record) == WRITE_OP_MESSAGE_KIND
+    ]
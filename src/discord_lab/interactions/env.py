@@ -14,3 +14,72 @@ try:
     DISCORD_OAUTH2_CLIENT_SECRET = environ['DISCORD_OAUTH2_CLIENT_SECRET']
 except KeyError:
     raise RuntimeError('One or more envvars not set: DISCORD_APP_ID, DISCORD_APP_PUBLIC_KEY, DISCORD_APP_BOT_AUTH_TOKEN, DISCORD_OAUTH2_CLIENT_SECRET')
+
+
+# Optional settings
+
+# How far a request's `x-signature-timestamp` may be from now before it's rejected as stale
+DISCORD_SIGNATURE_MAX_SKEW_SECS = int(environ.get('DISCORD_SIGNATURE_MAX_SKEW_SECS', '300'))
+
+# Limits on die expressions, checked at parse time so pathological rolls fail fast
+DIE_EXPR_MAX_DICE = int(environ.get('DIE_EXPR_MAX_DICE', '1000'))
+DIE_EXPR_MAX_TERMS = int(environ.get('DIE_EXPR_MAX_TERMS', '20'))
+DIE_EXPR_MAX_LENGTH = int(environ.get('DIE_EXPR_MAX_LENGTH', '256'))
+
+# How long a handler waits for queued DynamoDB writes to go out before returning to Discord
+ASKROLL_WRITE_FLUSH_TIMEOUT_SECS = float(environ.get('ASKROLL_WRITE_FLUSH_TIMEOUT_SECS', '2.0'))
+
+# How long askroll items stay in a container's cache, unless evicted or updated
+ASKROLL_CACHE_TTL_SECS = float(environ.get('ASKROLL_CACHE_TTL_SECS', '900'))
+
+# How long askroll items live in DynamoDB before its TTL deletes them, rolled or not
+ASKROLL_TTL_SECS = int(environ.get('ASKROLL_TTL_SECS', str(7 * 24 * 60 * 60)))
+
+# `memory` swaps DynamoDB for an in-process stand-in, with optional injected latency and errors,
+# so the handler can be load tested without AWS
+DYNAMODB_BACKEND = environ.get('DYNAMODB_BACKEND', 'aws')
+DYNAMODB_MEMORY_LATENCY_MS = float(environ.get('DYNAMODB_MEMORY_LATENCY_MS', '0'))
+DYNAMODB_MEMORY_LATENCY_JITTER_MS = float(environ.get('DYNAMODB_MEMORY_LATENCY_JITTER_MS', '0'))
+DYNAMODB_MEMORY_ERROR_RATE = float(environ.get('DYNAMODB_MEMORY_ERROR_RATE', '0'))
+
+# How long a Discord REST call may take to connect, or go between bytes, before giving up
+DISCORD_REST_TIMEOUT_SECS = float(environ.get('DISCORD_REST_TIMEOUT_SECS', '10'))
+
+# File to keep OAuth2 client credentials tokens in between CLI runs. Unset means memory only.
+DISCORD_OAUTH2_TOKEN_CACHE_PATH = environ.get('DISCORD_OAUTH2_TOKEN_CACHE_PATH')
+
+# Fraction of requests whose full event and response, secrets redacted, go in their log line
+REQUEST_LOG_PAYLOAD_SAMPLE_RATE = float(environ.get('REQUEST_LOG_PAYLOAD_SAMPLE_RATE', '0'))
+
+# Per-request timing spans, as CloudWatch Embedded Metric Format lines and/or appended to a
+# Chrome trace file, for Perfetto or speedscope. Both off means spans cost next to nothing.
+TRACE_EMF = environ.get('TRACE_EMF', '').lower() in ('1', 'true')
+TRACE_CHROME_PATH = environ.get('TRACE_CHROME_PATH')
+
+# Connections the DynamoDB client keeps open for reuse. The server wants at least one per worker.
+DYNAMODB_MAX_POOL_CONNECTIONS = int(environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '10'))
+
+# The long-running interaction server, an alternative to the Lambda handler
+SERVER_HOST = environ.get('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(environ.get('SERVER_PORT', '8080'))
+SERVER_WORKERS = int(environ.get('SERVER_WORKERS', '16'))
+SERVER_KEEPALIVE_SECS = float(environ.get('SERVER_KEEPALIVE_SECS', '75'))
+SERVER_MAX_BODY_BYTES = int(environ.get('SERVER_MAX_BODY_BYTES', str(64 * 1024)))
+
+# Routes whose recent p95 latency is over this budget are acked right away and answered later,
+# once they've been handled at least DEFER_MIN_SAMPLES times. 0 turns deferral off. After
+# DEFER_HOLD_SECS of deferring a route, its timings are dropped and it's measured again.
+#
+# NOTE: In Lambda, deferral only happens with DEFERRED_QUEUE_URL set, since the container is
+#       frozen once the handler returns. The server defers to worker threads without it.
+DEFER_LATENCY_BUDGET_MS = float(environ.get('DEFER_LATENCY_BUDGET_MS', '1500'))
+DEFER_MIN_SAMPLES = int(environ.get('DEFER_MIN_SAMPLES', '20'))
+DEFER_HOLD_SECS = float(environ.get('DEFER_HOLD_SECS', '60'))
+
+# SQS queue for deferred interactions, handled by `aws_lambda.deferred_handler`. Unset means
+# worker threads in this process, which is only for the server and local runs.
+DEFERRED_QUEUE_URL = environ.get('DEFERRED_QUEUE_URL')
+DEFERRED_WORKERS = int(environ.get('DEFERRED_WORKERS', '2'))
+
+# Key for signing state kept in component custom_ids. Unset means one derived from the bot token.
+CUSTOM_ID_SIGNING_KEY = environ.get('CUSTOM_ID_SIGNING_KEY')
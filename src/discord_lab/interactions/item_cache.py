@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import dataclass
+from threading import Lock
+import time
+from typing import Callable
+
+VERSION_ATTR = 'version'
+VERSION_BUMP = {'Value': {'N': '1'}, 'Action': 'ADD'}
+
+
+@dataclass(frozen=True)
+class ItemCacheStats:
+    hits: int
+    misses: int
+    expirations: int
+    evictions: int
+    invalidations: int
+    size: int
+    max_size: int
+
+
+@dataclass
+class CachedItem:
+    item: dict[str, dict]
+    expires_at: float
+
+
+def item_version(item: dict[str, dict]) -> int:
+    return int(item.get(VERSION_ATTR, {}).get('N', '0'))
+
+
+# Bounded LRU cache of DynamoDB items (in DynamoDB's attribute value format), keyed on the
+# item's hash key, with entries expiring after `ttl_secs`. Items carry a `version` attribute
+# bumped on every update, cached or not, so updates made from a cached item can be made
+# conditional on the stored item still being at that version. Each `get` hands out a copy.
+class ItemCache:
+
+    def __init__(self, max_size: int = 256, ttl_secs: float = 900, clock: Callable[[], float] = time.monotonic):
+        if max_size < 0:
+            raise ValueError(f'Cache size {max_size} is less than 0')
+
+        self.max_size = max_size
+        self.ttl_secs = ttl_secs
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._items: OrderedDict[str, CachedItem] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> dict[str, dict]|None:
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+
+            if cached.expires_at <= self.clock():
+                del self._items[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+
+            return deepcopy(cached.item)
+
+    def put(self, key: str, item: dict[str, dict]) -> None:
+        if not self.max_size:
+            return
+
+        with self._lock:
+            self._items[key] = CachedItem(deepcopy(item), self.clock() + self.ttl_secs)
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, key: str, attr_updates: dict[str, dict]) -> tuple[dict[str, dict], dict[str, dict]|None]:
+        # Applies `update_item` style `AttributeUpdates` to the cached item, if there is one, and
+        # returns the updates to send with the version bumped, along with the `Expected` condition
+        # that the stored item is still at the cached version. Not cached means no condition, but
+        # the version is still bumped, with an ADD, so other containers' cached copies go stale.
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is None or cached.expires_at <= self.clock():
+                return {**attr_updates, VERSION_ATTR: VERSION_BUMP}, None
+
+            version = item_version(cached.item)
+            versioned_updates = {**attr_updates, VERSION_ATTR: {'Value': {'N': str(version + 1)}, 'Action': 'PUT'}}
+
+            for attr, update in versioned_updates.items():
+                if update.get('Action', 'PUT') == 'DELETE':
+                    cached.item.pop(attr, None)
+                else:
+                    cached.item[attr] = deepcopy(update['Value'])
+
+            cached.expires_at = self.clock() + self.ttl_secs
+            self._items.move_to_end(key)
+
+        return versioned_updates, {VERSION_ATTR: {'Value': {'N': str(version)}}}
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if self._items.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+            self.expirations = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def stats(self) -> ItemCacheStats:
+        with self._lock:
+            return ItemCacheStats(self.hits, self.misses, self.expirations, self.evictions, self.invalidations, len(self._items), self.max_size)
+
+    def __len__(self) -> int:
+        return len(self._items)
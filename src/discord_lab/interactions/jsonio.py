@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+from typing import Any, Iterator, Mapping
+
+# NOTE: orjson is optional. It parses and serializes interaction bodies 2-3x faster than the
+#       standard library, but everything works the same without it.
+try:
+    import orjson
+except ImportError:
+    orjson = None # type: ignore[assignment]
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Compact, and UTF-8 rather than \u escapes, which is what orjson always writes. Both backends
+# give the same text for anything but floats in exponent form, like 1e+20 vs 1e20, which
+# responses don't have, so they don't change with the backend.
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(s: str|bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(s)
+
+    return json.loads(s)
+
+
+def dumps(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            # orjson won't take ints over 64 bits, non-str keys, or types it doesn't know, which
+            # the standard library still handles, or fails on with its usual error
+            pass
+
+    return _encoder.encode(obj)
+
+
+# An interaction's request body as received, that's only parsed once something in it is looked
+# up. Bodies that are only passed on, like deferred requests sent on to SQS, never pay for
+# parsing or re-encoding them.
+class InteractionBody(Mapping[str, Any]):
+    __slots__ = ('raw', '_parsed')
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self._parsed: dict[str, Any]|None = None
+
+    @property
+    def parsed(self) -> dict[str, Any]:
+        if self._parsed is None:
+            parsed = loads(self.raw)
+            if not isinstance(parsed, dict):
+                raise ValueError(f'Interaction body is a JSON {type(parsed).__name__}, not an object')
+            self._parsed = parsed
+
+        return self._parsed
+
+    @property
+    def is_parsed(self) -> bool:
+        return self._parsed is not None
+
+    def __getitem__(self, key: str) -> Any:
+        return self.parsed[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.parsed.get(key, default)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.parsed)
+
+    def __len__(self) -> int:
+        return len(self.parsed)
+
+    def __repr__(self) -> str:
+        # The raw body has the interaction's token in it, so never show it
+        return f'InteractionBody({len(self.raw)} bytes{", parsed" if self.is_parsed else ""})'
+
+
+# A response body that's already JSON, like a rendered `JsonTemplate`, and is sent as is. It's
+# only parsed by what needs to look inside, like deferred responses.
+@dataclass(frozen=True)
+class RawJson:
+    text: str
+
+    def parse(self) -> Any:
+        return loads(self.text)
+
+
+def raw_json(obj: Mapping[str, Any]|RawJson) -> str:
+    # The body as received or rendered, when there is one, so it can be passed on without re-encoding
+    if isinstance(obj, RawJson):
+        return obj.text
+    if isinstance(obj, InteractionBody):
+        return obj.raw
+
+    return dumps(obj)
@@ -1,19 +1,21 @@
-import os
-
-import requests
+import argparse
+from dataclasses import dataclass, field
+import hashlib
+import json
+from typing import Any
 
 from discord_lab.interactions import env
 from discord_lab.interactions.auth import get_oauth2_access_token
+from discord_lab.interactions.rest import discord_rest
 from discord_lab.dice import DieExprMultiRollType
 
-API_URL_BASE='https://discord.com/api/v10'
 INTERACTION_SCOPES=[
     'applications.commands',
     'applications.commands.update'
 ]
 
 def list_global_app_cmds(app_id):
-    endpoint = f'{API_URL_BASE}/applications/{app_id}/commands'
+    endpoint = f'/applications/{app_id}/commands'
 
     access_token = get_oauth2_access_token(INTERACTION_SCOPES)
 
@@ -21,7 +23,7 @@ def list_global_app_cmds(app_id):
         'Authorization': f'Bearer {access_token}'
     }
 
-    res = requests.get(endpoint, headers=req_headers)
+    res = discord_rest.get(endpoint, headers=req_headers)
     res_data = res.json()
 
     if res.status_code != 200:
@@ -38,7 +40,7 @@ def get_global_app_cmd(app_id, cmd_name:str):
 
 
 def sync_global_app_cmd(app_id: str, cmd_json: dict):
-    endpoint = f'{API_URL_BASE}/applications/{app_id}/commands'
+    endpoint = f'/applications/{app_id}/commands'
 
     access_token = get_oauth2_access_token(INTERACTION_SCOPES)
 
@@ -46,7 +48,7 @@ def sync_global_app_cmd(app_id: str, cmd_json: dict):
         'Authorization': f'Bearer {access_token}'
     }
 
-    res = requests.post(endpoint, headers=req_headers, json=cmd_json)
+    res = discord_rest.post(endpoint, headers=req_headers, json=cmd_json)
     res_data = res.json()
 
     if res.status_code not in [200,201]:
@@ -59,7 +61,7 @@ def delete_global_app_cmd(app_id: str, cmd_name: str):
     cmd = get_global_app_cmd(app_id, cmd_name)
     cmd_id = cmd['id']
 
-    endpoint = f'{API_URL_BASE}/applications/{app_id}/commands/{cmd_id}'
+    endpoint = f'/applications/{app_id}/commands/{cmd_id}'
 
     access_token = get_oauth2_access_token(INTERACTION_SCOPES)
 
@@ -67,14 +69,127 @@ def delete_global_app_cmd(app_id: str, cmd_name: str):
         'Authorization': f'Bearer {access_token}'
     }
 
-    res = requests.delete(endpoint, headers=req_headers)
+    res = discord_rest.delete(endpoint, headers=req_headers)
 
     if res.status_code != 204:
         res_data = res.json()
         raise RuntimeError(f'Failed to authenticate: {res_data}')
 
 
-app_id = env.DISCORD_APP_ID
+def bulk_overwrite_global_app_cmds(app_id: str, cmds: list[dict]) -> list[dict]:
+    endpoint = f'/applications/{app_id}/commands'
+
+    access_token = get_oauth2_access_token(INTERACTION_SCOPES)
+
+    req_headers = {
+        'Authorization': f'Bearer {access_token}'
+    }
+
+    res = discord_rest.put(endpoint, headers=req_headers, json=cmds)
+    res_data = res.json()
+
+    if res.status_code != 200:
+        raise RuntimeError(f'Could not overwrite global app commands: {res_data}')
+
+    return res_data
+
+
+# Fields compared when diffing commands, with the defaults Discord fills in for any left out
+CMD_FIELD_DEFAULTS: dict[str, Any] = {
+    'name': None,
+    'type': 1,
+    'description': '',
+    'options': [],
+    'default_member_permissions': None,
+    'nsfw': False,
+}
+
+CMD_OPTION_FIELD_DEFAULTS: dict[str, Any] = {
+    'type': None,
+    'name': None,
+    'description': '',
+    'required': False,
+    'choices': [],
+    'options': [],
+    'min_length': None,
+    'max_length': None,
+    'min_value': None,
+    'max_value': None,
+    'autocomplete': False,
+}
+
+CMD_CHOICE_FIELD_DEFAULTS: dict[str, Any] = {
+    'name': None,
+    'value': None,
+}
+
+
+def _normalize(obj: dict, field_defaults: dict[str, Any]) -> dict:
+    normalized = {}
+    for name, default in field_defaults.items():
+        value = obj.get(name, default)
+        if value == default:
+            continue
+
+        match name:
+            case 'options':
+                value = [_normalize(option, CMD_OPTION_FIELD_DEFAULTS) for option in value]
+            case 'choices':
+                value = [_normalize(choice, CMD_CHOICE_FIELD_DEFAULTS) for choice in value]
+
+        normalized[name] = value
+
+    return normalized
+
+
+def cmd_hash(cmd: dict) -> str:
+    # Only the fields we define, minus any left at Discord's defaults, so a command fetched from
+    # Discord hashes the same as the local definition it was synced from. Anything Discord adds,
+    # like `id` or `version`, is ignored.
+    normalized = _normalize(cmd, CMD_FIELD_DEFAULTS)
+
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+@dataclass
+class CmdSyncPlan:
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+
+    @property
+    def in_sync(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+def plan_cmd_sync(local_cmds: list[dict], remote_cmds: list[dict]) -> CmdSyncPlan:
+    remote_hashes = {cmd['name']: cmd_hash(cmd) for cmd in remote_cmds}
+    plan = CmdSyncPlan()
+
+    for cmd in local_cmds:
+        remote_hash = remote_hashes.pop(cmd['name'], None)
+        if remote_hash is None:
+            plan.added.append(cmd['name'])
+        elif remote_hash != cmd_hash(cmd):
+            plan.changed.append(cmd['name'])
+        else:
+            plan.unchanged.append(cmd['name'])
+
+    plan.removed.extend(remote_hashes)
+
+    return plan
+
+
+def sync_global_app_cmds(app_id: str, cmds: list[dict], dry_run: bool = False) -> CmdSyncPlan:
+    # Fetch what's registered once, and only if it differs, replace all of it in one request
+    plan = plan_cmd_sync(cmds, list_global_app_cmds(app_id))
+
+    if not plan.in_sync and not dry_run:
+        bulk_overwrite_global_app_cmds(app_id, cmds)
+
+    return plan
+
 
 # `/roll` command
 roll_cmd = {
@@ -107,7 +222,6 @@ roll_cmd = {
         }
     ]
 }
-sync_global_app_cmd(app_id, roll_cmd)
 
 
 # `/askroll` command
@@ -162,8 +276,8 @@ askroll_cmd = {
             'name': 'success-text',
             'description': "Success text",
             'required': False,
-            'min_value': 3,
-            'max_value': 100
+            'min_length': 3,
+            'max_length': 100
         },
         {
             'type': 11,
@@ -176,8 +290,8 @@ askroll_cmd = {
             'name': 'failure-text',
             'description': "Failure text",
             'required': False,
-            'min_value': 3,
-            'max_value': 100
+            'min_length': 3,
+            'max_length': 100
         },
         {
             'type': 11,
@@ -187,4 +301,29 @@ askroll_cmd = {
         },
     ]
 }
-sync_global_app_cmd(app_id, askroll_cmd)
\ No newline at end of file
+
+
+GLOBAL_APP_CMDS = [roll_cmd, askroll_cmd]
+
+
+def main(argv: list[str]|None = None) -> None:
+    arg_parser = argparse.ArgumentParser(description='Sync global app commands with Discord')
+    arg_parser.add_argument('--dry-run', action='store_true', help='Show what would change without changing it')
+    args = arg_parser.parse_args(argv)
+
+    plan = sync_global_app_cmds(env.DISCORD_APP_ID, GLOBAL_APP_CMDS, args.dry_run)
+
+    for label, names in [('Added', plan.added), ('Changed', plan.changed), ('Removed', plan.removed), ('Unchanged', plan.unchanged)]:
+        if names:
+            print(f"{label}: {', '.join(names)}")
+
+    if plan.in_sync:
+        print('Commands already in sync')
+    elif args.dry_run:
+        print('Dry run, so nothing was synced')
+    else:
+        print(f'Synced {len(GLOBAL_APP_CMDS)} commands')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+from collections import Counter
+from enum import Enum
+
+from discord_lab.dice import BulkDieRoll, DieExpr, DieExprMultiRollResult, DieExprRoll, DieRoll, DieType, IntTermOperationResult, LabeledTerm, MultiDie, MultiDieRoll, MultiDieTermOperationResult
+from discord_lab.tracing import traced
+
+# Discord's limits on message content and on embed descriptions
+CONTENT_MAX_LEN = 2000
+EMBED_DESCRIPTION_MAX_LEN = 4096
+
+EMOJI_ID_BY_CODE = {
+    'D4_1':'<:d4_1:1282216833335955467>',
+    'D4_2':'<:d4_2:1282216846401208331>',
+    'D4_3':'<:d4_3:1282216862834495520>',
+    'D4_4':'<:d4_4:1282216878072135720>',
+    'D6_1':'<:d6_1:1282212244398276640>',
+    'D6_2':'<:d6_2:1282212258780418158>',
+    'D6_3':'<:d6_3:1282212272265232448>',
+    'D6_4':'<:d6_4:1282212289310621717>',
+    'D6_5':'<:d6_5:1282212308982169653>',
+    'D6_6':'<:d6_6:1282212638297817198>',
+    'D8_8':'<:d8_8:1282224447620776058>',
+    'D8_7':'<:d8_7:1282224433448091659>',
+    'D8_6':'<:d8_6:1282224414439641119>',
+    'D8_5':'<:d8_5:1282224400380203008>',
+    'D8_4':'<:d8_4:1282224384655757396>',
+    'D8_3':'<:d8_3:1282224372081233981>',
+    'D8_2':'<:d8_2:1282224356134617098>',
+    'D8_1':'<:d8_1:1282224323486023731>',
+    'D10_10':'<:d10_10:1282232213064253440>',
+    'D10_9':'<:d10_9:1282232197952045119>',
+    'D10_8':'<:d10_8:1282232181506183198>',
+    'D10_7':'<:d10_7:1282232165744246804>',
+    'D10_6':'<:d10_6:1282232150413803540>',
+    'D10_5':'<:d10_5:1282232135176159284>',
+    'D10_4':'<:d10_4:1282232120257019926>',
+    'D10_3':'<:d10_3:1282232104855408701>',
+    'D10_2':'<:d10_2:1282232090938708035>',
+    'D10_1':'<:d10_1:1282232071707824140>',
+    'D10_0':'<:d10_0:1282479588311830629>',
+    'D10_00':'<:d10_00:1282474745606049865>',
+    'D10_90':'<:d10_90:1282474994336796692>',
+    'D10_80':'<:d10_80:1282474906071728158>',
+    'D10_70':'<:d10_70:1282474883162574919>',
+    'D10_60':'<:d10_60:1282474867303907361>',
+    'D10_50':'<:d10_50:1282474851503706157>',
+    'D10_40':'<:d10_40:1282474836551139380>',
+    'D10_30':'<:d10_30:1282474822055624776>',
+    'D10_20':'<:d10_20:1282474763754803240>',
+    'D12_12':'<:d12_12:1282232530807951421>',
+    'D12_11':'<:d12_11:1282232516375478346>',
+    'D12_10':'<:d12_10:1282232497718951968>',
+    'D12_9':'<:d12_9:1282232461941669888>',
+    'D12_8':'<:d12_8:1282232418627227689>',
+    'D12_7':'<:d12_7:1282232395625664553>',
+    'D12_6':'<:d12_6:1282232379829780520>',
+    'D12_5':'<:d12_5:1282232364835016704>',
+    'D12_4':'<:d12_4:1282232349295247360>',
+    'D12_3':'<:d12_3:1282232328462270485>',
+    'D12_2':'<:d12_2:1282232312729305119>',
+    'D12_1':'<:d12_1:1282232295973195787>',
+    'D20_20':'<:d20_20:1282233169256382545>',
+    'D20_19':'<:d20_19:1282233139774623805>',
+    'D20_18':'<:d20_18:1282233124310356069>',
+    'D20_17':'<:d20_17:1282233108376059914>',
+    'D20_16':'<:d20_16:1282233092240703539>',
+    'D20_15':'<:d20_15:1282233077233615000>',
+    'D20_14':'<:d20_14:1282233060858789888>',
+    'D20_13':'<:d20_13:1282233045105119242>',
+    'D20_12':'<:d20_12:1282232901949198409>',
+    'D20_11':'<:d20_11:1282232844088774707>',
+    'D20_10':'<:d20_10:1282232824602034249>',
+    'D20_9':'<:d20_9:1282232803181723740>',
+    'D20_8':'<:d20_8:1282232786778066946>',
+    'D20_7':'<:d20_7:1282232770705358869>',
+    'D20_6':'<:d20_6:1282232755173855294>',
+    'D20_5':'<:d20_5:1282232739386363935>',
+    'D20_4':'<:d20_4:1282232728754061323>',
+    'D20_3':'<:d20_3:1282232708482863115>',
+    'D20_2':'<:d20_2:1282232694108979221>',
+    'D20_1':'<:d20_1:1282232679512805467>',
+}
+
+
+def _die_face_emojis(die_type: DieType) -> tuple[str, ...]:
+    faces = ['']
+
+    for value in range(1, die_type + 1):
+        if die_type != DieType.D100:
+            faces.append(EMOJI_ID_BY_CODE[f"{die_type.name}_{value}"])
+        elif value == 100:
+            faces.append(EMOJI_ID_BY_CODE["D10_00"] + EMOJI_ID_BY_CODE["D10_0"])
+        else:
+            tens_val, ones_val = divmod(value, 10)
+            tens_emoji_id = EMOJI_ID_BY_CODE[f"D10_{tens_val * 10}"] if tens_val else EMOJI_ID_BY_CODE["D10_00"]
+            faces.append(tens_emoji_id + EMOJI_ID_BY_CODE[f"D10_{ones_val}"])
+
+    return tuple(faces)
+
+
+def _build_die_face_emojis() -> tuple[tuple[str, ...], ...]:
+    die_face_emojis: list[tuple[str, ...]] = [()] * (max(DieType) + 1)
+    for die_type in DieType:
+        die_face_emojis[die_type] = _die_face_emojis(die_type)
+
+    return tuple(die_face_emojis)
+
+# Markdown for every face of every die, indexed by `DIE_FACE_EMOJIS[die_type][value]`. D100s
+# are pairs of D10 emojis, tens then ones. Slots for unsupported side counts are empty.
+DIE_FACE_EMOJIS = _build_die_face_emojis()
+
+MAX_FACE_EMOJI_LEN = tuple(max(map(len, faces), default=0) for faces in DIE_FACE_EMOJIS)
+
+
+class RenderMode(Enum):
+    # Every die as its own emoji
+    DICE = 'dice'
+    # Count of each face rolled, e.g. "6×⚅ 4×⚄"
+    GROUPED = 'grouped'
+    # Just the subtotal of each term
+    TOTALS = 'totals'
+
+
+def _multidie_md_max_len(multi_die: MultiDie, mode: RenderMode) -> int:
+    match mode:
+        case RenderMode.DICE:
+            return multi_die.multiplier * (MAX_FACE_EMOJI_LEN[multi_die.type] + 1)
+        case RenderMode.GROUPED:
+            groups = min(multi_die.multiplier, multi_die.type)
+            return groups * (len(str(multi_die.multiplier)) + len('×') + MAX_FACE_EMOJI_LEN[multi_die.type] + 1)
+        case RenderMode.TOTALS:
+            return len(str(multi_die)) + len(': ')
+
+
+def _total_md_max_len(labeled_terms: list[LabeledTerm]) -> int:
+    max_abs_total = sum(t.term.multiplier * t.term.type if isinstance(t.term, MultiDie) else t.term for t in labeled_terms)
+
+    return len('\n# -') + len(str(max_abs_total))
+
+
+def estimate_expr_roll_len(die_expr: DieExpr, mode: RenderMode, include_total: bool) -> int:
+    # Upper bound on the length of `render_expr_roll` output for any roll of `die_expr`. Only
+    # looks at the parsed expression, so it's cheap enough to check before rolling anything.
+    labeled_terms = [die_expr.first_term, *(t.labeled_term for t in die_expr.term_ops)]
+    md_len = 0
+
+    for labeled_term in labeled_terms:
+        term = labeled_term.term
+
+        # Room for a leading space and operator
+        md_len += len(' + ')
+
+        if isinstance(term, MultiDie):
+            md_len += _multidie_md_max_len(term, mode) + len(str(term.multiplier * term.type)) + 1
+        else:
+            md_len += len(str(term))
+
+        if labeled_term.label:
+            md_len += len(labeled_term.label) + len(' ()')
+
+    if include_total:
+        md_len += _total_md_max_len(labeled_terms)
+
+    return md_len
+
+
+def estimate_multi_roll_len(die_expr: DieExpr, mode: RenderMode) -> int:
+    # Both rolls get highlighted if they tie, plus the resolved total
+    expr_md_max_len = estimate_expr_roll_len(die_expr, mode, False) + len('# ') + len(' :point_left:') + len('\n')
+    labeled_terms = [die_expr.first_term, *(t.labeled_term for t in die_expr.term_ops)]
+
+    return 2 * expr_md_max_len + _total_md_max_len(labeled_terms)
+
+
+def plan_render_mode(die_expr: DieExpr, max_len: int, multi_roll: bool = False) -> RenderMode:
+    # Most detailed mode guaranteed to fit in `max_len`, so nothing too big is ever rendered.
+    # Falls back to `TOTALS`, which expression limits keep small.
+    for mode in (RenderMode.DICE, RenderMode.GROUPED):
+        if multi_roll:
+            md_max_len = estimate_multi_roll_len(die_expr, mode)
+        else:
+            md_max_len = estimate_expr_roll_len(die_expr, mode, True)
+
+        if md_max_len <= max_len:
+            return mode
+
+    return RenderMode.TOTALS
+
+
+def die_roll_to_md(roll: DieRoll) -> str:
+    return DIE_FACE_EMOJIS[roll.type][roll.value]
+
+
+def render_single_die_roll(roll: DieRoll) -> str:
+    return die_roll_to_md(roll)
+
+
+def _multidie_roll_md(rolls: MultiDieRoll|BulkDieRoll) -> str:
+    # Bulk rolls go straight from their value array to emojis, without building `DieRoll`s
+    if isinstance(rolls, BulkDieRoll):
+        return ' '.join(map(DIE_FACE_EMOJIS[rolls.type].__getitem__, rolls.values))
+
+    return ' '.join([DIE_FACE_EMOJIS[roll.type][roll.value] for roll in rolls.details])
+
+
+def _single_die_md(rolls: MultiDieRoll|BulkDieRoll) -> str|None:
+    if isinstance(rolls, BulkDieRoll):
+        return DIE_FACE_EMOJIS[rolls.type][rolls.values[0]] if len(rolls) == 1 else None
+
+    return die_roll_to_md(rolls.details[0]) if len(rolls.details) == 1 else None
+
+
+def _grouped_multidie_roll_md(rolls: MultiDieRoll|BulkDieRoll) -> str:
+    if isinstance(rolls, BulkDieRoll):
+        die_type = rolls.type
+        counts = rolls.counts()
+    else:
+        die_type = rolls.details[0].type
+        counts = Counter(roll.value for roll in rolls.details)
+
+    face_emojis = DIE_FACE_EMOJIS[die_type]
+
+    return ' '.join([f'{counts[value]}×{face_emojis[value]}' for value in sorted(counts, reverse=True)])
+
+
+def render_multidie_roll(rolls: MultiDieRoll|BulkDieRoll, include_total: bool) -> str:
+    single_die_md = _single_die_md(rolls)
+    if single_die_md is not None:
+        return single_die_md
+
+    die_md = _multidie_roll_md(rolls)
+    if include_total:
+        die_md += f' {rolls.value}'
+
+    return die_md
+
+
+@traced('render_expr_roll')
+def render_expr_roll(rolls: DieExprRoll, include_total: bool, mode: RenderMode = RenderMode.DICE) -> str:
+    roll_results = rolls.results
+
+    # If only a single die is rolled, just show that roll without the math bits
+    if len(roll_results) == 1 and mode != RenderMode.TOTALS:
+        single_result = roll_results[0]
+        if isinstance(single_result, MultiDieTermOperationResult):
+            single_die_md = _single_die_md(single_result.rolls)
+            if single_die_md is not None:
+                return single_die_md
+
+    # Everything is written to one buffer and joined once at the end
+    buf: list[str] = []
+    write = buf.append
+    include_subtotals = len(roll_results) > 1
+
+    for idx, rr in enumerate(roll_results):
+        if idx:
+            write(' ')
+
+        op_symbol = rr.term_op.operation.value
+        if op_symbol:
+            write(op_symbol)
+            write(' ')
+
+        match rr:
+            case IntTermOperationResult():
+                write(str(rr.value))
+            case MultiDieTermOperationResult() if mode == RenderMode.TOTALS:
+                write(str(rr.term_op.labeled_term.term))
+                write(': ')
+                write(str(rr.rolls.value))
+            case MultiDieTermOperationResult():
+                single_die_md = _single_die_md(rr.rolls)
+                if single_die_md is not None:
+                    write(single_die_md)
+                else:
+                    if mode == RenderMode.GROUPED:
+                        write(_grouped_multidie_roll_md(rr.rolls))
+                    else:
+                        write(_multidie_roll_md(rr.rolls))
+
+                    if include_subtotals:
+                        write(' ')
+                        write(str(rr.rolls.value))
+
+        label = rr.term_op.labeled_term.label
+        if label:
+            write(' (')
+            write(label)
+            write(')')
+
+    if include_total:
+        write('\n# ')
+        write(str(rolls.value))
+
+    return ''.join(buf)
+
+
+@traced('render_multi_roll_results')
+def render_multi_roll_results(multi_roll_results: DieExprMultiRollResult, mode: RenderMode = RenderMode.DICE) -> str:
+    roll_1, roll_2 = multi_roll_results.rolls
+    resolved_roll = multi_roll_results.resolved_roll
+    
+    roll_1_md = render_expr_roll(roll_1, False, mode)
+    if resolved_roll == roll_1:
+        roll_1_md = f"# {roll_1_md} :point_left:"
+
+    roll_2_md = render_expr_roll(roll_2, False, mode)
+    if resolved_roll == roll_2:
+        roll_2_md = f"# {roll_2_md} :point_left:"
+
+    content = f"{roll_1_md}\n{roll_2_md}\n# {resolved_roll.value}"
+
+    return content
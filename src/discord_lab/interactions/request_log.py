@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import json
+import random
+import sys
+import time
+from typing import Any, Callable, ContextManager, Iterator, TextIO
+
+from discord_lab.interactions.jsonio import RawJson
+from discord_lab.tracing import span
+
+REDACTED = '[REDACTED]'
+
+# Keys whose values are secrets, wherever they are in a payload. An interaction's `token` can
+# post as the bot for 15 minutes.
+REDACT_KEYS = frozenset(['token', 'access_token', 'authorization', 'x-signature-ed25519', 'cookie'])
+
+
+def redact(obj: Any) -> Any:
+    match obj:
+        case RawJson():
+            return redact(obj.parse())
+        case Mapping():
+            return {k: REDACTED if str(k).lower() in REDACT_KEYS else redact(v) for k, v in obj.items()}
+        case list():
+            return [redact(v) for v in obj]
+        case _:
+            return obj
+
+
+@dataclass
+class RequestLog:
+    # What one request did, written out as a single JSON line once it's done
+    route: str|None = None
+    status: int|None = None
+    req_bytes: int|None = None
+    res_bytes: int|None = None
+    error: str|None = None
+    phase_ns: dict[str, int] = field(default_factory=dict)
+    fields: dict[str, Any] = field(default_factory=dict)
+    payload: dict[str, Any]|None = None
+    sample_payload: bool = False
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # Phases entered more than once, like several DynamoDB calls, add up. Each is also a span
+        # of the current trace, if there is one.
+        start_ns = time.perf_counter_ns()
+        try:
+            with span(name):
+                yield
+        finally:
+            self.phase_ns[name] = self.phase_ns.get(name, 0) + time.perf_counter_ns() - start_ns
+
+    def attach_payload(self, **payload: Any) -> None:
+        if self.sample_payload:
+            self.payload = payload
+
+    def to_json(self, total_ns: int) -> str:
+        line: dict[str, Any] = {
+            'route': self.route,
+            'status': self.status,
+            'ms': round(total_ns / 1_000_000, 3),
+            'phases_ms': {name: round(ns / 1_000_000, 3) for name, ns in self.phase_ns.items()},
+            'req_bytes': self.req_bytes,
+            'res_bytes': self.res_bytes,
+            **self.fields,
+        }
+
+        if self.error is not None:
+            line['error'] = self.error
+
+        if self.payload is not None:
+            line['payload'] = redact(self.payload)
+
+        return json.dumps(line, separators=(',', ':'), default=str)
+
+
+current_request_log: ContextVar[RequestLog|None] = ContextVar('current_request_log', default=None)
+
+
+def phase(name: str) -> ContextManager[None]:
+    # Times a phase of the current request, from anywhere in its call stack. Does nothing
+    # outside of a request.
+    log = current_request_log.get()
+    return log.phase(name) if log is not None else nullcontext()
+
+
+# Writes one compact JSON line per request, instead of dumping whole events. Full payloads,
+# with secrets redacted, are only included for `payload_sample_rate` of requests.
+class RequestLogger:
+
+    def __init__(self, payload_sample_rate: float = 0.0, stream: TextIO|None = None, rand: Callable[[], float] = random.random):
+        if not 0 <= payload_sample_rate <= 1:
+            raise ValueError(f'Payload sample rate {payload_sample_rate} is not between 0 and 1')
+
+        self.payload_sample_rate = payload_sample_rate
+        self.stream = stream
+        self.rand = rand
+
+    @contextmanager
+    def request(self) -> Iterator[RequestLog]:
+        log = RequestLog(sample_payload=self.payload_sample_rate > 0 and self.rand() < self.payload_sample_rate)
+        token = current_request_log.set(log)
+        start_ns = time.perf_counter_ns()
+
+        try:
+            yield log
+        except Exception as e:
+            log.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            current_request_log.reset(token)
+            stream = self.stream or sys.stdout
+            stream.write(log.to_json(time.perf_counter_ns() - start_ns) + '\n')
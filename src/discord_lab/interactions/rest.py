@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import re
+from threading import Lock
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+from discord_lab.interactions.env import DISCORD_API_URL_BASE, DISCORD_REST_TIMEOUT_SECS
+from discord_lab.tracing import span
+
+if TYPE_CHECKING:
+    from requests import Response, Session
+
+USER_AGENT = 'DiscordBot (discord-lab, 0.1.0)'
+
+# IDs in a path that aren't one of Discord's "major parameters", which get buckets of their own
+MINOR_ID_RE = re.compile(r'(?<!/channels)(?<!/guilds)(?<!/webhooks)/\d+')
+
+# Webhook and interaction tokens, which are different for every interaction. Webhooks are
+# bucketed on their ID alone.
+TOKEN_RE = re.compile(r'(/(?:webhooks|interactions)/\d+)/[^/]+')
+
+# How often buckets whose limits have reset are dropped
+BUCKET_PRUNE_INTERVAL_SECS = 60
+
+
+def route_key(method: str, path: str) -> str:
+    path = TOKEN_RE.sub(r'\1/:token', path)
+    return f'{method.upper()} {MINOR_ID_RE.sub("/:id", path)}'
+
+
+@dataclass
+class RateLimitBucket:
+    remaining: int
+    reset_at: float
+
+
+@dataclass
+class RestStats:
+    requests: int = 0
+    rate_limited: int = 0
+    bucket_waits: int = 0
+    wait_secs: float = 0.0
+
+
+# One shared client for all Discord REST calls. Its `requests.Session` keeps connections to
+# discord.com alive, so warm invocations skip the TCP and TLS handshakes. It tracks Discord's
+# `X-RateLimit-*` headers per route, waiting out an exhausted bucket rather than sending a
+# request bound to get a 429, and retries any 429 it does get after its `retry_after`.
+class DiscordRestClient:
+
+    def __init__(
+            self,
+            base_url: str = DISCORD_API_URL_BASE,
+            timeout_secs: float = DISCORD_REST_TIMEOUT_SECS,
+            max_retries: int = 3,
+            pool_maxsize: int = 10,
+            session_factory: Callable[[], Session]|None = None,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep):
+
+        self.base_url = base_url
+        self.timeout_secs = timeout_secs
+        self.max_retries = max_retries
+        self.pool_maxsize = pool_maxsize
+        self.session_factory = session_factory or self._new_session
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = RestStats()
+        self._session: Session|None = None
+        self._bucket_by_route: dict[str, str] = {}
+        self._buckets: dict[str, RateLimitBucket] = {}
+        self._global_reset_at = 0.0
+        self._next_prune_at = 0.0
+        self._lock = Lock()
+
+    @property
+    def session(self) -> Session:
+        with self._lock:
+            if self._session is None:
+                self._session = self.session_factory()
+
+            return self._session
+
+    def _new_session(self) -> Session:
+        # requests is only imported once a REST call is actually made, to keep it out of cold starts
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize))
+        session.headers['User-Agent'] = USER_AGENT
+
+        return session
+
+    def get(self, path: str, **kwargs: Any) -> Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs: Any) -> Response:
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path: str, **kwargs: Any) -> Response:
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path: str, **kwargs: Any) -> Response:
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path: str, **kwargs: Any) -> Response:
+        return self.request('DELETE', path, **kwargs)
+
+    def request(self, method: str, path: str, **kwargs: Any) -> Response:
+        # Takes a path under `base_url`, or a full URL for anything outside the API, like OAuth2
+        url = path if path.startswith('https://') else f'{self.base_url}{path}'
+        route = route_key(method, path.removeprefix(self.base_url))
+        kwargs.setdefault('timeout', self.timeout_secs)
+
+        retries = 0
+        while True:
+            self._wait_for_bucket(route)
+
+            with span('discord_rest', route=route):
+                res = self.session.request(method, url, **kwargs)
+            with self._lock:
+                self.stats.requests += 1
+            self._update_bucket(route, res)
+
+            if res.status_code != 429 or retries >= self.max_retries:
+                return res
+
+            retries += 1
+            with self._lock:
+                self.stats.rate_limited += 1
+            self._wait(self._retry_after_secs(res))
+
+    def _wait_for_bucket(self, route: str) -> None:
+        with self._lock:
+            now = self.clock()
+            wait_secs = max(self._global_reset_at - now, 0)
+
+            bucket = self._buckets.get(self._bucket_by_route.get(route, ''))
+            if bucket is not None:
+                if bucket.remaining <= 0 and bucket.reset_at > now:
+                    wait_secs = max(wait_secs, bucket.reset_at - now)
+                    self.stats.bucket_waits += 1
+                else:
+                    # Take a slot now, so concurrent requests on the route can't all use the last one
+                    bucket.remaining -= 1
+
+        if wait_secs:
+            self._wait(wait_secs)
+
+    def _update_bucket(self, route: str, res: Response) -> None:
+        headers = res.headers
+        bucket_id = headers.get('X-RateLimit-Bucket')
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+
+        with self._lock:
+            if res.status_code == 429 and headers.get('X-RateLimit-Global', '').lower() == 'true':
+                self._global_reset_at = self.clock() + self._retry_after_secs(res)
+
+            if bucket_id is None or remaining is None or reset_after is None:
+                return
+
+            now = self.clock()
+            self._bucket_by_route[route] = bucket_id
+            self._buckets[bucket_id] = RateLimitBucket(int(remaining), now + float(reset_after))
+
+            if now >= self._next_prune_at:
+                self._prune_buckets(now)
+
+    def _prune_buckets(self, now: float) -> None:
+        # A bucket that has reset says nothing about the next request, and a long-running process
+        # would otherwise keep every one it ever saw
+        self._buckets = {bucket_id: bucket for bucket_id, bucket in self._buckets.items() if bucket.reset_at > now}
+        self._bucket_by_route = {route: bucket_id for route, bucket_id in self._bucket_by_route.items() if bucket_id in self._buckets}
+        self._next_prune_at = now + BUCKET_PRUNE_INTERVAL_SECS
+
+    def _retry_after_secs(self, res: Response) -> float:
+        try:
+            return float(res.json()['retry_after'])
+        except (ValueError, KeyError, TypeError):
+            return float(res.headers.get('Retry-After', '1'))
+
+    def _wait(self, secs: float) -> None:
+        with self._lock:
+            self.stats.wait_secs += secs
+
+        self.sleep(secs)
+
+
+discord_rest = DiscordRestClient()
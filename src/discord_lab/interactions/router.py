@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from math import ceil
+import time
+from typing import Any, Callable, Mapping
+
+from discord_lab.interactions.custom_id import custom_id_name
+from discord_lab.interactions.jsonio import RawJson
+
+ResponseBody = Mapping[str, Any]|RawJson
+Handler = Callable[[Mapping[str, Any]], tuple[int, ResponseBody]]
+# The interaction type is None for bodies without one, which never match a route
+RouteKey = tuple[int|None, str|None, str|None]
+
+
+class InteractionType(IntEnum):
+    PING = 1
+    APPLICATION_COMMAND = 2
+    MESSAGE_COMPONENT = 3
+    APPLICATION_COMMAND_AUTOCOMPLETE = 4
+    MODAL_SUBMIT = 5
+
+
+class InteractionResponseType(IntEnum):
+    PONG = 1
+    CHANNEL_MESSAGE_WITH_SOURCE = 4
+    DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE = 5
+    DEFERRED_UPDATE_MESSAGE = 6
+    UPDATE_MESSAGE = 7
+    MODAL = 9
+
+
+@dataclass
+class RouteStats:
+    count: int = 0
+    errors: int = 0
+    total_ns: int = 0
+    recent_ns: deque[int] = field(default_factory=lambda: deque(maxlen=1000))
+
+    def add(self, elapsed_ns: int, error: bool = False) -> None:
+        self.count += 1
+        self.errors += error
+        self.total_ns += elapsed_ns
+        self.recent_ns.append(elapsed_ns)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ns / self.count / 1_000_000 if self.count else 0.0
+
+    def percentile_ms(self, pct: float) -> float:
+        # Nearest-rank percentile over the most recent calls
+        if not self.recent_ns:
+            return 0.0
+
+        recent_ns = sorted(self.recent_ns)
+        return recent_ns[max(1, ceil(len(recent_ns) * pct / 100)) - 1] / 1_000_000
+
+
+def route_key(req_body: Mapping[str, Any]) -> RouteKey:
+    # Commands route on their name. Components and modals route on the command whose message
+    # they're on, plus the name part of their own `custom_id`.
+    interaction_type = req_body.get('type')
+    data = req_body.get('data') or {}
+
+    match interaction_type:
+        case InteractionType.APPLICATION_COMMAND | InteractionType.APPLICATION_COMMAND_AUTOCOMPLETE:
+            return interaction_type, data.get('name'), None
+        case InteractionType.MESSAGE_COMPONENT | InteractionType.MODAL_SUBMIT:
+            cmd_name = ((req_body.get('message') or {}).get('interaction') or {}).get('name')
+            custom_id = data.get('custom_id')
+            return interaction_type, cmd_name, custom_id_name(custom_id) if custom_id is not None else None
+        case _:
+            return interaction_type, None, None
+
+
+def unknown_route_response(key: RouteKey) -> tuple[int, dict]:
+    interaction_type, cmd_name, custom_id = key
+
+    # Discord only shows a reply to commands, components and modals. Anything else is a bad request.
+    if interaction_type in (InteractionType.APPLICATION_COMMAND, InteractionType.MESSAGE_COMPONENT, InteractionType.MODAL_SUBMIT):
+        return 200, {
+            'type': 4,
+            'data': {
+                'content': "Sorry, I don't know how to handle that.",
+                'flags': 64 # Ephemeral
+            }
+        }
+
+    return 400, {'error': f'Unsupported interaction type `{interaction_type}`'}
+
+
+# Maps each (interaction type, command, custom_id) to the function that handles it, registered
+# with the `route` decorator. Dispatch is a single dict lookup, however many routes there are,
+# and time spent in each route's handler is kept in `stats`.
+class InteractionRouter:
+
+    def __init__(self):
+        self.routes: dict[RouteKey, Handler] = {}
+        self.stats: dict[RouteKey, RouteStats] = {}
+        self.deferrable: set[RouteKey] = set()
+
+    def route(self, interaction_type: InteractionType, cmd_name: str|None = None, custom_id: str|None = None, deferrable: bool = False) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            self.add(interaction_type, cmd_name, custom_id, handler, deferrable)
+            return handler
+
+        return register
+
+    def add(self, interaction_type: InteractionType, cmd_name: str|None, custom_id: str|None, handler: Handler, deferrable: bool = False) -> None:
+        # Deferrable routes may be acked right away, and have their response sent later as an
+        # edit. That's only possible for handlers that respond with a message, not e.g. a modal.
+        key = (int(interaction_type), cmd_name, custom_id)
+        if key in self.routes:
+            raise ValueError(f'Route {key} already handled by `{self.routes[key].__name__}`')
+
+        if deferrable and interaction_type not in (InteractionType.APPLICATION_COMMAND, InteractionType.MESSAGE_COMPONENT, InteractionType.MODAL_SUBMIT):
+            raise ValueError(f'Route {key} can not be deferred')
+
+        self.routes[key] = handler
+        self.stats[key] = RouteStats()
+        if deferrable:
+            self.deferrable.add(key)
+
+    def resolve(self, req_body: Mapping[str, Any]) -> tuple[RouteKey, Handler|None]:
+        key = route_key(req_body)
+        return key, self.routes.get(key)
+
+    def dispatch(self, req_body: Mapping[str, Any]) -> tuple[int, ResponseBody]:
+        key, handler = self.resolve(req_body)
+        if handler is None:
+            print(f'WARN: No route for interaction {key}')
+            return unknown_route_response(key)
+
+        stats = self.stats[key]
+        start_ns = time.perf_counter_ns()
+        try:
+            result = handler(req_body)
+        except Exception:
+            stats.add(time.perf_counter_ns() - start_ns, error=True)
+            raise
+
+        stats.add(time.perf_counter_ns() - start_ns)
+
+        return result
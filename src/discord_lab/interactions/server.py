@@ -0,0 +1,375 @@
+# Long-running interaction server, an alternative to the Lambda handler for running on a
+# container service at sustained load.
+#
+# `app` is a plain ASGI app, so it can be served by any ASGI server, but `main` also serves it
+# with the small HTTP/1.1 server here, which only needs the standard library. Either way,
+# requests go through the same verify, dispatch and render pipeline as the Lambda handler.
+# Handlers are synchronous, so they run in a bounded thread pool, which keeps their DynamoDB and
+# Discord calls and any big rolls from ever blocking the event loop. Those calls share keep-alive
+# connection pools across all workers.
+#
+# Usage: python -m discord_lab.interactions.server [--host HOST] [--port PORT] [--workers N]
+#        uvicorn discord_lab.interactions.server:app
+from __future__ import annotations
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+import signal
+from typing import Any, Awaitable, Callable, Mapping
+
+from discord_lab.interactions.env import ASKROLL_WRITE_FLUSH_TIMEOUT_SECS, SERVER_HOST, SERVER_KEEPALIVE_SECS, SERVER_MAX_BODY_BYTES, SERVER_PORT, SERVER_WORKERS
+
+Scope = dict[str, Any]
+Message = dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+HandleInteraction = Callable[[Mapping[str, str], str, bool], tuple[int, str]]
+
+MAX_HEADERS = 100
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    rejected: int = 0
+    in_flight: int = 0
+    connections: int = 0
+
+
+def default_handle_interaction(headers: Mapping[str, str], req_body_str: str, flush_writes: bool) -> tuple[int, str]:
+    from discord_lab.interactions.aws_lambda import handle_interaction
+
+    return handle_interaction(headers, req_body_str, flush_writes)
+
+
+def default_enable_deferral() -> None:
+    from discord_lab.interactions.aws_lambda import enable_local_deferral
+
+    enable_local_deferral()
+
+
+def default_flush_writes(timeout: float) -> bool:
+    from discord_lab.interactions.aws_lambda import askroll_writes
+
+    return askroll_writes.flush(timeout)
+
+
+class InteractionApp:
+
+    def __init__(
+            self,
+            workers: int = SERVER_WORKERS,
+            max_body_bytes: int = SERVER_MAX_BODY_BYTES,
+            max_in_flight: int|None = None,
+            handle_interaction: HandleInteraction = default_handle_interaction,
+            flush_writes: Callable[[float], bool] = default_flush_writes,
+            enable_deferral: Callable[[], None] = default_enable_deferral):
+
+        self.workers = workers
+        self.max_body_bytes = max_body_bytes
+        # Discord gives up on a response after 3 seconds, so there's no point queueing much more
+        # than the workers can get through
+        self.max_in_flight = max_in_flight or workers * 4
+        self.handle_interaction = handle_interaction
+        self.flush_writes = flush_writes
+        self.enable_deferral = enable_deferral
+        self.stats = ServerStats()
+        self._executor: ThreadPoolExecutor|None = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='interaction')
+
+        return self._executor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        match scope['type']:
+            case 'http':
+                await self._http(scope, receive, send)
+            case 'lifespan':
+                await self._lifespan(receive, send)
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        match scope['method'], scope['path']:
+            case 'GET', '/healthz':
+                return await respond(send, 200, b'ok')
+            case 'POST', _:
+                pass
+            case _:
+                return await respond(send, 405, b'method not allowed')
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+            body += message.get('body', b'')
+            if len(body) > self.max_body_bytes:
+                return await respond(send, 413, b'request too large')
+            if not message.get('more_body', False):
+                break
+
+        try:
+            req_body_str = body.decode()
+        except UnicodeDecodeError:
+            return await respond(send, 400, b'request body is not utf-8')
+
+        if self.stats.in_flight >= self.max_in_flight:
+            self.stats.rejected += 1
+            print(f'WARN: Rejecting request with {self.stats.in_flight} already in flight')
+            return await respond(send, 503, b'too busy', [(b'retry-after', b'1')])
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+        # Queued writes keep going out in the background between requests, unlike in Lambda, so
+        # they aren't flushed before responding
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            res_code, res_body_str = await loop.run_in_executor(self.executor, self.handle_interaction, headers, req_body_str, False)
+        except Exception as e:
+            print(f'ERROR: Interaction handling failed: {type(e).__name__}: {e}')
+            return await respond(send, 500, b'internal error')
+        finally:
+            self.stats.in_flight -= 1
+
+        content_type = b'application/json' if res_code < 400 else b'text/plain'
+        await respond(send, res_code, res_body_str.encode(), [(b'content-type', content_type)])
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            match message['type']:
+                case 'lifespan.startup':
+                    self.startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                case 'lifespan.shutdown':
+                    await self.shutdown()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+    def startup(self) -> None:
+        # Unlike in Lambda, this process keeps running after responding, so slow routes can be
+        # deferred to worker threads here
+        self.enable_deferral()
+
+    async def shutdown(self, flush_timeout_secs: float = ASKROLL_WRITE_FLUSH_TIMEOUT_SECS) -> None:
+        # Let running handlers finish, then get their queued writes out before exiting
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown, True)
+            self._executor = None
+
+        if not await asyncio.to_thread(self.flush_writes, flush_timeout_secs):
+            print(f'WARN: DynamoDB writes still pending after {flush_timeout_secs}s at shutdown')
+
+
+async def respond(send: Send, status: int, body: bytes, headers: list[tuple[bytes, bytes]]|None = None) -> None:
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers or [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class BadRequest(Exception):
+    pass
+
+
+# Just enough HTTP/1.1 to serve the app: Content-Length bodies, keep-alive connections, and idle
+# and header timeouts. Shutting down stops accepting, closes idle connections, and lets requests
+# already being handled finish.
+class HttpServer:
+
+    def __init__(self, app: InteractionApp, host: str = SERVER_HOST, port: int = SERVER_PORT, keepalive_secs: float = SERVER_KEEPALIVE_SECS):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.keepalive_secs = keepalive_secs
+        self._server: asyncio.Server|None = None
+        self._connections: dict[asyncio.Task, bool] = {}
+        self._closing = False
+
+    async def start(self) -> None:
+        self.app.startup()
+        self._server = await asyncio.start_server(self._connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def shutdown(self, grace_secs: float = 10) -> None:
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+
+        for task, busy in list(self._connections.items()):
+            if not busy:
+                task.cancel()
+
+        if self._connections:
+            _, pending = await asyncio.wait(list(self._connections), timeout=grace_secs)
+            for task in pending:
+                task.cancel()
+
+        await self.app.shutdown()
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._connections[task] = False
+        self.app.stats.connections += 1
+
+        try:
+            while not self._closing:
+                try:
+                    head = await asyncio.wait_for(read_head(reader), self.keepalive_secs)
+                except TimeoutError:
+                    break
+                if head is None:
+                    break
+
+                self._connections[task] = True
+                keep_alive = await self._request(head, reader, writer)
+                self._connections[task] = False
+
+                if not keep_alive:
+                    break
+        except BadRequest as br:
+            await write_response(writer, 400, [(b'content-type', b'text/plain')], str(br).encode(), False)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+
+    async def _request(self, head: tuple[str, str, str, list[tuple[bytes, bytes]]], reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        method, target, version, headers = head
+        header_map = dict(headers)
+
+        if b'transfer-encoding' in header_map:
+            await write_response(writer, 411, [(b'content-type', b'text/plain')], b'content-length required', False)
+            return False
+
+        try:
+            content_length = int(header_map.get(b'content-length', b'0'))
+        except ValueError:
+            raise BadRequest('invalid content-length')
+        if content_length < 0:
+            raise BadRequest('invalid content-length')
+
+        if content_length > self.app.max_body_bytes:
+            await write_response(writer, 413, [(b'content-type', b'text/plain')], b'request too large', False)
+            return False
+
+        # A body trickled in byte by byte would otherwise hold the connection open for good
+        try:
+            body = await asyncio.wait_for(reader.readexactly(content_length), self.keepalive_secs)
+        except TimeoutError:
+            await write_response(writer, 408, [(b'content-type', b'text/plain')], b'request body timed out', False)
+            return False
+
+        connection = header_map.get(b'connection', b'').lower()
+        keep_alive = connection != b'close' if version == 'HTTP/1.1' else connection == b'keep-alive'
+        keep_alive = keep_alive and not self._closing
+
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': version.removeprefix('HTTP/'),
+            'method': method,
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': headers,
+            'server': (self.host, self.port),
+        }
+
+        async def receive() -> Message:
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        response: dict[str, Any] = {}
+
+        async def send(message: Message) -> None:
+            match message['type']:
+                case 'http.response.start':
+                    response.update(status=message['status'], headers=message.get('headers', []))
+                case 'http.response.body':
+                    await write_response(writer, response['status'], response['headers'], message.get('body', b''), keep_alive)
+
+        await self.app(scope, receive, send)
+
+        return keep_alive
+
+
+async def read_head(reader: asyncio.StreamReader) -> tuple[str, str, str, list[tuple[bytes, bytes]]]|None:
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise BadRequest('invalid request line')
+
+    headers: list[tuple[bytes, bytes]] = []
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise BadRequest('too many headers')
+
+        name, sep, value = line.partition(b':')
+        if not sep:
+            raise BadRequest('invalid header')
+        headers.append((name.strip().lower(), value.strip()))
+
+    return method, target, version, headers
+
+
+async def write_response(writer: asyncio.StreamWriter, status: int, headers: list[tuple[bytes, bytes]], body: bytes, keep_alive: bool) -> None:
+    lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}'.encode()]
+    lines += [name + b': ' + value for name, value in headers]
+    lines.append(b'content-length: ' + str(len(body)).encode())
+    lines.append(b'connection: ' + (b'keep-alive' if keep_alive else b'close'))
+
+    writer.write(b'\r\n'.join(lines) + b'\r\n\r\n' + body)
+    await writer.drain()
+
+
+app = InteractionApp()
+
+
+async def serve(host: str, port: int, workers: int) -> None:
+    from discord_lab.interactions.rest import discord_rest
+
+    # One Discord connection per worker, so none of them wait on another's
+    discord_rest.pool_maxsize = max(discord_rest.pool_maxsize, workers)
+
+    server = HttpServer(InteractionApp(workers), host, port)
+    await server.start()
+    print(f'Serving interactions on http://{host}:{server.port} with {workers} workers')
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    await stop.wait()
+    print('Shutting down')
+    await server.shutdown()
+
+
+def main(argv: list[str]|None = None) -> None:
+    arg_parser = argparse.ArgumentParser(description='Serve Discord interactions over HTTP')
+    arg_parser.add_argument('--host', default=SERVER_HOST)
+    arg_parser.add_argument('--port', type=int, default=SERVER_PORT)
+    arg_parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help='Threads handling interactions')
+    args = arg_parser.parse_args(argv)
+
+    asyncio.run(serve(args.host, args.port, args.workers))
+
+
+if __name__ == '__main__':
+    main()
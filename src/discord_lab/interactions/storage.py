@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from copy import deepcopy
+from dataclasses import dataclass, field
+from decimal import Decimal
+import random
+from threading import Lock
+import time
+from typing import Any, Protocol
+
+from botocore.exceptions import ClientError # type: ignore[import-untyped]
+
+
+# The slice of boto3's DynamoDB client that the interaction handlers use. Anything with these
+# methods, taking and returning the same shapes, can stand in for DynamoDB. Their signatures
+# are left open, since boto3's are generated at runtime.
+class DynamoDBBackend(Protocol):
+
+    def put_item(self, *args: Any, **kwargs: Any) -> dict: ...
+
+    def update_item(self, *args: Any, **kwargs: Any) -> dict: ...
+
+    def get_item(self, *args: Any, **kwargs: Any) -> dict: ...
+
+    def batch_get_item(self, *args: Any, **kwargs: Any) -> dict: ...
+
+
+@dataclass
+class InMemoryDynamoDBStats:
+    calls: int = 0
+    injected_errors: int = 0
+    conditional_check_failures: int = 0
+    latency_secs: float = 0.0
+
+
+@dataclass
+class InMemoryTable:
+    key_attr: str
+    items: dict[str, dict[str, dict]] = field(default_factory=dict)
+
+
+# In-memory stand-in for DynamoDB, faithful to how the handlers call it: `put_item`,
+# `update_item` with legacy `AttributeUpdates` (PUT, DELETE, and ADD to numbers)/`Expected`, and
+# `get_item`/`batch_get_item` with `ProjectionExpression`. Every call can be slowed down by `latency_secs` plus up to
+# `latency_jitter_secs` more, and fail with a throttling error `error_rate` of the time, both
+# raising the same botocore `ClientError`s a real client would.
+class InMemoryDynamoDB:
+
+    def __init__(
+            self,
+            tables: dict[str, str]|None = None,
+            latency_secs: float = 0.0,
+            latency_jitter_secs: float = 0.0,
+            error_rate: float = 0.0,
+            seed: int|None = None):
+
+        if not 0 <= error_rate <= 1:
+            raise ValueError(f'Error rate {error_rate} is not between 0 and 1')
+
+        self.tables = {name: InMemoryTable(key_attr) for name, key_attr in (tables or {'rollit-askroll-queue': 'interaction_id'}).items()}
+        self.latency_secs = latency_secs
+        self.latency_jitter_secs = latency_jitter_secs
+        self.error_rate = error_rate
+        self.stats = InMemoryDynamoDBStats()
+        self._rng = random.Random(seed)
+        self._lock = Lock()
+
+    def put_item(self, TableName: str, Item: dict[str, dict], **kwargs: Any) -> dict:
+        self._before_call('PutItem', kwargs)
+        table = self._table(TableName, 'PutItem')
+
+        with self._lock:
+            table.items[self._item_key(table, Item, 'PutItem')] = deepcopy(Item)
+
+        return {}
+
+    def update_item(
+            self,
+            TableName: str,
+            Key: dict[str, dict],
+            AttributeUpdates: dict[str, dict]|None = None,
+            Expected: dict[str, dict]|None = None,
+            **kwargs: Any) -> dict:
+
+        self._before_call('UpdateItem', kwargs)
+        table = self._table(TableName, 'UpdateItem')
+        key = self._item_key(table, Key, 'UpdateItem')
+
+        with self._lock:
+            item = table.items.get(key, {})
+            self._check_expected(item, Expected or {})
+
+            # Like DynamoDB, updating an item that isn't there creates it
+            item = deepcopy(item) or deepcopy(Key)
+            for attr, update in (AttributeUpdates or {}).items():
+                match update.get('Action', 'PUT'):
+                    case 'PUT':
+                        item[attr] = deepcopy(update['Value'])
+                    case 'DELETE' if 'Value' not in update:
+                        item.pop(attr, None)
+                    case 'ADD' if 'N' in update['Value']:
+                        item[attr] = {'N': str(Decimal(item.get(attr, {'N': '0'})['N']) + Decimal(update['Value']['N']))}
+                    case action:
+                        raise self._client_error('ValidationException', f'Unsupported update action `{action}` on `{attr}`', 'UpdateItem')
+
+            table.items[key] = item
+
+        return {}
+
+    def get_item(self, TableName: str, Key: dict[str, dict], ConsistentRead: bool = False, **kwargs: Any) -> dict:
+        self._before_call('GetItem', kwargs, ('ProjectionExpression', 'ExpressionAttributeNames'))
+        table = self._table(TableName, 'GetItem')
+
+        with self._lock:
+            item = table.items.get(self._item_key(table, Key, 'GetItem'))
+            if item is None:
+                return {}
+
+            return {'Item': self._project(item, kwargs)}
+
+    def batch_get_item(self, RequestItems: dict[str, dict], **kwargs: Any) -> dict:
+        self._before_call('BatchGetItem', kwargs)
+
+        responses: dict[str, list[dict]] = {}
+        for table_name, request in RequestItems.items():
+            table = self._table(table_name, 'BatchGetItem')
+            with self._lock:
+                items = (table.items.get(self._item_key(table, key, 'BatchGetItem')) for key in request['Keys'])
+                responses[table_name] = [self._project(item, request) for item in items if item is not None]
+
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def _before_call(self, operation: str, kwargs: dict[str, Any], allowed_kwargs: tuple[str, ...] = ()) -> None:
+        unsupported = set(kwargs) - set(allowed_kwargs)
+        if unsupported:
+            raise self._client_error('ValidationException', f'Unsupported parameters: {", ".join(sorted(unsupported))}', operation)
+
+        with self._lock:
+            self.stats.calls += 1
+            latency_secs = self.latency_secs + self._rng.random() * self.latency_jitter_secs
+            self.stats.latency_secs += latency_secs
+            inject_error = self._rng.random() < self.error_rate
+            if inject_error:
+                self.stats.injected_errors += 1
+
+        if latency_secs:
+            time.sleep(latency_secs)
+
+        if inject_error:
+            raise self._client_error('ProvisionedThroughputExceededException', 'Injected error', operation)
+
+    def _table(self, table_name: str, operation: str) -> InMemoryTable:
+        try:
+            return self.tables[table_name]
+        except KeyError:
+            raise self._client_error('ResourceNotFoundException', f'Requested resource not found: {table_name}', operation)
+
+    def _item_key(self, table: InMemoryTable, item: dict[str, dict], operation: str) -> str:
+        try:
+            return repr(sorted(item[table.key_attr].items()))
+        except KeyError:
+            raise self._client_error('ValidationException', f'Missing the key `{table.key_attr}` in the item', operation)
+
+    def _check_expected(self, item: dict[str, dict], expected: dict[str, dict]) -> None:
+        for attr, condition in expected.items():
+            if 'Value' in condition:
+                passed = item.get(attr) == condition['Value']
+            elif condition.get('Exists') is False:
+                passed = attr not in item
+            else:
+                raise self._client_error('ValidationException', f'Unsupported condition on `{attr}`', 'UpdateItem')
+
+            if not passed:
+                self.stats.conditional_check_failures += 1
+                raise self._client_error('ConditionalCheckFailedException', 'The conditional request failed', 'UpdateItem')
+
+    def _project(self, item: dict[str, dict], request: dict[str, Any]) -> dict[str, dict]:
+        projection = request.get('ProjectionExpression')
+        if projection is None:
+            return deepcopy(item)
+
+        attr_names = request.get('ExpressionAttributeNames', {})
+        projected_attrs = {attr_names.get(name.strip(), name.strip()) for name in projection.split(',')}
+
+        return {attr: deepcopy(value) for attr, value in item.items() if attr in projected_attrs}
+
+    @staticmethod
+    def _client_error(code: str, message: str, operation: str) -> ClientError:
+        return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
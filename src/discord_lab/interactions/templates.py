@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from json.encoder import encode_basestring
+import re
+import secrets
+from typing import Any
+
+from discord_lab.interactions.jsonio import dumps
+
+
+@dataclass(frozen=True)
+class Slot:
+    name: str
+
+
+def dumps_slot(value: Any) -> str:
+    # Most slots are strings or empty, which are quicker to write here than to hand to a backend.
+    # Strings get the same escapes either way.
+    if type(value) is str:
+        return encode_basestring(value)
+    if value is None:
+        return 'null'
+
+    return dumps(value)
+
+
+# A response body whose constant parts are serialized once, up front, so rendering one only
+# serializes the values in its slots and joins them with the rest. Renders the same text as
+# `jsonio.dumps` of the same body built as dicts, since compact JSON of an object or array is
+# just its parts' JSON joined with fixed punctuation.
+class JsonTemplate:
+
+    def __init__(self, template: Any):
+        self.template = template
+
+        # Serialize with a unique string in each slot, then split the text on them
+        token = secrets.token_hex(8)
+        markers: dict[str, str] = {}
+
+        def mark(obj: Any) -> Any:
+            match obj:
+                case Slot(name):
+                    marker = f'{token}:{name}'
+                    markers[dumps(marker)] = name
+                    return marker
+                case dict():
+                    return {k: mark(v) for k, v in obj.items()}
+                case list():
+                    return [mark(v) for v in obj]
+                case _:
+                    return obj
+
+        text = dumps(mark(template))
+        parts = re.split('(' + '|'.join(re.escape(marker) for marker in markers) + ')', text) if markers else [text]
+
+        # Even parts are constant text, odd ones are slots
+        self.fragments = parts[0::2]
+        self.slots = [markers[marker] for marker in parts[1::2]]
+
+    def render(self, **values: Any) -> str:
+        fragments = self.fragments
+        out = [fragments[0]]
+        for i, name in enumerate(self.slots, 1):
+            out.append(dumps_slot(values[name]))
+            out.append(fragments[i])
+
+        return ''.join(out)
+
+    def fill(self, **values: Any) -> Any:
+        # The same body built as dicts and lists, for anything that needs it that way
+        def fill(obj: Any) -> Any:
+            match obj:
+                case Slot(name):
+                    return values[name]
+                case dict():
+                    return {k: fill(v) for k, v in obj.items()}
+                case list():
+                    return [fill(v) for v in obj]
+                case _:
+                    return obj
+
+        return fill(self.template)
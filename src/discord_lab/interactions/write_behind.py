@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from decimal import Decimal
+from math import ceil
+from threading import Condition, Thread
+import time
+from typing import Any, Callable
+
+from discord_lab.tracing import traced
+
+
+def error_code(e: Exception) -> str|None:
+    # botocore's `ClientError` carries the service's error code in its parsed response
+    return getattr(e, 'response', {}).get('Error', {}).get('Code')
+
+
+def add_numbers(a: dict, b: dict) -> dict:
+    # DynamoDB numbers are decimal strings
+    return {'N': str(Decimal(a['N']) + Decimal(b['N']))}
+
+
+def merge_updates(older: dict[str, dict], newer: dict[str, dict]) -> dict[str, dict]:
+    # `AttributeUpdates` with the same effect as sending `older`, then `newer`. Later PUTs and
+    # DELETEs win, while an ADD adds to what's before it.
+    merged = dict(older)
+    for attr, update in newer.items():
+        prior = merged.get(attr)
+        if update.get('Action', 'PUT') == 'ADD' and prior is not None:
+            match prior.get('Action', 'PUT'):
+                case 'PUT' | 'ADD':
+                    update = {'Value': add_numbers(prior['Value'], update['Value']), 'Action': prior.get('Action', 'PUT')}
+                case 'DELETE':
+                    # Adding to a missing attribute sets it
+                    update = {'Value': update['Value'], 'Action': 'PUT'}
+
+        merged[attr] = update
+
+    return merged
+
+
+@dataclass
+class WriteOp:
+    # A pending write to one item. `item` set means a full `put_item`, otherwise `attr_updates`
+    # holds `update_item` style `AttributeUpdates` to apply to whatever is already stored, only
+    # if the stored item matches `expected`.
+    table: str
+    key: dict[str, dict]
+    item: dict[str, dict]|None = None
+    attr_updates: dict[str, dict] = field(default_factory=dict)
+    expected: dict[str, dict]|None = None
+    attempts: int = 0
+
+    def __post_init__(self):
+        for attr, update in self.attr_updates.items():
+            action = update.get('Action', 'PUT')
+            if action not in ('PUT', 'DELETE', 'ADD') or (action == 'ADD' and 'N' not in update['Value']):
+                raise ValueError(f"Update action `{action}` on `{attr}` can't be coalesced")
+
+    def merge(self, newer: WriteOp) -> WriteOp:
+        # A put overwrites the whole item, so anything before it doesn't matter
+        if newer.item is not None:
+            return WriteOp(newer.table, newer.key, newer.item, attempts=self.attempts)
+
+        if self.item is None:
+            # The condition is on the item as it was before any of the updates
+            return WriteOp(self.table, self.key, None, merge_updates(self.attr_updates, newer.attr_updates), self.expected, self.attempts)
+
+        # Fold the updates into the pending put, so only the put goes out
+        item = dict(self.item)
+        for attr, update in newer.attr_updates.items():
+            match update.get('Action', 'PUT'):
+                case 'DELETE':
+                    item.pop(attr, None)
+                case 'ADD':
+                    item[attr] = add_numbers(item.get(attr, {'N': '0'}), update['Value'])
+                case _:
+                    item[attr] = update['Value']
+
+        return WriteOp(self.table, self.key, item, attempts=self.attempts)
+
+
+@dataclass
+class WriteBehindStats:
+    enqueued: int = 0
+    coalesced: int = 0
+    written: int = 0
+    retried: int = 0
+    conflicts: int = 0
+    # Given up on, and so lost
+    dropped: int = 0
+    # Taken off the queue by `take_unflushed`, to be written elsewhere
+    taken: int = 0
+    flush_timeouts: int = 0
+    flush_ns: deque[int] = field(default_factory=lambda: deque(maxlen=1000))
+
+    def flush_ms(self, pct: float) -> float:
+        # Nearest-rank percentile over the most recent flushes
+        if not self.flush_ns:
+            return 0.0
+
+        flush_ns = sorted(self.flush_ns)
+        rank = max(1, ceil(len(flush_ns) * pct / 100))
+
+        return flush_ns[rank - 1] / 1_000_000
+
+
+# Queues DynamoDB writes and sends them from a background thread, so a handler can get on with
+# building its response while the write is in flight. Writes to the same item that are still
+# pending are coalesced into one. Before a Lambda returns it must `flush()`, since the container
+# is frozen as soon as the handler returns.
+#
+# Failed writes are retried, with exponential backoff, up to `max_attempts` times in all, so a
+# write may land more than once, but it's always the latest value. After that they're dropped,
+# and counted in `stats.dropped`. Anything a timed out flush leaves behind stays queued, and only
+# goes out if the container is thawed again, unless the caller hands it somewhere durable with
+# `take_unflushed`. So writes are at-least-once only as long as the container lives, or as long
+# as what `take_unflushed` returns gets written.
+class WriteBehindQueue:
+
+    def __init__(
+            self,
+            client_factory: Callable[[], Any],
+            max_pending: int = 256,
+            max_attempts: int = 5,
+            retry_backoff_secs: float = 0.05,
+            max_retry_backoff_secs: float = 1.0,
+            on_conflict: Callable[[WriteOp], WriteOp|None]|None = None,
+            sleep: Callable[[float], None] = time.sleep):
+
+        self.client_factory = client_factory
+        self.on_conflict = on_conflict
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_backoff_secs = retry_backoff_secs
+        self.max_retry_backoff_secs = max_retry_backoff_secs
+        self.sleep = sleep
+        self.stats = WriteBehindStats()
+        self._pending: OrderedDict[tuple[str, str], WriteOp] = OrderedDict()
+        self._in_flight = 0
+        self._writing: WriteOp|None = None
+        self._cond = Condition()
+        self._worker: Thread|None = None
+
+    def put_item(self, table: str, item: dict[str, dict], key_attr: str) -> None:
+        self.enqueue(WriteOp(table, {key_attr: item[key_attr]}, item))
+
+    def update_item(self, table: str, key: dict[str, dict], attr_updates: dict[str, dict], expected: dict[str, dict]|None = None) -> None:
+        self.enqueue(WriteOp(table, key, None, attr_updates, expected))
+
+    @traced('WriteBehindQueue.flush')
+    def flush(self, timeout: float|None = None) -> bool:
+        start_ns = time.perf_counter_ns()
+        with self._cond:
+            flushed = self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+            self.stats.flush_ns.append(time.perf_counter_ns() - start_ns)
+            if not flushed:
+                self.stats.flush_timeouts += 1
+
+        return flushed
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def take_unflushed(self) -> list[WriteOp]:
+        # Everything not written yet, off the queue, for the caller to write somewhere more
+        # durable. The write in flight is included too, since it may never finish, so it may land
+        # twice.
+        with self._cond:
+            ops = [op for op in [self._writing, *self._pending.values()] if op is not None]
+            self._pending.clear()
+            self.stats.taken += len(ops)
+            self._cond.notify_all()
+
+        return ops
+
+    def enqueue(self, op: WriteOp) -> None:
+        pending_key = (op.table, repr(sorted(op.key.items())))
+
+        with self._cond:
+            self.stats.enqueued += 1
+
+            if pending_key in self._pending:
+                self._pending[pending_key] = self._pending[pending_key].merge(op)
+                self.stats.coalesced += 1
+            else:
+                # Apply backpressure rather than letting the queue grow without bound
+                self._cond.wait_for(lambda: len(self._pending) < self.max_pending)
+                self._pending[pending_key] = op
+
+            self._start_worker()
+            self._cond.notify_all()
+
+    def _start_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = Thread(target=self._drain, name='write-behind', daemon=True)
+            self._worker.start()
+
+    def _drain(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                pending_key, op = self._pending.popitem(last=False)
+                self._in_flight += 1
+                self._writing = op
+
+            try:
+                self._write(op)
+            except Exception as e:
+                op.attempts += 1
+                retry_op: WriteOp|None = op
+
+                # A failed condition won't pass on a retry, so it's up to `on_conflict` what to
+                # send instead, if anything
+                if error_code(e) == 'ConditionalCheckFailedException':
+                    with self._cond:
+                        self.stats.conflicts += 1
+                    retry_op = self.on_conflict(op) if self.on_conflict else None
+                elif op.attempts < self.max_attempts:
+                    # Throttling and the like need a moment to clear. Other writes wait too, which
+                    # is as well, since they'd likely fail the same way.
+                    self.sleep(min(self.retry_backoff_secs * 2 ** (op.attempts - 1), self.max_retry_backoff_secs))
+
+                with self._cond:
+                    if retry_op is not None and op.attempts < self.max_attempts:
+                        # Anything written to this item since goes on top of the retry
+                        if pending_key in self._pending:
+                            retry_op = retry_op.merge(self._pending[pending_key])
+                        self._pending[pending_key] = retry_op
+                        self._pending.move_to_end(pending_key, last=False)
+                        self.stats.retried += 1
+                    else:
+                        self.stats.dropped += 1
+                        print(f'ERROR: Dropping write to `{op.table}` {op.key} after {op.attempts} attempts: {e}')
+            else:
+                with self._cond:
+                    self.stats.written += 1
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._writing = None
+                    self._cond.notify_all()
+
+    def _write(self, op: WriteOp) -> None:
+        if op.item is not None:
+            self.client_factory().put_item(TableName=op.table, Item=op.item)
+        else:
+            kwargs = {'Expected': op.expected} if op.expected else {}
+            self.client_factory().update_item(TableName=op.table, Key=op.key, AttributeUpdates=op.attr_updates, **kwargs)
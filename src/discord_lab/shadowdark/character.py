@@ -10,7 +10,7 @@ from typing import Optional, override
 import warnings
 warnings.filterwarnings("ignore",category=DeprecationWarning)
 
-from discord_lab.dice import MultiDie,DieType, MultiDieRoll
+from discord_lab.dice import BulkDieRoll, MultiDie,DieType, MultiDieRoll
 
 import yaml
 
@@ -418,7 +418,7 @@ class Character:
 # Rollers / Generators #
 ########################
 
-def roll_ability_scores() -> dict[Ability,MultiDieRoll]:
+def roll_ability_scores() -> dict[Ability,MultiDieRoll|BulkDieRoll]:
     return {a: MultiDie(DieType.D6, 3).roll() for a in Ability}
 
 
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from math import ceil, sqrt
+from operator import add, sub
+import random
+from secrets import token_bytes
+from typing import Callable, Iterable
+
+from discord_lab.dice import DieExpr, DieExprMultiRollType, MultiDie, Operation, sample_die_values
+
+DEFAULT_BATCH_SIZE = 65_536
+
+
+@dataclass
+class RollStats:
+    # Streaming accumulator over simulated roll totals. Only keeps a histogram, so memory is
+    # bounded by the range of possible totals, not by how many rolls went in.
+    histogram: Counter[int] = field(default_factory=Counter)
+
+    def add(self, values: Iterable[int]) -> None:
+        self.histogram.update(values)
+
+    def merge(self, other: RollStats) -> None:
+        self.histogram.update(other.histogram)
+
+    @property
+    def count(self) -> int:
+        return self.histogram.total()
+
+    @property
+    def min(self) -> int:
+        return min(self.histogram)
+
+    @property
+    def max(self) -> int:
+        return max(self.histogram)
+
+    @property
+    def mean(self) -> float:
+        return sum(v * c for v, c in self.histogram.items()) / self.count
+
+    @property
+    def variance(self) -> float:
+        mean = self.mean
+        return sum(c * (v - mean) ** 2 for v, c in self.histogram.items()) / self.count
+
+    @property
+    def stdev(self) -> float:
+        return sqrt(self.variance)
+
+    def percentile(self, pct: float) -> int:
+        if not 0 <= pct <= 100:
+            raise ValueError(f'Percentile {pct} is not between 0 and 100')
+
+        # Nearest-rank percentile
+        rank = max(1, ceil(self.count * pct / 100))
+        seen = 0
+        for value in sorted(self.histogram):
+            seen += self.histogram[value]
+            if seen >= rank:
+                return value
+
+        return self.max
+
+    def probability(self, value: int) -> float:
+        return self.histogram[value] / self.count
+
+    def chance_to_beat(self, target: int) -> float:
+        return sum(c for v, c in self.histogram.items() if v > target) / self.count
+
+
+def _batch_totals(
+        dice_terms: list[tuple[Operation, MultiDie]],
+        batch_size: int,
+        randbytes: Callable[[int], bytes]) -> Iterable[int]:
+
+    totals: Iterable[int]|None = None
+
+    for operation, multi_die in dice_terms:
+        values = sample_die_values(multi_die.type, batch_size * multi_die.multiplier, randbytes)
+
+        if multi_die.multiplier == 1:
+            term_totals: Iterable[int] = values
+        else:
+            # Sum each run of `multiplier` consecutive dice, without building per-roll objects
+            values_iter = iter(values)
+            term_totals = map(sum, zip(*[values_iter] * multi_die.multiplier))
+
+        if totals is None and operation == Operation.ADD:
+            totals = term_totals
+        else:
+            totals = list(map(add if operation == Operation.ADD else sub, totals or [0] * batch_size, term_totals))
+
+    return totals if totals is not None else [0] * batch_size
+
+
+def _simulate_chunk(
+        terms: tuple[tuple[Operation, int|MultiDie], ...],
+        n: int,
+        stream_seed: str|None,
+        multi_roll_type: DieExprMultiRollType|None,
+        batch_size: int) -> RollStats:
+
+    randbytes = random.Random(stream_seed).randbytes if stream_seed is not None else token_bytes
+
+    # Integer terms are the same every roll, so fold them into one constant added at the end
+    constant = 0
+    dice_terms: list[tuple[Operation, MultiDie]] = []
+    for operation, term in terms:
+        match term:
+            case int():
+                constant = operation.apply(constant, term)
+            case MultiDie():
+                dice_terms.append((operation, term))
+            case _:
+                raise ValueError(f"Term type {type(term)} not supported")
+
+    dice_stats = RollStats()
+    remaining = n
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        totals = _batch_totals(dice_terms, size, randbytes)
+
+        match multi_roll_type:
+            case None:
+                pass
+            case DieExprMultiRollType.BEST:
+                totals = map(max, totals, _batch_totals(dice_terms, size, randbytes))
+            case DieExprMultiRollType.WORST:
+                totals = map(min, totals, _batch_totals(dice_terms, size, randbytes))
+            case _:
+                raise ValueError(f"{multi_roll_type} multi-roll type not supported")
+
+        dice_stats.add(totals)
+        remaining -= size
+
+    return RollStats(Counter({v + constant: c for v, c in dice_stats.histogram.items()}))
+
+
+def simulate_die_expr(
+        die_expr: DieExpr,
+        n: int,
+        seed: int|str|None = None,
+        multi_roll_type: DieExprMultiRollType|None = None,
+        processes: int|None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE) -> RollStats:
+
+    if n < 1:
+        raise ValueError(f'Simulation count {n} is less than 1')
+
+    terms = ((Operation.ADD, die_expr.first_term.term), *((t.operation, t.labeled_term.term) for t in die_expr.term_ops))
+
+    # NOTE: Without a seed, rolls come from `secrets` just like `DieExpr.roll`. A seed trades
+    #       that for reproducibility, with each worker getting its own derived stream.
+    if not processes or processes == 1:
+        return _simulate_chunk(terms, n, None if seed is None else f'{seed}/0', multi_roll_type, batch_size)
+
+    chunk_size, leftover = divmod(n, processes)
+    chunk_sizes = [chunk_size + (1 if i < leftover else 0) for i in range(processes)]
+
+    stats = RollStats()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(_simulate_chunk, terms, size, None if seed is None else f'{seed}/{i}', multi_roll_type, batch_size)
+            for i, size in enumerate(chunk_sizes) if size
+        ]
+        for future in futures:
+            stats.merge(future.result())
+
+    return stats
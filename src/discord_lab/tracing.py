@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, TextIO, TypeVar
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# When this module was first imported, which is early in any cold start that uses it
+IMPORTED_NS = time.perf_counter_ns()
+
+EMF_NAMESPACE = 'discord-lab'
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    attrs: dict[str, Any]|None = None
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+
+class SpanContext:
+    __slots__ = ('span',)
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.span.start_ns = time.perf_counter_ns()
+        return self.span
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.span.end_ns = time.perf_counter_ns()
+
+
+class NullSpanContext:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+NULL_SPAN = NullSpanContext()
+
+
+@dataclass
+class Trace:
+    name: str
+    cold_start: bool = False
+    init_ns: int|None = None
+    tags: dict[str, str] = field(default_factory=dict)
+    spans: list[Span] = field(default_factory=list)
+    tid: int = field(default_factory=threading.get_ident)
+
+    def span(self, name: str, attrs: dict[str, Any]|None = None) -> SpanContext:
+        # Spans are kept in the order they started. Their times alone are enough to nest them.
+        span = Span(name, 0, attrs=attrs)
+        self.spans.append(span)
+        return SpanContext(span)
+
+    def totals_ms(self) -> dict[str, float]:
+        # Time per span name, adding up repeats, like a roll that's done twice
+        totals: dict[str, int] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0) + span.duration_ns
+
+        return {name: ns / 1_000_000 for name, ns in totals.items()}
+
+    def to_emf(self, timestamp_ms: int, namespace: str = EMF_NAMESPACE) -> dict[str, Any]:
+        # CloudWatch Embedded Metric Format, where each span name becomes a metric, dimensioned by
+        # this trace's tags and whether it was a cold start
+        metrics = self.totals_ms()
+        if self.init_ns is not None:
+            metrics['init'] = self.init_ns / 1_000_000
+
+        dimensions = {**self.tags, 'ColdStart': str(self.cold_start).lower()}
+
+        return {
+            '_aws': {
+                'Timestamp': timestamp_ms,
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [sorted(dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in metrics],
+                }],
+            },
+            **dimensions,
+            **{name: round(ms, 3) for name, ms in metrics.items()},
+        }
+
+    def to_chrome_events(self, pid: int) -> list[dict[str, Any]]:
+        # Chrome's Trace Event Format, which Perfetto and speedscope open as a flame chart
+        args = {**self.tags, 'cold_start': self.cold_start}
+        events = [
+            {'name': span.name, 'ph': 'X', 'ts': span.start_ns / 1000, 'dur': span.duration_ns / 1000, 'pid': pid, 'tid': self.tid, 'args': {**args, **(span.attrs or {})}}
+            for span in self.spans
+        ]
+
+        # The cold start's imports and setup, from when this module was imported
+        if self.init_ns is not None:
+            events.insert(0, {'name': 'init', 'ph': 'X', 'ts': IMPORTED_NS / 1000, 'dur': self.init_ns / 1000, 'pid': pid, 'tid': self.tid, 'args': args})
+
+        return events
+
+
+current_trace: ContextVar[Trace|None] = ContextVar('current_trace', default=None)
+
+
+def span(name: str, **attrs: Any) -> SpanContext|NullSpanContext:
+    # Times a span of the current trace. Outside of one, or with tracing off, it's a shared no-op.
+    trace = current_trace.get()
+    if trace is None:
+        return NULL_SPAN
+
+    return trace.span(name, attrs or None)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    def decorate(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            trace = current_trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+
+            with trace.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+# Starts a trace per request and exports it once it's done, as an EMF line on `stream` and/or
+# appended to a Chrome trace file. With neither export on, no trace is started, so every span
+# is a no-op. The first trace after `mark_initialized` is tagged as the cold start, along with
+# how long everything up to then took.
+class Tracer:
+
+    def __init__(self, emf: bool = False, chrome_path: str|None = None, stream: TextIO|None = None, clock_ms: Callable[[], int]|None = None):
+        self.emf = emf
+        self.chrome_path = chrome_path
+        self.stream = stream
+        self.clock_ms = clock_ms or (lambda: time.time_ns() // 1_000_000)
+        self.init_ns: int|None = None
+        self._cold = True
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.emf or self.chrome_path is not None
+
+    def mark_initialized(self) -> None:
+        if self.init_ns is None:
+            self.init_ns = time.perf_counter_ns() - IMPORTED_NS
+
+    @contextmanager
+    def trace(self, name: str) -> Iterator[Trace|None]:
+        if not self.enabled:
+            yield None
+            return
+
+        with self._lock:
+            cold_start, self._cold = self._cold, False
+
+        trace = Trace(name, cold_start, self.init_ns if cold_start else None)
+        token = current_trace.set(trace)
+        try:
+            with trace.span(name):
+                yield trace
+        finally:
+            current_trace.reset(token)
+            self._finish(trace)
+
+    def _finish(self, trace: Trace) -> None:
+        if self.emf:
+            stream = self.stream or sys.stdout
+            stream.write(json.dumps(trace.to_emf(self.clock_ms()), separators=(',', ':')) + '\n')
+
+        if self.chrome_path is not None:
+            self._append_chrome_events(self.chrome_path, trace.to_chrome_events(os.getpid()))
+
+    def _append_chrome_events(self, path: str, events: list[dict[str, Any]]) -> None:
+        # The format allows leaving off the closing `]`, so traces can just be appended
+        with self._lock:
+            is_new = not os.path.exists(path)
+            with open(path, 'a') as f:
+                if is_new:
+                    f.write('[\n')
+                for event in events:
+                    f.write(json.dumps(event, separators=(',', ':'), default=str) + ',\n')
+
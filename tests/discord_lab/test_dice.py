@@ -1,7 +1,9 @@
+from array import array
+from collections import Counter
 from typing import cast
 import pytest
 
-from discord_lab.dice import DieExpr, DieExprRoll, DieParseException, IntTermOperationResult, MultiDie, DieType, MultiDieTermOperationResult, Operation, LabeledTerm, TermOperation, TermOperationResult
+from discord_lab.dice import BulkDieRoll, DieExpr, DieExprCache, DieExprLimits, DieRoll, sample_die_values, DieExprRoll, DieParseException, IntTermOperationResult, MultiDie, MultiDieRoll, DieType, MultiDieTermOperationResult, Operation, LabeledTerm, TermOperation, TermOperationResult
 
 class TestDieType:
 
@@ -53,6 +55,61 @@ class TestDieType:
         assert die_roll.type == DieType.D100
         assert 1 <= die_roll.value <= 100
 
+
+    def test_roll_bulk(self):
+        for die_type in DieType:
+            bulk_roll = die_type.roll_bulk(500)
+
+            assert len(bulk_roll) == 500
+            assert all(1 <= v <= die_type for v in bulk_roll.values)
+            assert bulk_roll.value == sum(bulk_roll.values)
+
+
+    def test_roll_bulk_covers_all_faces(self):
+        counts = DieType.D6.roll_bulk(6000).counts()
+
+        assert sorted(counts) == [1, 2, 3, 4, 5, 6]
+        assert all(800 < c < 1200 for c in counts.values())
+
+
+class TestSampleDieValues:
+
+    def test_rejects_biased_bytes(self):
+        # 252 is the largest multiple of 6 that fits in a byte, so 252-255 must be rejected
+        buffers = iter([bytes([255, 252, 0, 5]), bytes([6, 251, 253, 2, 9, 9, 9, 9, 9, 9, 9, 9])])
+        values = sample_die_values(6, 5, lambda n: next(buffers))
+
+        assert list(values) == [1, 6, 1, 6, 3]
+
+
+    def test_d100_uses_200_byte_limit(self):
+        values = sample_die_values(100, 3, lambda n: bytes([199, 200, 255, 0, 150] + [0] * n))
+
+        assert list(values) == [100, 1, 51]
+
+
+class TestMultiDie:
+
+    def test_roll_bulk(self):
+        bulk_roll = MultiDie(DieType.D20, 100).roll_bulk()
+
+        assert bulk_roll.type == DieType.D20
+        assert len(bulk_roll) == 100
+        assert 100 <= bulk_roll.value <= 2000
+
+
+    def test_bulk_roll_details(self):
+        bulk_roll = BulkDieRoll(DieType.D6, array('B', [3, 6, 6]))
+
+        assert bulk_roll.value == 15
+        assert bulk_roll.details == [DieRoll(3, DieType.D6), DieRoll(6, DieType.D6), DieRoll(6, DieType.D6)]
+        assert bulk_roll.counts() == Counter({6: 2, 3: 1})
+
+
+    def test_roll_takes_bulk_path_for_many_dice(self):
+        assert isinstance(MultiDie(DieType.D6, MultiDie.bulk_roll_min_dice).roll(), BulkDieRoll)
+        assert isinstance(MultiDie(DieType.D6, MultiDie.bulk_roll_min_dice - 1).roll(), MultiDieRoll)
+
 class TestTerm:
      
      def test_str_int_no_label(self):
@@ -206,3 +263,120 @@ class TestDieExpr:
             DieExpr.parse(expr_str)
 
         assert str(dpe.value) == f'Invalid die roll expression `{expr_str}`'
+
+
+class TestDieExprCache:
+
+    def test_miss_then_hit(self):
+        cache = DieExprCache(4)
+        parser_calls = []
+
+        def parse(expr_str):
+            parser_calls.append(expr_str)
+            return DieExpr.parser.parse(expr_str)
+
+        for _ in range(3):
+            expr = cache.get('2D6 + 1 (STR)')
+            if expr is None:
+                expr = parse('2D6 + 1 (STR)')
+                cache.put('2D6 + 1 (STR)', expr)
+
+        assert parser_calls == ['2D6 + 1 (STR)']
+        assert cache.hits == 2
+        assert cache.misses == 1
+        assert str(expr) == '2D6 + 1 (STR)'
+
+
+    def test_normalized_key(self):
+        cache = DieExprCache(4)
+        cache.put('D20', DieExpr(LabeledTerm(MultiDie(DieType.D20))))
+
+        assert cache.get('  D20 ') == DieExpr(LabeledTerm(MultiDie(DieType.D20)))
+
+
+    def test_lru_eviction(self):
+        cache = DieExprCache(2)
+        cache.put('D4', DieExpr(LabeledTerm(MultiDie(DieType.D4))))
+        cache.put('D6', DieExpr(LabeledTerm(MultiDie(DieType.D6))))
+
+        # Touch D4 so D6 becomes least recently used
+        assert cache.get('D4')
+
+        cache.put('D8', DieExpr(LabeledTerm(MultiDie(DieType.D8))))
+
+        assert cache.evictions == 1
+        assert len(cache) == 2
+        assert cache.get('D6') is None
+        assert cache.get('D4')
+        assert cache.get('D8')
+
+
+    def test_zero_size_disables_cache(self):
+        cache = DieExprCache(0)
+        cache.put('D4', DieExpr(LabeledTerm(MultiDie(DieType.D4))))
+
+        assert cache.get('D4') is None
+        assert len(cache) == 0
+
+
+    def test_cached_expr_not_mutable_by_caller(self):
+        cache = DieExprCache(4)
+        expr = DieExpr(LabeledTerm(MultiDie(DieType.D20)), [TermOperation(Operation.ADD, LabeledTerm(2))])
+        cache.put('D20 + 2', expr)
+
+        # Mutate both the original and a handed out copy
+        expr.term_ops.append(TermOperation(Operation.ADD, LabeledTerm(100)))
+        cached = cache.get('D20 + 2')
+        assert cached
+        cached.term_ops.clear()
+        cached.first_term = LabeledTerm(1)
+
+        with pytest.raises(AttributeError):
+            cache.get('D20 + 2').first_term.label = 'Hacked' # type: ignore
+
+        assert str(cache.get('D20 + 2')) == 'D20 + 2'
+
+
+    def test_die_expr_parse_uses_cache(self):
+        DieExpr.cache.clear()
+
+        first = DieExpr.parse('D8 (Sword) - 1 (STR)')
+        second = DieExpr.parse('D8 (Sword) - 1 (STR)')
+
+        assert first == second
+        assert first is not second
+        assert DieExpr.cache.stats().misses == 1
+        assert DieExpr.cache.stats().hits == 1
+
+
+class TestDieExprLimits:
+
+    def test_too_many_dice_fails_fast(self):
+        with pytest.raises(DieParseException, match='rolls 999999999 dice'):
+            DieExpr.parse('999999999D6')
+
+    def test_too_many_terms(self):
+        with pytest.raises(DieParseException, match='has 21 terms'):
+            DieExpr.parse(' + '.join(['1'] * 21))
+
+    def test_too_long(self):
+        with pytest.raises(DieParseException, match='characters long'):
+            DieExpr.parse('D6 + ' * 60 + '1')
+
+    def test_invalid_multiplier(self):
+        with pytest.raises(DieParseException):
+            DieExpr.parse('0D6')
+
+    def test_cost(self):
+        cost = DieExpr.parse('3D6 + D20 - 2 (Penalty)').cost()
+
+        assert cost.total_dice == 4
+        assert cost.term_count == 3
+        assert cost.expr_length == len('3D6 + D20 - 2 (Penalty)')
+
+    def test_cached_expr_rechecked_against_limits(self, monkeypatch):
+        DieExpr.parse('100D6')
+
+        monkeypatch.setattr(DieExpr, 'limits', DieExprLimits(max_dice=10))
+        with pytest.raises(DieParseException):
+            DieExpr.parse('100D6')
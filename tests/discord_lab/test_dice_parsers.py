@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from discord_lab.dice import DieExpr, DieExprParser, DieExprScanParser, DieParseException, DieType, LabeledTerm, MultiDie, Operation, TermOperation
+
+
+pyparsing_parser = DieExprParser()
+scan_parser = DieExprScanParser()
+
+
+def parse_outcome(parser: DieExprParser|DieExprScanParser, expr_str: str) -> DieExpr|tuple[str,str]:
+    try:
+        return parser.parse(expr_str)
+    except (DieParseException, ValueError) as e:
+        return type(e).__name__, str(e)
+
+
+class TestDieExprScanParser:
+
+    def test_parse_complex(self):
+        expr = scan_parser.parse("D20 - 2 (INT) + D4 (Acid) + 2d6 (Fire)")
+
+        assert expr == DieExpr(
+            LabeledTerm(MultiDie(DieType.D20)),
+            [
+                TermOperation(Operation.SUB, LabeledTerm(2, "INT")),
+                TermOperation(Operation.ADD, LabeledTerm(MultiDie(DieType.D4), "Acid")),
+                TermOperation(Operation.ADD, LabeledTerm(MultiDie(DieType.D6, 2), "Fire")),
+            ]
+        )
+
+
+    def test_parse_error_message(self):
+        with pytest.raises(DieParseException) as dpe:
+            scan_parser.parse("WTF")
+
+        assert str(dpe.value) == 'Invalid die roll expression `WTF`'
+
+
+    @pytest.mark.parametrize('expr_str', [
+        # Happy paths
+        'D4', 'D6', 'D8', 'D10', 'D12', 'D20', 'D100', '3d6', '003D6', '007', '5d100(x)',
+        '2D6 + 1 (STR)', 'D6(abc)+2', '1 +D4', 'D6\n+\n2', 'D6 (a_b-c:d)',
+        # Label whitespace and length handling
+        'D6 ( a b )', 'D6  (  x  )', 'D6\t(a\tb)', 'D6 (x\n)',
+        'D6 (abcdefghijklmnopqrst)', 'D6 (abcdefghijklmnopqrstu)', 'D4(xxxxxxxxxxxxxxxxxxx  )',
+        # Trailing text that can't be parsed is ignored
+        'D1000', 'D60', '3 D6', 'D6 + ', 'D6 +-2', 'D6 (abc', 'D6 ()', '2 (STR)(x)', '1D', 'd20 +2 (x) garbage',
+        # Errors
+        '', ' ', '-1', 'D2', 'D 6', 'WTF', '0D6', '٣D6',
+    ])
+    def test_matches_pyparsing(self, expr_str):
+        assert parse_outcome(scan_parser, expr_str) == parse_outcome(pyparsing_parser, expr_str)
+
+
+    def test_matches_pyparsing_fuzzed(self):
+        rng = random.Random(42)
+        fragments = [
+            'D', 'd', '0', '1', '2', '3', '4', '6', '8', '10', '12', '20', '100',
+            ' ', '  ', '\t', '\n', '\r', '+', '-', '(', ')', '_', ':', 'a', 'STR', 'é', '٣',
+            'x' * 19, 'y' * 21,
+        ]
+
+        for _ in range(20000):
+            expr_str = ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 14)))
+
+            assert parse_outcome(scan_parser, expr_str) == parse_outcome(pyparsing_parser, expr_str), repr(expr_str)
@@ -0,0 +1,133 @@
+from array import array
+from itertools import product
+import random
+
+import pytest
+
+from discord_lab.dice import DieExpr, DieExprLimits, DieExprMultiRoll, DieExprMultiRollType, DieType
+from discord_lab.distribution import DISTRIBUTION_MAX_OUTCOMES, MULTI_DIE_DISTRIBUTION_CACHE_SIZE, cached_multi_die_distribution, convolve, multi_die_distribution, poly_mul
+
+
+def brute_force_pmf(die_expr_str: str, multi_roll_type: DieExprMultiRollType|None = None) -> dict[int,float]:
+    die_expr = DieExpr.parse(die_expr_str)
+    terms = [(1, die_expr.first_term.term)] + [(1 if t.operation.value == '+' else -1, t.labeled_term.term) for t in die_expr.term_ops]
+
+    faces = []
+    for sign, term in terms:
+        if isinstance(term, int):
+            faces.append([sign * term])
+        else:
+            faces.extend([[sign * v for v in range(1, term.type + 1)]] * term.multiplier)
+
+    totals = [sum(outcome) for outcome in product(*faces)]
+    if multi_roll_type == DieExprMultiRollType.BEST:
+        totals = [max(a, b) for a, b in product(totals, totals)]
+    elif multi_roll_type == DieExprMultiRollType.WORST:
+        totals = [min(a, b) for a, b in product(totals, totals)]
+
+    counts: dict[int,int] = {}
+    for total in totals:
+        counts[total] = counts.get(total, 0) + 1
+
+    return {total: count / len(totals) for total, count in counts.items()}
+
+
+class TestPolyMul:
+
+    def test_matches_naive_convolution(self):
+        rng = random.Random(6)
+
+        for _ in range(200):
+            a = tuple(rng.randrange(0, 10**rng.randint(1, 25)) for _ in range(rng.randint(1, 30)))
+            b = tuple(rng.randrange(0, 10**rng.randint(1, 25)) for _ in range(rng.randint(1, 30)))
+
+            naive = [0] * (len(a) + len(b) - 1)
+            for i, x in enumerate(a):
+                for j, y in enumerate(b):
+                    naive[i + j] += x * y
+
+            assert poly_mul(a, b) == tuple(naive)
+
+
+    def test_convolve_probabilities(self):
+        rng = random.Random(6)
+        a = [rng.random() for _ in range(30)]
+        b = [rng.random() for _ in range(20)]
+        a, b = [p / sum(a) for p in a], [p / sum(b) for p in b]
+
+        naive = [0.0] * (len(a) + len(b) - 1)
+        for i, x in enumerate(a):
+            for j, y in enumerate(b):
+                naive[i + j] += x * y
+
+        assert list(convolve(array('d', a), array('d', b))) == pytest.approx(naive, rel=1e-12)
+
+
+class TestDistribution:
+
+    def test_2d6(self):
+        dist = DieExpr.parse('2D6').distribution()
+
+        assert dist.offset == 2
+        assert list(dist.probs) == pytest.approx([c / 36 for c in (1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1)])
+        assert dist.probability(7) == pytest.approx(1 / 6)
+        assert dist.mean == pytest.approx(7)
+
+
+    def test_matches_brute_force(self):
+        for die_expr_str in ['D20', '3D6 + 2', 'D8 - 1 (STR) + D4', '2D4 - D6 - 3', '5 - D10']:
+            assert DieExpr.parse(die_expr_str).distribution().pmf() == pytest.approx(brute_force_pmf(die_expr_str)), die_expr_str
+
+
+    def test_multi_roll_matches_brute_force(self):
+        for multi_roll_type in DieExprMultiRollType:
+            for die_expr_str in ['D20', '2D6 - 1', 'D4 - D4']:
+                dist = DieExpr.parse(die_expr_str).distribution(multi_roll_type)
+
+                assert dist.pmf() == pytest.approx(brute_force_pmf(die_expr_str, multi_roll_type)), (die_expr_str, multi_roll_type)
+
+
+    def test_d20_advantage(self):
+        dist = DieExprMultiRoll(DieExpr.parse('D20'), DieExprMultiRollType.BEST).distribution()
+
+        assert dist.probability(20) == pytest.approx(39 / 400)
+        assert dist.probability(1) == pytest.approx(1 / 400)
+
+
+    def test_big_expr(self):
+        dist = DieExpr.parse('10D100 - 3D6 + 4').distribution()
+
+        assert dist.min == 10 - 18 + 4
+        assert dist.max == 1000 - 3 + 4
+        assert sum(dist.probs) == pytest.approx(1)
+        assert dist.mean == pytest.approx(505 - 21 / 2 + 4)
+
+
+    def test_too_many_outcomes(self):
+        # Checked before any convolving, which for this many totals would take seconds
+        with pytest.raises(ValueError):
+            DieExpr.parse('1000D100').distribution()
+
+        assert len(DieExpr.parse('100D100').distribution().probs) <= DISTRIBUTION_MAX_OUTCOMES
+
+
+    def test_chance_to_beat(self):
+        dist = DieExpr.parse('D20 + 2').distribution()
+
+        assert dist.chance_to_beat(12) == pytest.approx(0.5)
+        assert dist.chance_to_beat(0) == pytest.approx(1)
+        assert dist.chance_to_beat(22) == 0
+
+
+    def test_multi_die_memoized(self):
+        assert multi_die_distribution(DieType.D6, 12) is multi_die_distribution(DieType.D6, 12)
+        assert sum(multi_die_distribution(DieType.D6, 6).probs) == pytest.approx(1)
+
+
+    def test_multi_die_memo_bounded(self, monkeypatch):
+        monkeypatch.setattr(DieExpr, 'limits', DieExprLimits(max_dice=4))
+        over_limit = 5
+
+        assert multi_die_distribution(DieType.D4, over_limit) is not multi_die_distribution(DieType.D4, over_limit)
+        assert multi_die_distribution(DieType.D4, over_limit).probability(over_limit) == pytest.approx(1 / 4**over_limit)
+        assert cached_multi_die_distribution.cache_info().maxsize == MULTI_DIE_DISTRIBUTION_CACHE_SIZE
@@ -0,0 +1,83 @@
+from collections import Counter
+
+import pytest
+
+from discord_lab.dice import DieExpr, DieExprMultiRollType
+from discord_lab.simulation import RollStats
+
+
+class TestRollStats:
+
+    def test_stats(self):
+        stats = RollStats()
+        stats.add([1, 2, 2, 3, 4, 4, 4, 10])
+
+        assert stats.count == 8
+        assert stats.min == 1
+        assert stats.max == 10
+        assert stats.mean == 30 / 8
+        assert stats.percentile(50) == 3
+        assert stats.percentile(100) == 10
+        assert stats.percentile(0) == 1
+        assert stats.probability(4) == 3 / 8
+        assert stats.chance_to_beat(3) == 4 / 8
+
+
+    def test_merge(self):
+        stats_1 = RollStats()
+        stats_1.add([1, 2])
+        stats_2 = RollStats()
+        stats_2.add([2, 3])
+        stats_1.merge(stats_2)
+
+        assert stats_1.histogram == Counter({1: 1, 2: 2, 3: 1})
+
+
+    def test_invalid_percentile(self):
+        stats = RollStats()
+        stats.add([1])
+
+        with pytest.raises(ValueError):
+            stats.percentile(101)
+
+
+class TestSimulate:
+
+    def test_matches_exact_distribution(self):
+        die_expr = DieExpr.parse('3D6 - D4 + 2 (STR)')
+        stats = die_expr.simulate(200_000, seed=1)
+        dist = die_expr.distribution()
+
+        assert stats.count == 200_000
+        assert dist.min <= stats.min and stats.max <= dist.max
+        assert stats.mean == pytest.approx(float(dist.mean), abs=0.05)
+
+
+    def test_multi_roll(self):
+        die_expr = DieExpr.parse('D20')
+
+        best = die_expr.simulate(100_000, seed=2, multi_roll_type=DieExprMultiRollType.BEST)
+        worst = die_expr.simulate(100_000, seed=2, multi_roll_type=DieExprMultiRollType.WORST)
+
+        assert best.mean == pytest.approx(float(die_expr.distribution(DieExprMultiRollType.BEST).mean), abs=0.1)
+        assert worst.mean == pytest.approx(float(die_expr.distribution(DieExprMultiRollType.WORST).mean), abs=0.1)
+
+
+    def test_seed_is_reproducible(self):
+        die_expr = DieExpr.parse('2D8 + D100')
+
+        assert die_expr.simulate(10_000, seed='abc').histogram == die_expr.simulate(10_000, seed='abc').histogram
+        assert die_expr.simulate(10_000, seed='abc').histogram != die_expr.simulate(10_000, seed='xyz').histogram
+
+
+    def test_int_only(self):
+        stats = DieExpr.parse('5 - 2').simulate(10)
+
+        assert stats.histogram == Counter({3: 10})
+
+
+    def test_process_pool(self):
+        stats = DieExpr.parse('D6').simulate(10_001, seed=3, processes=2)
+
+        assert stats.count == 10_001
+        assert set(stats.histogram) == {1, 2, 3, 4, 5, 6}
@@ -0,0 +1,66 @@
+import io
+import json
+
+from discord_lab.tracing import NULL_SPAN, Tracer, current_trace, span, traced
+
+
+@traced('double')
+def double(x: int) -> int:
+    return x * 2
+
+
+class TestTracer:
+
+    def test_disabled(self):
+        with Tracer().trace('handler') as trace:
+            assert trace is None
+            assert span('roll') is NULL_SPAN
+            assert double(2) == 4
+
+
+    def test_spans(self):
+        with Tracer(emf=True, stream=io.StringIO()).trace('handler') as trace:
+            with span('roll', dice=3):
+                double(1)
+                double(2)
+
+        assert [s.name for s in trace.spans] == ['handler', 'roll', 'double', 'double']
+        assert trace.spans[1].attrs == {'dice': 3}
+        assert all(s.end_ns >= s.start_ns for s in trace.spans)
+        assert trace.spans[0].start_ns <= trace.spans[1].start_ns <= trace.spans[1].end_ns <= trace.spans[0].end_ns
+        assert set(trace.totals_ms()) == {'handler', 'roll', 'double'}
+        assert current_trace.get() is None
+
+
+    def test_emf_cold_start(self):
+        stream = io.StringIO()
+        tracer = Tracer(emf=True, stream=stream, clock_ms=lambda: 1000)
+        tracer.mark_initialized()
+
+        for _ in range(2):
+            with tracer.trace('handler') as trace:
+                trace.tags['Route'] = '2/roll'
+
+        cold, warm = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert cold['_aws']['Timestamp'] == 1000
+        assert cold['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['ColdStart', 'Route']]
+        assert {m['Name'] for m in cold['_aws']['CloudWatchMetrics'][0]['Metrics']} == {'handler', 'init'}
+        assert (cold['ColdStart'], cold['Route']) == ('true', '2/roll')
+        assert cold['init'] > 0
+        assert warm['ColdStart'] == 'false'
+        assert 'init' not in warm
+
+
+    def test_chrome_trace_appends(self, tmp_path):
+        path = tmp_path / 'trace.json'
+        tracer = Tracer(chrome_path=str(path))
+
+        for _ in range(2):
+            with tracer.trace('handler'):
+                with span('roll'):
+                    pass
+
+        # The closing `]` is optional in the format, but not to `json`
+        events = json.loads(path.read_text().rstrip(',\n') + ']')
+        assert [e['name'] for e in events] == ['handler', 'roll', 'handler', 'roll']
+        assert all(e['ph'] == 'X' for e in events)
@@ -0,0 +1,207 @@
+from threading import Event
+
+import pytest
+
+from discord_lab.interactions.askroll_queue import TABLE_NAME, AskRollRepository, AskRollRequest
+from discord_lab.interactions.item_cache import ItemCache
+from discord_lab.interactions.storage import InMemoryDynamoDB
+from discord_lab.interactions.write_behind import WriteBehindQueue
+
+NOW = 1_700_000_000
+TTL_SECS = 3600
+
+
+class FakeDynamoDBClient:
+
+    def __init__(self, unprocessed_batches: int = 0):
+        self.items: dict[str, dict] = {}
+        self.calls: list[tuple[str, dict]] = []
+        self.unprocessed_batches = unprocessed_batches
+        # Puts of these items block until their event is set
+        self.held: dict[str, Event] = {}
+
+    def put_item(self, **kwargs):
+        held = self.held.get(kwargs['Item']['interaction_id']['N'])
+        if held is not None:
+            held.wait(5)
+        self.calls.append(('put_item', kwargs))
+        self.items[kwargs['Item']['interaction_id']['N']] = dict(kwargs['Item'])
+
+    def update_item(self, **kwargs):
+        self.calls.append(('update_item', kwargs))
+        item = self.items[kwargs['Key']['interaction_id']['N']]
+        for attr, update in kwargs['AttributeUpdates'].items():
+            if update['Action'] == 'DELETE':
+                item.pop(attr, None)
+            else:
+                item[attr] = update['Value']
+
+    def get_item(self, **kwargs):
+        self.calls.append(('get_item', kwargs))
+        item = self.items.get(kwargs['Key']['interaction_id']['N'])
+        if item is None:
+            return {}
+
+        return {'Item': self._project(item, kwargs)}
+
+    def batch_get_item(self, **kwargs):
+        self.calls.append(('batch_get_item', kwargs))
+        request = kwargs['RequestItems'][TABLE_NAME]
+        keys = request['Keys']
+
+        # Hold back the last key, as if it were throttled
+        unprocessed = []
+        if self.unprocessed_batches and len(keys) > 1:
+            self.unprocessed_batches -= 1
+            keys, unprocessed = keys[:-1], keys[-1:]
+
+        items = [self._project(self.items[key['interaction_id']['N']], request) for key in keys if key['interaction_id']['N'] in self.items]
+        response: dict = {'Responses': {TABLE_NAME: items}}
+        if unprocessed:
+            response['UnprocessedKeys'] = {TABLE_NAME: {'Keys': unprocessed}}
+
+        return response
+
+    def _project(self, item: dict, kwargs: dict) -> dict:
+        if 'ExpressionAttributeNames' not in kwargs:
+            return dict(item)
+
+        attr_names = kwargs['ExpressionAttributeNames'].values()
+        return {attr: value for attr, value in item.items() if attr in attr_names}
+
+
+def new_request(interaction_id: int = 1300000000000000001) -> AskRollRequest:
+    return AskRollRequest(interaction_id=interaction_id, from_user_id=12, to_user_id=13, die_expr='D20 + 2', must_beat=10)
+
+
+class TestAskRollRepository:
+
+    def setup_method(self):
+        self.client = FakeDynamoDBClient()
+        self.cache = ItemCache()
+        self.writes = WriteBehindQueue(lambda: self.client)
+        self.repo = AskRollRepository(lambda: self.client, self.writes, self.cache, TTL_SECS, 5, clock=lambda: NOW)
+
+
+    def test_put_sets_version_and_ttl(self):
+        self.repo.put(new_request())
+        assert self.writes.flush(5)
+
+        item = self.client.items['1300000000000000001']
+        assert item['version'] == {'N': '1'}
+        assert item['expires_at'] == {'N': str(NOW + TTL_SECS)}
+        assert item['must_beat'] == {'N': '10'}
+        assert 'special_roll_types' not in item
+
+
+    def test_get_reads_own_write_from_cache(self):
+        self.repo.put(new_request())
+
+        roll_req = self.repo.get('1300000000000000001')
+
+        assert roll_req.die_expr == 'D20 + 2'
+        assert roll_req.must_beat == 10
+        assert not [call for call in self.client.calls if call[0] == 'get_item']
+
+
+    def test_get_stale_cached_item_reads_db(self):
+        self.repo.put(new_request())
+        self.writes.flush(5)
+        self.client.items['1300000000000000001']['player_roll_adjust'] = {'S': '+2'}
+
+        roll_req = self.repo.get('1300000000000000001', is_current=lambda cached: cached.player_roll_adjust == '+2')
+
+        assert roll_req.player_roll_adjust == '+2'
+        assert self.client.calls[-1][1]['ConsistentRead']
+
+
+    def test_get_projected(self):
+        self.repo.put(new_request())
+        self.writes.flush(5)
+        self.cache.clear()
+
+        roll_req = self.repo.get('1300000000000000001', ['player_roll_adjust', 'version'])
+
+        assert self.client.calls[-1][1]['ProjectionExpression'] == '#a0, #a1'
+        assert self.client.calls[-1][1]['ExpressionAttributeNames'] == {'#a0': 'player_roll_adjust', '#a1': 'version'}
+        assert roll_req.die_expr is None
+        assert roll_req.version == 1
+
+        # Partial items must never be cached
+        assert len(self.cache) == 0
+
+
+    def test_get_missing(self):
+        with pytest.raises(AskRollRequest.DoesNotExist):
+            self.repo.get('404')
+
+
+    def test_update_conditional_on_cached_version(self):
+        # Keep the writer busy with another item, so the put is still pending when the updates are queued
+        self.client.held['1300000000000000002'] = release = Event()
+        self.repo.put(new_request(1300000000000000002))
+
+        self.repo.put(new_request())
+        self.repo.update('1300000000000000001', special_roll_types={'BEST'}, player_roll_adjust='+1')
+        self.repo.update('1300000000000000001', special_roll_types=set())
+        release.set()
+        assert self.writes.flush(5)
+
+        # Coalesced into the put, which needs no condition
+        assert [(call[0], call[1]['Item']['interaction_id']['N']) for call in self.client.calls] == [('put_item', '1300000000000000002'), ('put_item', '1300000000000000001')]
+        item = self.client.items['1300000000000000001']
+        assert item['version'] == {'N': '3'}
+        assert item['player_roll_adjust'] == {'S': '+1'}
+        assert 'special_roll_types' not in item
+
+        self.repo.update('1300000000000000001', player_roll_adjust=None)
+        assert self.writes.flush(5)
+
+        operation, kwargs = self.client.calls[-1]
+        assert operation == 'update_item'
+        assert kwargs['Expected'] == {'version': {'Value': {'N': '3'}}}
+        assert kwargs['AttributeUpdates']['player_roll_adjust'] == {'Action': 'DELETE'}
+
+
+    def test_uncached_update_makes_other_caches_stale(self):
+        db = InMemoryDynamoDB()
+        conflicts = []
+
+        def container() -> tuple[AskRollRepository, WriteBehindQueue]:
+            writes = WriteBehindQueue(lambda: db, on_conflict=conflicts.append)
+            return AskRollRepository(lambda: db, writes, ItemCache(), TTL_SECS, 5, clock=lambda: NOW), writes
+
+        cached_repo, cached_writes = container()
+        uncached_repo, uncached_writes = container()
+
+        cached_repo.put(new_request())
+        assert cached_writes.flush(5)
+
+        # This container never had the item, but its update still bumps the version
+        uncached_repo.update('1300000000000000001', player_roll_adjust='+1')
+        assert uncached_writes.flush(5)
+        assert db.get_item(TableName=TABLE_NAME, Key={'interaction_id': {'N': '1300000000000000001'}})['Item']['version'] == {'N': '2'}
+
+        # So the other container's update from its cached copy conflicts
+        cached_repo.update('1300000000000000001', player_roll_adjust='+2')
+        assert cached_writes.flush(5)
+        assert cached_writes.stats.conflicts == 1
+        assert [op.expected for op in conflicts] == [{'version': {'Value': {'N': '1'}}}]
+
+
+    def test_batch_get(self):
+        for interaction_id in range(150):
+            self.repo.put(new_request(interaction_id))
+        self.writes.flush(5)
+        self.cache.clear()
+        self.repo.get('0')
+        self.client.unprocessed_batches = 1
+        self.client.calls.clear()
+
+        roll_reqs = self.repo.batch_get([str(i) for i in range(150)] + ['404'], ['must_beat'])
+
+        assert sorted(roll_reqs, key=int) == [str(i) for i in range(150)]
+        assert roll_reqs['42'].must_beat == 10
+        # 150 uncached keys is 2 batches, plus one more for the throttled key
+        assert len(self.client.calls) == 3
+        assert max(len(kwargs['RequestItems'][TABLE_NAME]['Keys']) for _, kwargs in self.client.calls) == 100
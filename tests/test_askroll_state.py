@@ -0,0 +1,47 @@
+import pytest
+
+from discord_lab.interactions.askroll_state import AskRollState, decode_custom_id, encode_custom_id, stamp_components
+from discord_lab.interactions.custom_id import CUSTOM_ID_MAX_LEN, CustomIdSigner
+
+SIGNER = CustomIdSigner(b'key')
+STATE = AskRollState(1200000000000000002, 'D20 + 2 (DEX)', 'WORST', '+2 (Bless) - 1 (Wisdom)', 12)
+
+
+class TestAskRollState:
+
+    def test_round_trip(self):
+        for state in [
+                STATE,
+                AskRollState(1, 'D6'),
+                AskRollState(2, '2D6', 'BEST', outcome_in_db=True),
+                AskRollState(3, 'D20', special_roll_type=None, outcome_in_db=True)]:
+            custom_id = encode_custom_id(SIGNER, 'special_roll_types', state)
+
+            assert len(custom_id) <= CUSTOM_ID_MAX_LEN
+            assert decode_custom_id(SIGNER, custom_id) == state
+
+
+    def test_invalid_flags(self):
+        with pytest.raises(ValueError):
+            decode_custom_id(SIGNER, SIGNER.sign('roll_click', ['3', '-x', '', 'D20', '']))
+
+
+    def test_too_big_falls_back_to_plain(self):
+        state = STATE.with_player_roll_adjust('+1 (Really long adjustment label that goes on and on)')
+
+        assert encode_custom_id(SIGNER, 'roll_click', state) == 'roll_click'
+        assert decode_custom_id(SIGNER, 'roll_click') is None
+
+
+    def test_stamp_components(self):
+        action_rows = [
+            {'type': 1, 'components': [{'type': 3, 'custom_id': 'special_roll_types'}]},
+            {'type': 1, 'components': [{'type': 2, 'custom_id': 'roll_click'}, {'type': 2, 'custom_id': 'adjust_roll_click'}]},
+        ]
+
+        stamp_components(SIGNER, action_rows, STATE)
+        stamp_components(SIGNER, action_rows, STATE.with_special_roll_type(None))
+
+        custom_ids = [c['custom_id'] for row in action_rows for c in row['components']]
+        assert [c.partition(':')[0] for c in custom_ids] == ['special_roll_types', 'roll_click', 'adjust_roll_click']
+        assert all(decode_custom_id(SIGNER, c) == STATE.with_special_roll_type(None) for c in custom_ids)
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from discord_lab.interactions import auth
+from discord_lab.interactions.auth import OAuth2TokenCache
+
+SCOPES = ['applications.commands', 'applications.commands.update']
+CLIENT_ID = '1234'
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestOAuth2TokenCache:
+
+    def test_keyed_on_scope_set(self):
+        cache = OAuth2TokenCache(CLIENT_ID, clock=FakeClock())
+        cache.put(SCOPES, 'token', 3600)
+
+        assert cache.get(reversed(SCOPES)) == 'token'
+        assert cache.get(SCOPES[:1]) is None
+
+
+    def test_refreshed_before_expiry(self):
+        clock = FakeClock()
+        cache = OAuth2TokenCache(CLIENT_ID, refresh_margin_secs=60, clock=clock)
+        cache.put(SCOPES, 'token', 3600)
+
+        clock.now += 3600 - 61
+        assert cache.get(SCOPES) == 'token'
+
+        clock.now += 1
+        assert cache.get(SCOPES) is None
+
+
+    def test_persisted(self, tmp_path):
+        path = tmp_path / 'tokens.json'
+        clock = FakeClock()
+        OAuth2TokenCache(CLIENT_ID, path=str(path), clock=clock).put(SCOPES, 'token', 3600)
+
+        assert OAuth2TokenCache(CLIENT_ID, path=str(path), clock=clock).get(SCOPES) == 'token'
+        assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+    def test_persisted_per_client_id(self, tmp_path):
+        path = tmp_path / 'tokens.json'
+        clock = FakeClock()
+        OAuth2TokenCache(CLIENT_ID, path=str(path), clock=clock).put(SCOPES, 'token', 3600)
+
+        other_cache = OAuth2TokenCache('5678', path=str(path), clock=clock)
+        assert other_cache.get(SCOPES) is None
+
+        # Saving its own token keeps the other app's
+        other_cache.put(SCOPES, 'other_token', 3600)
+        assert OAuth2TokenCache(CLIENT_ID, path=str(path), clock=clock).get(SCOPES) == 'token'
+        assert OAuth2TokenCache('5678', path=str(path), clock=clock).get(SCOPES) == 'other_token'
+
+
+    def test_unreadable_file_ignored(self, tmp_path):
+        path = tmp_path / 'tokens.json'
+        path.write_text('not json')
+
+        assert OAuth2TokenCache(CLIENT_ID, path=str(path)).get(SCOPES) is None
+
+
+class TestGetOAuth2AccessToken:
+
+    def test_fetched_once(self, monkeypatch):
+        fetches = []
+        def fetch(scopes):
+            fetches.append(scopes)
+            # Give other threads a chance to pile up on the fetch
+            threading.Event().wait(0.01)
+            return {'access_token': f'token{len(fetches)}', 'expires_in': 604800}
+
+        monkeypatch.setattr(auth, 'fetch_oauth2_access_token', fetch)
+        monkeypatch.setattr(auth, 'oauth2_token_cache', OAuth2TokenCache(CLIENT_ID))
+
+        with ThreadPoolExecutor(8) as executor:
+            tokens = list(executor.map(lambda _: auth.get_oauth2_access_token(SCOPES), range(16)))
+
+        assert tokens == ['token1'] * 16
+        assert len(fetches) == 1
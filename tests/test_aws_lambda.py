@@ -1,4 +1,6 @@
 from discord_lab.dice import DieExpr, DieExprRoll, DieRoll, DieType, IntTermOperationResult, LabeledTerm, MultiDie, MultiDieRoll, MultiDieTermOperationResult, Operation, TermOperation
+from discord_lab.interactions import aws_lambda
+from discord_lab.interactions.askroll_state import AskRollState, decode_custom_id, encode_custom_id, stamp_components
 from discord_lab.interactions.aws_lambda import die_roll_to_md, render_expr_roll, render_multidie_roll
 
 
@@ -52,3 +54,36 @@ class TestDieRollToMd:
         )
 
         assert md == '9 <:d6_5:1282212308982169653> <:d6_4:1282212289310621717> (Sword) - 2 (STR) + <:d4_4:1282216878072135720> (Acid)\n# 11'
+
+
+class TestAdjustRollModalSubmit:
+
+    def test_keeps_special_roll_type_picked_after_adjust_click(self, monkeypatch):
+        updates = []
+
+        class FakeRepo:
+            def update(self, interaction_id, **attrs):
+                updates.append((interaction_id, attrs))
+
+        monkeypatch.setattr(aws_lambda, 'askroll_repo', lambda: FakeRepo())
+
+        state = AskRollState(6, 'D20')
+        components = [
+            {'type': 1, 'components': [{'type': 3, 'custom_id': 'special_roll_types'}]},
+            {'type': 1, 'components': [{'type': 2, 'custom_id': 'roll_click'}, {'type': 2, 'custom_id': 'adjust_roll_click'}]},
+        ]
+        # BEST was picked while the modal, stamped with the state before it, was open
+        stamp_components(aws_lambda.custom_id_signer, components, state.with_special_roll_type('BEST'))
+        req_body = {
+            'message': {'interaction': {'id': '77'}, 'embeds': [{'fields': []}], 'components': components},
+            'data': {
+                'custom_id': encode_custom_id(aws_lambda.custom_id_signer, 'adjust_roll_save', state),
+                'components': [{'components': [{'value': '+1'}]}],
+            },
+        }
+
+        _, res_body = aws_lambda.adjust_roll_modal_submit(req_body)
+
+        custom_ids = [c['custom_id'] for row in res_body['data']['components'] for c in row['components']]
+        assert all(decode_custom_id(aws_lambda.custom_id_signer, c) == AskRollState(6, 'D20', 'BEST', '+1') for c in custom_ids)
+        assert updates == [('77', {'player_roll_adjust': '+1'})]
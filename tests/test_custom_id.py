@@ -0,0 +1,35 @@
+import pytest
+
+from discord_lab.interactions.custom_id import CUSTOM_ID_MAX_LEN, CustomIdSigner, custom_id_name, derive_key
+
+SIGNER = CustomIdSigner(derive_key('secret', 'custom_id'))
+
+
+class TestCustomIdSigner:
+
+    def test_round_trip(self):
+        custom_id = SIGNER.sign('roll_click', ['abc', '', 'D20 + 2 (DEX)'])
+
+        assert custom_id_name(custom_id) == 'roll_click'
+        assert SIGNER.verify(custom_id) == ['abc', '', 'D20 + 2 (DEX)']
+
+
+    def test_plain(self):
+        assert custom_id_name('roll_click') == 'roll_click'
+        assert SIGNER.verify('roll_click') is None
+
+
+    def test_tampered(self):
+        custom_id = SIGNER.sign('roll_click', ['abc', 'D20'])
+
+        with pytest.raises(ValueError):
+            SIGNER.verify(custom_id.replace('D20', 'D21'))
+        with pytest.raises(ValueError):
+            SIGNER.verify(custom_id.replace('roll_click', 'adjust_roll_click'))
+        with pytest.raises(ValueError):
+            CustomIdSigner(derive_key('other', 'custom_id')).verify(custom_id)
+
+
+    def test_does_not_fit(self):
+        assert SIGNER.sign('roll_click', ['D20 ~ 2']) is None
+        assert SIGNER.sign('roll_click', ['x' * CUSTOM_ID_MAX_LEN]) is None
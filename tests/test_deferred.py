@@ -0,0 +1,225 @@
+import json
+
+import pytest
+
+from discord_lab.interactions.deferred import ERROR_CONTENT, DeferralPolicy, DeferredResponder, LocalDeferredQueue, SqsDeferredQueue, deferred_ack, sqs_records_to_interactions, sqs_records_to_write_ops
+from discord_lab.interactions.jsonio import InteractionBody, RawJson
+from discord_lab.interactions.router import InteractionRouter, InteractionType
+from discord_lab.interactions.write_behind import WriteOp
+
+ROLL_KEY = (InteractionType.APPLICATION_COMMAND, 'roll', None)
+CLICK_KEY = (InteractionType.MESSAGE_COMPONENT, 'askroll', 'roll_click')
+
+ROLL_REQ = {'id': '1', 'token': 'tok', 'type': 2, 'data': {'name': 'roll'}}
+CLICK_REQ = {'id': '2', 'token': 'tok', 'type': 3, 'data': {'custom_id': 'roll_click'}, 'message': {'interaction': {'name': 'askroll'}}}
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+        self.text = ''
+
+
+class FakeRest:
+
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+        self.requests: list[tuple[str, str, dict]] = []
+
+    def request(self, method: str, path: str, **kwargs) -> FakeResponse:
+        self.requests.append((method, path, kwargs['json']))
+        return FakeResponse(self.status_code)
+
+
+class TestDeferralPolicy:
+
+    def setup_method(self):
+        self.router = InteractionRouter()
+        self.router.add(InteractionType.APPLICATION_COMMAND, 'roll', None, lambda req_body: (200, {}), deferrable=True)
+        self.router.add(InteractionType.MESSAGE_COMPONENT, 'askroll', 'roll_click', lambda req_body: (200, {}))
+
+
+    def test_defers_over_budget_p95(self):
+        policy = DeferralPolicy(self.router, budget_ms=100, min_samples=20)
+        stats = self.router.stats[ROLL_KEY]
+
+        for _ in range(19):
+            stats.add(200_000_000)
+        assert not policy.should_defer(ROLL_KEY)
+
+        stats.add(200_000_000)
+        assert policy.should_defer(ROLL_KEY)
+
+        # Back under budget for 95% of recent calls
+        for _ in range(1000):
+            stats.add(10_000_000)
+        assert not policy.should_defer(ROLL_KEY)
+
+
+    def test_remeasured_after_hold(self):
+        now = [0.0]
+        policy = DeferralPolicy(self.router, budget_ms=100, min_samples=2, hold_secs=60, clock=lambda: now[0])
+        stats = self.router.stats[ROLL_KEY]
+        stats.add(200_000_000)
+        stats.add(200_000_000)
+
+        # Deferred requests are timed elsewhere, so nothing here changes while it's deferred
+        assert policy.should_defer(ROLL_KEY)
+        now[0] = 59
+        assert policy.should_defer(ROLL_KEY)
+
+        now[0] = 60
+        assert not policy.should_defer(ROLL_KEY)
+        stats.add(10_000_000)
+        stats.add(10_000_000)
+        assert not policy.should_defer(ROLL_KEY)
+
+
+    def test_only_deferrable_routes(self):
+        policy = DeferralPolicy(self.router, budget_ms=100, min_samples=1)
+        self.router.stats[CLICK_KEY].add(200_000_000)
+
+        assert not policy.should_defer(CLICK_KEY)
+
+
+    def test_disabled(self):
+        policy = DeferralPolicy(self.router, budget_ms=0, min_samples=1)
+        self.router.stats[ROLL_KEY].add(200_000_000)
+
+        assert not policy.should_defer(ROLL_KEY)
+
+
+    def test_ping_not_deferrable(self):
+        with pytest.raises(ValueError):
+            self.router.add(InteractionType.PING, None, None, lambda req_body: (200, {}), deferrable=True)
+
+
+class TestDeferredResponder:
+
+    def responder(self, handler, custom_id: str|None = None, rest: FakeRest|None = None) -> DeferredResponder:
+        router = InteractionRouter()
+        if custom_id:
+            router.add(InteractionType.MESSAGE_COMPONENT, 'askroll', custom_id, handler, deferrable=True)
+        else:
+            router.add(InteractionType.APPLICATION_COMMAND, 'roll', None, handler, deferrable=True)
+
+        return DeferredResponder(router, 'app', rest or FakeRest())
+
+
+    def test_acks(self):
+        assert deferred_ack(ROLL_REQ) == {'type': 5}
+        assert deferred_ack(CLICK_REQ) == {'type': 6}
+
+
+    def test_command_edits_original(self):
+        responder = self.responder(lambda req_body: (200, {'type': 4, 'data': {'content': '# 7'}}))
+        responder.respond(ROLL_REQ)
+
+        assert responder.rest.requests == [('PATCH', '/webhooks/app/tok/messages/@original', {'content': '# 7'})]
+        assert responder.stats.delivered == 1
+
+
+    def test_raw_json_response(self):
+        responder = self.responder(lambda req_body: (200, RawJson('{"type":4,"data":{"content":"# 7"}}')))
+        responder.respond(ROLL_REQ)
+
+        assert responder.rest.requests == [('PATCH', '/webhooks/app/tok/messages/@original', {'content': '# 7'})]
+
+
+    def test_component_update_edits_message(self):
+        responder = self.responder(lambda req_body: (200, {'type': 7, 'data': {'embeds': []}}), 'roll_click')
+        responder.respond(CLICK_REQ)
+
+        assert responder.rest.requests == [('PATCH', '/webhooks/app/tok/messages/@original', {'embeds': []})]
+
+
+    def test_component_message_follows_up(self):
+        data = {'content': 'Not yer roll, bruh!', 'flags': 64}
+        responder = self.responder(lambda req_body: (200, {'type': 4, 'data': data}), 'roll_click')
+        responder.respond(CLICK_REQ)
+
+        assert responder.rest.requests == [('POST', '/webhooks/app/tok', data)]
+
+
+    def test_handler_error_replaces_thinking(self):
+        def fail(req_body):
+            raise KeyError('dice')
+
+        responder = self.responder(fail)
+        responder.respond(ROLL_REQ)
+
+        assert responder.rest.requests == [('PATCH', '/webhooks/app/tok/messages/@original', {'content': ERROR_CONTENT})]
+        assert responder.stats.failed == 1
+
+
+    def test_webhook_error(self):
+        responder = self.responder(lambda req_body: (200, {'type': 4, 'data': {}}), rest=FakeRest(404))
+        responder.respond(ROLL_REQ)
+
+        assert responder.stats.failed == 1
+        assert responder.stats.delivered == 0
+
+
+class TestQueues:
+
+    def test_local(self):
+        responded = []
+        queue = LocalDeferredQueue(responded.append, workers=2)
+
+        for i in range(10):
+            queue.send({'id': str(i)})
+        queue.join()
+
+        assert sorted(int(req_body['id']) for req_body in responded) == list(range(10))
+
+
+    def test_sqs_round_trip(self):
+        sent = []
+
+        class FakeSqs:
+            def send_message(self, **kwargs):
+                sent.append(kwargs)
+
+        SqsDeferredQueue('https://sqs/queue', FakeSqs).send(ROLL_REQ)
+
+        assert sent[0]['QueueUrl'] == 'https://sqs/queue'
+        assert sqs_records_to_interactions({'Records': [{'body': sent[0]['MessageBody']}]}) == [ROLL_REQ]
+        assert json.loads(sent[0]['MessageBody']) == ROLL_REQ
+
+
+    def test_sqs_forwards_raw_body(self):
+        sent = []
+
+        class FakeSqs:
+            def send_message(self, **kwargs):
+                sent.append(kwargs)
+
+        raw = '{"id": "1", "token": "tok", "type": 2, "data": {"name": "roll"}}'
+        req_body = InteractionBody(raw)
+        SqsDeferredQueue('https://sqs/queue', FakeSqs).send(req_body)
+
+        assert sent[0]['MessageBody'] is raw
+        assert not req_body.is_parsed
+
+
+    def test_sqs_write_ops(self):
+        sent = []
+
+        class FakeSqs:
+            def send_message(self, **kwargs):
+                sent.append(kwargs)
+
+        op = WriteOp('rollit-askroll-queue', {'interaction_id': {'N': '1'}}, None, {'version': {'Value': {'N': '1'}, 'Action': 'ADD'}}, {'version': {'Value': {'N': '2'}}}, attempts=2)
+        queue = SqsDeferredQueue('https://sqs/queue', FakeSqs)
+        queue.send_writes([op])
+        queue.send(ROLL_REQ)
+
+        # As Lambda hands SQS messages to a subscribed handler
+        records = [
+            {'body': message['MessageBody'], 'messageAttributes': {name: {'dataType': attr['DataType'], 'stringValue': attr['StringValue']} for name, attr in message.get('MessageAttributes', {}).items()}}
+            for message in sent
+        ]
+
+        assert sqs_records_to_write_ops({'Records': records}) == [WriteOp(op.table, op.key, None, op.attr_updates, op.expected)]
+        assert sqs_records_to_interactions({'Records': records}) == [ROLL_REQ]
@@ -0,0 +1,99 @@
+from discord_lab.interactions.item_cache import ItemCache, item_version
+
+ITEM = {
+    'interaction_id': {'N': '1'},
+    'die_expr': {'S': 'D20'},
+    'version': {'N': '1'},
+}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestItemCache:
+
+    def test_read_your_writes(self):
+        cache = ItemCache()
+        cache.put('1', ITEM)
+
+        assert cache.get('1') == ITEM
+        assert cache.get('2') is None
+        assert cache.stats().hits == 1
+        assert cache.stats().misses == 1
+
+
+    def test_get_returns_copy(self):
+        cache = ItemCache()
+        cache.put('1', ITEM)
+
+        cache.get('1')['die_expr']['S'] = 'D4' # type: ignore
+
+        assert cache.get('1') == ITEM
+
+
+    def test_expires(self):
+        clock = FakeClock()
+        cache = ItemCache(ttl_secs=60, clock=clock)
+        cache.put('1', ITEM)
+
+        clock.now = 59
+        assert cache.get('1') is not None
+
+        clock.now = 61
+        assert cache.get('1') is None
+        assert cache.stats().expirations == 1
+
+
+    def test_lru_eviction(self):
+        cache = ItemCache(max_size=2)
+        cache.put('1', ITEM)
+        cache.put('2', ITEM)
+        cache.get('1')
+        cache.put('3', ITEM)
+
+        assert cache.get('2') is None
+        assert cache.get('1') is not None
+        assert cache.stats().evictions == 1
+
+
+    def test_update_bumps_version(self):
+        cache = ItemCache()
+        cache.put('1', ITEM)
+
+        attr_updates, expected = cache.update('1', {
+            'player_roll_adjust': {'Value': {'S': '+2'}, 'Action': 'PUT'},
+            'die_expr': {'Action': 'DELETE'},
+        })
+
+        assert expected == {'version': {'Value': {'N': '1'}}}
+        assert attr_updates['version'] == {'Value': {'N': '2'}, 'Action': 'PUT'}
+
+        cached = cache.get('1')
+        assert cached is not None
+        assert item_version(cached) == 2
+        assert cached['player_roll_adjust'] == {'S': '+2'}
+        assert 'die_expr' not in cached
+
+
+    def test_update_uncached_is_unconditional(self):
+        cache = ItemCache()
+        updates = {'player_roll_adjust': {'Value': {'S': '+2'}, 'Action': 'PUT'}}
+
+        # Still bumps the version, so other caches' copies go stale
+        assert cache.update('1', updates) == ({**updates, 'version': {'Value': {'N': '1'}, 'Action': 'ADD'}}, None)
+        assert len(cache) == 0
+
+
+    def test_invalidate(self):
+        cache = ItemCache()
+        cache.put('1', ITEM)
+        cache.invalidate('1')
+
+        assert cache.get('1') is None
+        assert cache.stats().invalidations == 1
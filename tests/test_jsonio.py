@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from discord_lab.interactions import jsonio
+from discord_lab.interactions.jsonio import InteractionBody, RawJson, dumps, loads, raw_json
+
+RES_BODY = {
+    'type': 4,
+    'data': {
+        'content': '🎲 **17** ⟵ 1d20 (15) + 2 (DEX)',
+        'embeds': [{'title': 'Stealth check', 'fields': [{'name': 'Must beat', 'value': '12', 'inline': True}]}],
+        'components': [{'type': 1, 'components': [{'type': 2, 'style': 1, 'label': 'Roll', 'custom_id': 'roll_click:abc~1'}]}],
+        'flags': None,
+        'allowed_mentions': {'parse': []},
+    },
+}
+
+
+class TestDumps:
+
+    def test_compact_utf8(self):
+        assert dumps(RES_BODY) == json.dumps(RES_BODY, ensure_ascii=False, separators=(',', ':'))
+
+
+    def test_round_trip(self):
+        assert loads(dumps(RES_BODY)) == RES_BODY
+        assert loads(dumps(RES_BODY).encode()) == RES_BODY
+
+
+    def test_big_int(self):
+        # Past what orjson can write, so it falls back to the standard library
+        assert dumps({'total': 2**70}) == '{"total":1180591620717411303424}'
+
+
+    def test_unserializable(self):
+        with pytest.raises(TypeError):
+            dumps({'roll': object()})
+
+
+    def test_stdlib_backend(self, monkeypatch):
+        expected = dumps(RES_BODY)
+        monkeypatch.setattr(jsonio, 'orjson', None)
+
+        assert dumps(RES_BODY) == expected
+        assert loads(expected) == RES_BODY
+
+
+class TestInteractionBody:
+
+    RAW = '{"id": "1", "type": 2, "token": "secret", "data": {"name": "roll", "options": []}}'
+
+    def test_parsed_when_touched(self):
+        req_body = InteractionBody(self.RAW)
+        assert not req_body.is_parsed
+
+        assert req_body['data']['name'] == 'roll'
+        assert req_body.is_parsed
+        assert req_body.get('message') is None
+        assert 'token' in req_body
+        assert len(req_body) == 4
+        assert req_body == json.loads(self.RAW)
+
+
+    def test_parsed_once(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(jsonio, 'loads', lambda s: calls.append(s) or json.loads(s))
+
+        req_body = InteractionBody(self.RAW)
+        req_body['id'], req_body['type'], req_body.get('data')
+
+        assert calls == [self.RAW]
+
+
+    def test_not_an_object(self):
+        with pytest.raises(ValueError):
+            InteractionBody('[1, 2]')['id']
+
+
+    def test_invalid_json(self):
+        with pytest.raises(ValueError):
+            InteractionBody('{"id": ')['id']
+
+
+    def test_repr_hides_token(self):
+        assert 'secret' not in repr(InteractionBody(self.RAW))
+
+
+    def test_raw_json(self):
+        assert raw_json(InteractionBody(self.RAW)) is self.RAW
+        assert raw_json(RawJson(self.RAW)) is self.RAW
+        assert raw_json({'id': '1'}) == '{"id":"1"}'
+        assert RawJson(self.RAW).parse() == json.loads(self.RAW)
@@ -0,0 +1,120 @@
+from copy import deepcopy
+import json
+
+import pytest
+
+from discord_lab.interactions import manage
+from discord_lab.interactions.rest import DiscordRestClient
+
+APP_ID = '1'
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int, body: object):
+        self.status_code = status_code
+        self.body = body
+        self.headers: dict[str,str] = {}
+
+    def json(self) -> object:
+        return self.body
+
+
+# Stands in for the global app commands endpoints, storing commands like Discord does: with
+# ids, versions and defaults filled in
+class FakeDiscordApi:
+
+    def __init__(self, cmds: list[dict]|None = None):
+        self.cmds: list[dict] = []
+        self.requests: list[tuple[str, str]] = []
+        self._put(cmds or [])
+
+    def request(self, method: str, url: str, **kwargs) -> FakeResponse:
+        self.requests.append((method, url))
+        assert url == f'https://discord.test/api/applications/{APP_ID}/commands'
+
+        match method:
+            case 'GET':
+                return FakeResponse(200, deepcopy(self.cmds))
+            case 'PUT':
+                self._put(json.loads(json.dumps(kwargs['json'])))
+                return FakeResponse(200, deepcopy(self.cmds))
+            case _:
+                return FakeResponse(405, {'message': '405: Method Not Allowed'})
+
+    def _put(self, cmds: list[dict]):
+        self.cmds = [
+            {'id': str(100 + i), 'application_id': APP_ID, 'version': '1', 'type': 1, 'nsfw': False, 'default_member_permissions': None, **cmd}
+            for i, cmd in enumerate(cmds)
+        ]
+
+
+@pytest.fixture
+def discord_api(monkeypatch) -> FakeDiscordApi:
+    api = FakeDiscordApi()
+    monkeypatch.setattr(manage, 'discord_rest', DiscordRestClient('https://discord.test/api', session_factory=lambda: api)) # type: ignore
+    monkeypatch.setattr(manage, 'get_oauth2_access_token', lambda scopes: 'token')
+
+    return api
+
+
+class TestCmdHash:
+
+    def test_ignores_discord_added_fields(self):
+        remote_cmd = {
+            **manage.roll_cmd,
+            'id': '123',
+            'version': '456',
+            'type': 1,
+            'options': [{**option, 'required': option.get('required', False)} for option in manage.roll_cmd['options']],
+        }
+
+        assert manage.cmd_hash(remote_cmd) == manage.cmd_hash(manage.roll_cmd)
+
+
+    def test_detects_change(self):
+        changed_cmd = deepcopy(manage.roll_cmd)
+        changed_cmd['options'][0]['max_length'] = 200
+
+        assert manage.cmd_hash(changed_cmd) != manage.cmd_hash(manage.roll_cmd)
+
+
+class TestSyncGlobalAppCmds:
+
+    def test_initial_sync(self, discord_api: FakeDiscordApi):
+        plan = manage.sync_global_app_cmds(APP_ID, manage.GLOBAL_APP_CMDS)
+
+        assert plan.added == ['roll', 'askroll']
+        assert [method for method, _ in discord_api.requests] == ['GET', 'PUT']
+        assert [cmd['name'] for cmd in discord_api.cmds] == ['roll', 'askroll']
+
+
+    def test_nothing_to_sync(self, discord_api: FakeDiscordApi):
+        manage.sync_global_app_cmds(APP_ID, manage.GLOBAL_APP_CMDS)
+        discord_api.requests.clear()
+
+        plan = manage.sync_global_app_cmds(APP_ID, manage.GLOBAL_APP_CMDS)
+
+        assert plan.in_sync
+        assert plan.unchanged == ['roll', 'askroll']
+        assert [method for method, _ in discord_api.requests] == ['GET']
+
+
+    def test_changed_and_removed(self, discord_api: FakeDiscordApi):
+        stale_roll_cmd = deepcopy(manage.roll_cmd)
+        stale_roll_cmd['description'] = 'Old description'
+        discord_api._put([stale_roll_cmd, {'name': 'old', 'description': 'Gone'}])
+
+        plan = manage.sync_global_app_cmds(APP_ID, manage.GLOBAL_APP_CMDS)
+
+        assert plan.changed == ['roll']
+        assert plan.removed == ['old']
+        assert plan.added == ['askroll']
+        assert [cmd['name'] for cmd in discord_api.cmds] == ['roll', 'askroll']
+
+
+    def test_dry_run(self, discord_api: FakeDiscordApi, capsys):
+        manage.main(['--dry-run'])
+
+        assert [method for method, _ in discord_api.requests] == ['GET']
+        assert 'Added: roll, askroll' in capsys.readouterr().out
@@ -0,0 +1,143 @@
+from array import array
+import random
+
+from discord_lab.dice import BulkDieRoll, DieExpr, DieExprMultiRoll, DieExprMultiRollType, DieExprRoll, DieRoll, DieType, IntTermOperationResult, LabeledTerm, MultiDie, MultiDieRoll, MultiDieTermOperationResult, Operation, TermOperation
+from discord_lab.interactions.render import CONTENT_MAX_LEN, DIE_FACE_EMOJIS, EMOJI_ID_BY_CODE, RenderMode, die_roll_to_md, estimate_expr_roll_len, estimate_multi_roll_len, plan_render_mode, render_expr_roll, render_multi_roll_results
+
+
+# Renderer as it was before the precomputed emoji table, kept to check output is unchanged
+def reference_die_roll_to_md(roll: DieRoll) -> str:
+    if roll.type == DieType.D100:
+        if roll.value == 100:
+            tens_emoji_id = EMOJI_ID_BY_CODE["D10_00"]
+            ones_emoji_id = EMOJI_ID_BY_CODE["D10_0"]
+        else:
+            tens_val, ones_val = divmod(roll.value, 10)
+            tens_val *= 10
+
+            tens_emoji_id = EMOJI_ID_BY_CODE[f"D10_{tens_val}"] if tens_val else EMOJI_ID_BY_CODE["D10_00"]
+            ones_emoji_id = EMOJI_ID_BY_CODE[f"D10_{ones_val}"]
+
+        return tens_emoji_id + ones_emoji_id
+
+    return EMOJI_ID_BY_CODE[f"{roll.type.name}_{roll.value}"]
+
+
+def reference_render_multidie_roll(rolls: MultiDieRoll, include_total: bool) -> str:
+    if len(rolls.details) == 1:
+        return reference_die_roll_to_md(rolls.details[0])
+
+    die_md = ' '.join([reference_die_roll_to_md(roll) for roll in rolls.details])
+    if include_total:
+        die_md += f' {rolls.value}'
+    return die_md
+
+
+def reference_render_expr_roll(rolls: DieExprRoll, include_total: bool) -> str:
+    roll_results = rolls.results
+
+    if len(roll_results) == 1:
+        single_result = roll_results[0]
+        if isinstance(single_result, MultiDieTermOperationResult) and len(single_result.rolls.details) == 1:
+            return reference_die_roll_to_md(single_result.rolls.details[0])
+
+    rr_mds = []
+    for rr in roll_results:
+        if isinstance(rr, MultiDieTermOperationResult):
+            rr_md = reference_render_multidie_roll(rr.rolls, len(roll_results) > 1)
+        else:
+            rr_md = str(rr.value)
+
+        op_symbol = rr.term_op.operation.value
+        if op_symbol:
+            rr_md = f"{op_symbol} {rr_md}"
+
+        label = rr.term_op.labeled_term.label
+        if label:
+            rr_md += f" ({label})"
+
+        rr_mds.append(rr_md)
+
+    md = " ".join(rr_mds)
+    if include_total:
+         md += f"\n# {rolls.value}"
+
+    return md
+
+
+class TestDieFaceEmojis:
+
+    def test_every_face_matches_reference(self):
+        for die_type in DieType:
+            for value in range(1, die_type + 1):
+                assert die_roll_to_md(DieRoll(value, die_type)) == reference_die_roll_to_md(DieRoll(value, die_type))
+
+        assert DIE_FACE_EMOJIS[DieType.D100][42] == '<:d10_40:1282474836551139380><:d10_2:1282232090938708035>'
+
+
+class TestRenderExprRoll:
+
+    def test_matches_reference(self):
+        rng = random.Random(8)
+        die_exprs = [
+            DieExpr.parse(expr_str)
+            for expr_str in ['D20', '3', 'D100', '100D6', '2D6 (Sword) - 2 (STR) + D4 (Acid)', '10D100 - 3D6 + 4', 'D8 - D8 (x)']
+        ]
+
+        for die_expr in die_exprs:
+            for _ in range(20):
+                die_expr_roll = die_expr.roll()
+                for include_total in [True, False]:
+                    assert render_expr_roll(die_expr_roll, include_total) == reference_render_expr_roll(die_expr_roll, include_total)
+
+
+    def test_bulk_roll_matches_per_die_roll(self):
+        values = array('B', [3, 1, 6])
+        term_op = TermOperation(Operation.NO_OP, LabeledTerm(MultiDie(DieType.D6, 3), 'Fire'))
+        int_result = IntTermOperationResult(2, TermOperation(Operation.ADD, LabeledTerm(2)))
+
+        bulk_md = render_expr_roll(DieExprRoll(12, [MultiDieTermOperationResult(10, term_op, BulkDieRoll(DieType.D6, values)), int_result]), True)
+        per_die_md = render_expr_roll(DieExprRoll(12, [MultiDieTermOperationResult(10, term_op, MultiDieRoll(10, [DieRoll(v, DieType.D6) for v in values])), int_result]), True)
+
+        assert bulk_md == per_die_md
+        assert bulk_md == '<:d6_3:1282212272265232448> <:d6_1:1282212244398276640> <:d6_6:1282212638297817198> 10 (Fire) + 2\n# 12'
+
+
+class TestRenderModes:
+
+    def test_grouped(self):
+        rolls = MultiDieRoll(29, [DieRoll(v, DieType.D6) for v in [6, 5, 6, 6, 5, 1]])
+        die_expr_roll = DieExprRoll(29, [MultiDieTermOperationResult(29, TermOperation(Operation.NO_OP, LabeledTerm(MultiDie(DieType.D6, 6))), rolls)])
+
+        assert render_expr_roll(die_expr_roll, True, RenderMode.GROUPED) == (
+            '3×<:d6_6:1282212638297817198> 2×<:d6_5:1282212308982169653> 1×<:d6_1:1282212244398276640>\n# 29'
+        )
+
+
+    def test_totals(self):
+        die_expr_roll = DieExprRoll(1747, [
+            MultiDieTermOperationResult(1745, TermOperation(Operation.NO_OP, LabeledTerm(MultiDie(DieType.D6, 349), 'Fire')), BulkDieRoll(DieType.D6, array('B', [5] * 349))),
+            IntTermOperationResult(2, TermOperation(Operation.ADD, LabeledTerm(2))),
+        ])
+
+        assert render_expr_roll(die_expr_roll, True, RenderMode.TOTALS) == '349D6: 1745 (Fire) + 2\n# 1747'
+
+
+    def test_plan_render_mode(self):
+        assert plan_render_mode(DieExpr.parse('D20 + 2 (STR)'), CONTENT_MAX_LEN) == RenderMode.DICE
+        assert plan_render_mode(DieExpr.parse('40D6'), CONTENT_MAX_LEN) == RenderMode.DICE
+        assert plan_render_mode(DieExpr.parse('40D6'), CONTENT_MAX_LEN, multi_roll=True) == RenderMode.GROUPED
+        assert plan_render_mode(DieExpr.parse('500D6'), CONTENT_MAX_LEN) == RenderMode.GROUPED
+        assert plan_render_mode(DieExpr.parse('500D100'), CONTENT_MAX_LEN) == RenderMode.TOTALS
+
+
+    def test_estimates_are_upper_bounds(self):
+        for expr_str in ['D20', 'D100 (Percent)', '3D6 + 2', '60D6', '40D100 - 10D4 (x)', '100D20 + 20D12']:
+            die_expr = DieExpr.parse(expr_str)
+
+            for mode in RenderMode:
+                for _ in range(10):
+                    assert len(render_expr_roll(die_expr.roll(), True, mode)) <= estimate_expr_roll_len(die_expr, mode, True)
+
+                    multi_roll_results = DieExprMultiRoll(die_expr, DieExprMultiRollType.BEST).roll()
+                    assert len(render_multi_roll_results(multi_roll_results, mode)) <= estimate_multi_roll_len(die_expr, mode)
@@ -0,0 +1,89 @@
+import io
+import json
+
+import pytest
+
+from discord_lab.interactions.jsonio import InteractionBody, RawJson
+from discord_lab.interactions.request_log import REDACTED, RequestLogger, current_request_log, phase, redact
+
+
+def log_lines(stream: io.StringIO) -> list[dict]:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+class TestRequestLogger:
+
+    def test_one_line_per_request(self):
+        stream = io.StringIO()
+        logger = RequestLogger(stream=stream)
+
+        with logger.request() as log:
+            log.route = '2/roll'
+            log.status = 200
+            with log.phase('parse'):
+                pass
+            with phase('roll'):
+                pass
+            with phase('roll'):
+                pass
+
+        [line] = log_lines(stream)
+        assert line['route'] == '2/roll'
+        assert line['status'] == 200
+        assert set(line['phases_ms']) == {'parse', 'roll'}
+        assert 'payload' not in line
+        assert current_request_log.get() is None
+
+
+    def test_phase_outside_request(self):
+        with phase('roll'):
+            pass
+
+
+    def test_error_logged_and_raised(self):
+        stream = io.StringIO()
+
+        with pytest.raises(KeyError):
+            with RequestLogger(stream=stream).request():
+                raise KeyError('body')
+
+        assert log_lines(stream)[0]['error'] == "KeyError: 'body'"
+
+
+    def test_payload_sampling(self):
+        stream = io.StringIO()
+        rolls = iter([0.05, 0.5])
+        logger = RequestLogger(0.1, stream, lambda: next(rolls))
+
+        for _ in range(2):
+            with logger.request() as log:
+                log.attach_payload(headers={'X-Signature-Ed25519': 'abc'}, request={'id': '1', 'token': 'abc'})
+
+        sampled, unsampled = log_lines(stream)
+        assert sampled['payload'] == {'headers': {'X-Signature-Ed25519': REDACTED}, 'request': {'id': '1', 'token': REDACTED}}
+        assert 'payload' not in unsampled
+
+
+    def test_invalid_sample_rate(self):
+        with pytest.raises(ValueError):
+            RequestLogger(1.5)
+
+
+class TestRedact:
+
+    def test_nested(self):
+        payload = {'token': 'abc', 'data': {'components': [{'custom_id': 'roll_click', 'Authorization': 'Bot xyz'}]}}
+
+        assert redact(payload) == {'token': REDACTED, 'data': {'components': [{'custom_id': 'roll_click', 'Authorization': REDACTED}]}}
+
+
+    def test_interaction_body(self):
+        payload = {'request': InteractionBody('{"id": "1", "token": "abc", "data": {"name": "roll"}}')}
+
+        assert redact(payload) == {'request': {'id': '1', 'token': REDACTED, 'data': {'name': 'roll'}}}
+
+
+    def test_raw_json_response(self):
+        payload = {'response': RawJson('{"type": 4, "data": {"content": "# 7"}}')}
+
+        assert redact(payload) == {'response': {'type': 4, 'data': {'content': '# 7'}}}
@@ -0,0 +1,158 @@
+from discord_lab.interactions.rest import DiscordRestClient, route_key
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int = 200, body: dict|None = None, headers: dict[str,str]|None = None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+
+    def json(self) -> dict:
+        return self.body
+
+
+class FakeSession:
+
+    def __init__(self, responses: list[FakeResponse]):
+        self.responses = responses
+        self.requests: list[tuple[str, str, dict]] = []
+
+    def request(self, method: str, url: str, **kwargs) -> FakeResponse:
+        self.requests.append((method, url, kwargs))
+        return self.responses.pop(0)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, secs: float) -> None:
+        self.sleeps.append(secs)
+        self.now += secs
+
+
+def bucket_headers(remaining: int, reset_after: float, bucket: str = 'abc') -> dict[str,str]:
+    return {
+        'X-RateLimit-Bucket': bucket,
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Reset-After': str(reset_after),
+    }
+
+
+class TestDiscordRestClient:
+
+    def make_client(self, responses: list[FakeResponse], **kwargs) -> tuple[DiscordRestClient, FakeSession, FakeClock]:
+        session = FakeSession(responses)
+        clock = FakeClock()
+        sessions_made = []
+        def session_factory():
+            sessions_made.append(session)
+            return session
+
+        client = DiscordRestClient('https://discord.test/api', 5, session_factory=session_factory, clock=clock, sleep=clock.sleep, **kwargs) # type: ignore
+        self.sessions_made = sessions_made
+
+        return client, session, clock
+
+
+    def test_session_reused(self):
+        client, session, _ = self.make_client([FakeResponse(), FakeResponse()])
+
+        client.get('/applications/1/commands')
+        client.post('https://discord.test/oauth2/token', data={'a': 1})
+
+        assert len(self.sessions_made) == 1
+        assert session.requests[0] == ('GET', 'https://discord.test/api/applications/1/commands', {'timeout': 5})
+        assert session.requests[1] == ('POST', 'https://discord.test/oauth2/token', {'data': {'a': 1}, 'timeout': 5})
+
+
+    def test_429_retried_after_retry_after(self):
+        client, session, clock = self.make_client([
+            FakeResponse(429, {'retry_after': 1.5}),
+            FakeResponse(200, {'ok': True}),
+        ])
+
+        res = client.get('/applications/1/commands')
+
+        assert res.json() == {'ok': True}
+        assert clock.sleeps == [1.5]
+        assert client.stats.rate_limited == 1
+
+
+    def test_429_gives_up(self):
+        client, session, clock = self.make_client([FakeResponse(429, {'retry_after': 1})] * 3, max_retries=2)
+
+        assert client.get('/applications/1/commands').status_code == 429
+        assert len(session.requests) == 3
+
+
+    def test_waits_for_exhausted_bucket(self):
+        client, session, clock = self.make_client([
+            FakeResponse(200, headers=bucket_headers(0, 2.0)),
+            FakeResponse(200, headers=bucket_headers(4, 2.0)),
+            FakeResponse(200),
+        ])
+
+        client.get('/webhooks/1/token/messages/@original')
+        client.get('/webhooks/1/token/messages/@original')
+        # A different webhook is a different route, so isn't held up
+        client.get('/webhooks/2/token/messages/@original')
+
+        assert clock.sleeps == [2.0]
+        assert client.stats.bucket_waits == 1
+
+
+    def test_interaction_tokens_share_route(self):
+        client, session, clock = self.make_client([
+            FakeResponse(200, headers=bucket_headers(0, 2.0)),
+            FakeResponse(200),
+        ])
+
+        client.patch('/webhooks/1/token-a/messages/@original')
+        client.patch('/webhooks/1/token-b/messages/@original')
+
+        assert clock.sleeps == [2.0]
+        assert list(client._bucket_by_route) == ['PATCH /webhooks/1/:token/messages/@original']
+
+
+    def test_reset_buckets_pruned(self):
+        client, session, clock = self.make_client([
+            FakeResponse(200, headers=bucket_headers(4, 2.0, 'a')),
+            FakeResponse(200, headers=bucket_headers(4, 2.0, 'b')),
+            FakeResponse(200, headers=bucket_headers(4, 2.0, 'c')),
+        ])
+
+        client.get('/channels/1/messages')
+        client.get('/channels/2/messages')
+        clock.now += 120
+        client.get('/channels/3/messages')
+
+        assert list(client._buckets) == ['c']
+        assert list(client._bucket_by_route) == ['GET /channels/3/messages']
+
+
+    def test_global_rate_limit(self):
+        client, session, clock = self.make_client([
+            FakeResponse(429, {'retry_after': 3, 'global': True}, {'X-RateLimit-Global': 'true'}),
+            FakeResponse(200),
+        ])
+
+        client.get('/applications/1/commands')
+
+        # Waited once for the retry, and not again for the global limit that ended with it
+        assert clock.sleeps == [3]
+
+
+class TestRouteKey:
+
+    def test_major_params_kept(self):
+        assert route_key('get', '/channels/123/messages/456') == 'GET /channels/123/messages/:id'
+        assert route_key('GET', '/guilds/123/members/456') == 'GET /guilds/123/members/:id'
+        assert route_key('PATCH', '/webhooks/123/tok/messages/456') == 'PATCH /webhooks/123/:token/messages/:id'
+        assert route_key('DELETE', '/applications/123/commands/456') == 'DELETE /applications/:id/commands/:id'
@@ -0,0 +1,80 @@
+import pytest
+
+from discord_lab.interactions.router import InteractionRouter, InteractionType, route_key
+
+
+def component_click(cmd_name: str, custom_id: str) -> dict:
+    return {
+        'type': 3,
+        'message': {'interaction': {'id': '1', 'name': cmd_name}},
+        'data': {'custom_id': custom_id},
+    }
+
+
+class TestInteractionRouter:
+
+    def setup_method(self):
+        self.router = InteractionRouter()
+
+        @self.router.route(InteractionType.PING)
+        def ping(req_body):
+            return 200, {'type': 1}
+
+        @self.router.route(InteractionType.APPLICATION_COMMAND, 'roll')
+        def roll(req_body):
+            return 200, {'type': 4, 'data': {'content': 'rolled'}}
+
+        @self.router.route(InteractionType.MESSAGE_COMPONENT, 'askroll', 'roll_click')
+        def roll_click(req_body):
+            return 200, {'type': 7}
+
+        @self.router.route(InteractionType.MESSAGE_COMPONENT, 'askroll', 'broken')
+        def broken(req_body):
+            raise ValueError('Broken')
+
+
+    def test_dispatch(self):
+        assert self.router.dispatch({'type': 1}) == (200, {'type': 1})
+        assert self.router.dispatch({'type': 2, 'data': {'name': 'roll'}}) == (200, {'type': 4, 'data': {'content': 'rolled'}})
+        assert self.router.dispatch(component_click('askroll', 'roll_click')) == (200, {'type': 7})
+
+
+    def test_unknown_route(self):
+        res_code, res_body = self.router.dispatch(component_click('askroll', 'nope'))
+        assert res_code == 200
+        assert res_body['type'] == 4
+        assert res_body['data']['flags'] == 64
+
+        # Same custom_id on another command's message is another route
+        assert self.router.dispatch(component_click('roll', 'roll_click'))[1]['type'] == 4
+
+        assert self.router.dispatch({'type': 4, 'data': {'name': 'roll'}})[0] == 400
+        assert self.router.dispatch({'type': 99})[0] == 400
+
+
+    def test_duplicate_route(self):
+        with pytest.raises(ValueError):
+            self.router.add(InteractionType.APPLICATION_COMMAND, 'roll', None, lambda req_body: (200, {}))
+
+
+    def test_route_stats(self):
+        self.router.dispatch({'type': 2, 'data': {'name': 'roll'}})
+        self.router.dispatch({'type': 2, 'data': {'name': 'roll'}})
+        with pytest.raises(ValueError):
+            self.router.dispatch(component_click('askroll', 'broken'))
+
+        roll_stats = self.router.stats[(2, 'roll', None)]
+        assert roll_stats.count == 2
+        assert roll_stats.errors == 0
+        assert 0 < roll_stats.percentile_ms(50) <= roll_stats.percentile_ms(95)
+
+        assert self.router.stats[(3, 'askroll', 'broken')].errors == 1
+
+
+class TestRouteKey:
+
+    def test_route_key(self):
+        assert route_key({'type': 1}) == (1, None, None)
+        assert route_key({'type': 2, 'data': {'name': 'askroll'}}) == (2, 'askroll', None)
+        assert route_key(component_click('askroll', 'roll_click')) == (3, 'askroll', 'roll_click')
+        assert route_key({'type': 5, 'data': {'custom_id': 'adjust_roll_save'}}) == (5, None, 'adjust_roll_save')
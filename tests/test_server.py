@@ -0,0 +1,211 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import time
+
+from discord_lab.interactions.server import HttpServer, InteractionApp
+
+
+def echo_interaction(headers, req_body_str, flush_writes):
+    if headers.get('x-signature-ed25519') != 'ok':
+        return 401, 'invalid request signature'
+
+    return 200, json.dumps({'type': 4, 'data': {'content': req_body_str, 'flush_writes': flush_writes}})
+
+
+async def call(app: InteractionApp, method: str, path: str, body: bytes = b'', headers: list|None = None) -> tuple[int, dict, bytes]:
+    scope = {'type': 'http', 'method': method, 'path': path, 'headers': headers or []}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+
+    start, body_message = sent
+    return start['status'], dict(start['headers']), body_message['body']
+
+
+class TestInteractionApp:
+
+    def test_interaction(self):
+        app = InteractionApp(2, handle_interaction=echo_interaction)
+
+        status, headers, body = asyncio.run(call(app, 'POST', '/', b'{"type":1}', [(b'X-Signature-Ed25519', b'ok')]))
+
+        assert status == 200
+        assert headers[b'content-type'] == b'application/json'
+        assert json.loads(body)['data'] == {'content': '{"type":1}', 'flush_writes': False}
+        assert app.stats.requests == 1
+
+
+    def test_unverified(self):
+        app = InteractionApp(2, handle_interaction=echo_interaction)
+
+        assert asyncio.run(call(app, 'POST', '/', b'{}'))[0] == 401
+
+
+    def test_health_and_methods(self):
+        app = InteractionApp(2, handle_interaction=echo_interaction)
+
+        assert asyncio.run(call(app, 'GET', '/healthz'))[0] == 200
+        assert asyncio.run(call(app, 'GET', '/'))[0] == 405
+
+
+    def test_body_limit(self):
+        app = InteractionApp(2, max_body_bytes=10, handle_interaction=echo_interaction)
+
+        assert asyncio.run(call(app, 'POST', '/', b'x' * 11))[0] == 413
+
+
+    def test_handler_error(self):
+        def fail(headers, req_body_str, flush_writes):
+            raise KeyError('data')
+
+        app = InteractionApp(2, handle_interaction=fail)
+
+        assert asyncio.run(call(app, 'POST', '/', b'{}'))[0] == 500
+        assert app.stats.in_flight == 0
+
+
+    def test_sheds_load(self):
+        release = threading.Event()
+
+        def slow(headers, req_body_str, flush_writes):
+            release.wait(5)
+            return 200, '{}'
+
+        app = InteractionApp(1, max_in_flight=1, handle_interaction=slow)
+
+        async def run():
+            first = asyncio.create_task(call(app, 'POST', '/', b'{}'))
+            await asyncio.sleep(0.05)
+            second = await call(app, 'POST', '/', b'{}')
+            release.set()
+            return (await first)[0], second[0]
+
+        assert asyncio.run(run()) == (200, 503)
+        assert app.stats.rejected == 1
+
+
+    def test_shutdown_flushes_writes(self):
+        flushes = []
+        app = InteractionApp(2, handle_interaction=echo_interaction, flush_writes=lambda timeout: flushes.append(timeout) or True)
+
+        async def run():
+            await call(app, 'POST', '/', b'{}')
+            await app.shutdown(1.5)
+
+        asyncio.run(run())
+
+        assert flushes == [1.5]
+
+
+    def test_lifespan(self):
+        enabled = []
+        app = InteractionApp(2, handle_interaction=echo_interaction, flush_writes=lambda timeout: True, enable_deferral=lambda: enabled.append(True))
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(app({'type': 'lifespan'}, receive, send))
+
+        assert enabled == [True]
+        assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+
+class TestHttpServer:
+
+    def setup_method(self):
+        self.flushes = []
+        self.deferral_enabled = []
+        self.app = InteractionApp(2, handle_interaction=echo_interaction, flush_writes=lambda timeout: self.flushes.append(timeout) or True, enable_deferral=lambda: self.deferral_enabled.append(True))
+        self.loop = asyncio.new_event_loop()
+        self.server = HttpServer(self.app, '127.0.0.1', 0, keepalive_secs=5)
+        self.loop.run_until_complete(self.server.start())
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+
+    def teardown_method(self):
+        asyncio.run_coroutine_threadsafe(self.server.shutdown(1), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+
+
+    def test_deferral_enabled(self):
+        assert self.deferral_enabled == [True]
+
+
+    def test_keep_alive(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+
+        for i in range(3):
+            conn.request('POST', '/interactions', body=json.dumps({'id': i}), headers={'X-Signature-Ed25519': 'ok'})
+            res = conn.getresponse()
+
+            assert res.status == 200
+            assert json.loads(res.read())['data']['content'] == json.dumps({'id': i})
+
+        conn.close()
+
+        assert self.app.stats.connections == 1
+        assert self.app.stats.requests == 3
+
+
+    def test_connection_close(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+        conn.request('POST', '/', body='{}', headers={'X-Signature-Ed25519': 'ok', 'Connection': 'close'})
+        res = conn.getresponse()
+
+        assert res.status == 200
+        assert res.getheader('connection') == 'close'
+
+
+    def test_chunked_rejected(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+        conn.request('POST', '/', body=iter([b'{}']), headers={'Transfer-Encoding': 'chunked'})
+
+        assert conn.getresponse().status == 411
+
+
+    def test_negative_content_length(self):
+        with socket.create_connection(('127.0.0.1', self.server.port), timeout=5) as sock:
+            sock.sendall(b'POST / HTTP/1.1\r\nContent-Length: -5\r\n\r\n')
+
+            assert sock.recv(1024).startswith(b'HTTP/1.1 400 ')
+
+
+    def test_slow_body_timed_out(self):
+        self.server.keepalive_secs = 0.2
+
+        with socket.create_connection(('127.0.0.1', self.server.port), timeout=5) as sock:
+            sock.sendall(b'POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\n{')
+
+            assert sock.recv(1024).startswith(b'HTTP/1.1 408 ')
+            assert sock.recv(1024) == b''
+
+        assert self.app.stats.requests == 0
+
+
+    def test_shutdown_closes_idle_connections(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+        conn.request('GET', '/healthz')
+        conn.getresponse().read()
+
+        start = time.monotonic()
+        asyncio.run_coroutine_threadsafe(self.server.shutdown(1), self.loop).result(5)
+
+        assert time.monotonic() - start < 1
+        assert self.flushes
@@ -0,0 +1,117 @@
+from botocore.exceptions import ClientError
+import pytest
+
+from discord_lab.interactions.storage import InMemoryDynamoDB
+
+TABLE = 'rollit-askroll-queue'
+KEY = {'interaction_id': {'N': '1'}}
+ITEM = {**KEY, 'die_expr': {'S': 'D20'}, 'version': {'N': '1'}}
+
+
+def error_code(excinfo: pytest.ExceptionInfo[ClientError]) -> str:
+    return excinfo.value.response['Error']['Code']
+
+
+class TestInMemoryDynamoDB:
+
+    def setup_method(self):
+        self.db = InMemoryDynamoDB()
+
+
+    def test_put_get(self):
+        self.db.put_item(TableName=TABLE, Item=ITEM)
+
+        assert self.db.get_item(TableName=TABLE, Key=KEY, ConsistentRead=True) == {'Item': ITEM}
+        assert self.db.get_item(TableName=TABLE, Key={'interaction_id': {'N': '2'}}) == {}
+
+
+    def test_items_not_shared_with_caller(self):
+        item = {**KEY, 'special_roll_types': {'SS': ['BEST']}}
+        self.db.put_item(TableName=TABLE, Item=item)
+        item['special_roll_types']['SS'].append('WORST')
+
+        stored = self.db.get_item(TableName=TABLE, Key=KEY)['Item']
+        stored['special_roll_types']['SS'].clear()
+
+        assert self.db.get_item(TableName=TABLE, Key=KEY)['Item']['special_roll_types'] == {'SS': ['BEST']}
+
+
+    def test_update(self):
+        self.db.put_item(TableName=TABLE, Item=ITEM)
+        self.db.update_item(
+            TableName=TABLE,
+            Key=KEY,
+            AttributeUpdates={
+                'player_roll_adjust': {'Value': {'S': '+2'}, 'Action': 'PUT'},
+                'die_expr': {'Action': 'DELETE'},
+            },
+        )
+
+        assert self.db.get_item(TableName=TABLE, Key=KEY)['Item'] == {**KEY, 'version': {'N': '1'}, 'player_roll_adjust': {'S': '+2'}}
+
+
+    def test_update_creates_missing_item(self):
+        self.db.update_item(TableName=TABLE, Key=KEY, AttributeUpdates={'player_roll_adjust': {'Value': {'S': '+2'}, 'Action': 'PUT'}})
+
+        assert self.db.get_item(TableName=TABLE, Key=KEY)['Item'] == {**KEY, 'player_roll_adjust': {'S': '+2'}}
+
+
+    def test_update_expected(self):
+        self.db.put_item(TableName=TABLE, Item=ITEM)
+        updates = {'version': {'Value': {'N': '2'}, 'Action': 'PUT'}}
+
+        self.db.update_item(TableName=TABLE, Key=KEY, AttributeUpdates=updates, Expected={'version': {'Value': {'N': '1'}}})
+        with pytest.raises(ClientError) as excinfo:
+            self.db.update_item(TableName=TABLE, Key=KEY, AttributeUpdates=updates, Expected={'version': {'Value': {'N': '1'}}})
+
+        assert error_code(excinfo) == 'ConditionalCheckFailedException'
+        assert self.db.stats.conditional_check_failures == 1
+
+
+    def test_get_projected(self):
+        self.db.put_item(TableName=TABLE, Item=ITEM)
+
+        item = self.db.get_item(TableName=TABLE, Key=KEY, ProjectionExpression='#a0, die_expr', ExpressionAttributeNames={'#a0': 'version'})['Item']
+
+        assert item == {'die_expr': {'S': 'D20'}, 'version': {'N': '1'}}
+
+
+    def test_batch_get(self):
+        for i in range(3):
+            self.db.put_item(TableName=TABLE, Item={'interaction_id': {'N': str(i)}, 'die_expr': {'S': f'D{i}'}})
+
+        keys = [{'interaction_id': {'N': str(i)}} for i in range(5)]
+        response = self.db.batch_get_item(RequestItems={TABLE: {'Keys': keys, 'ProjectionExpression': 'die_expr'}})
+
+        assert response['Responses'][TABLE] == [{'die_expr': {'S': f'D{i}'}} for i in range(3)]
+
+
+    def test_unknown_table(self):
+        with pytest.raises(ClientError) as excinfo:
+            self.db.get_item(TableName='nope', Key=KEY)
+
+        assert error_code(excinfo) == 'ResourceNotFoundException'
+
+
+    def test_injected_errors(self):
+        db = InMemoryDynamoDB(error_rate=0.5, seed=1)
+
+        errors = 0
+        for _ in range(200):
+            try:
+                db.put_item(TableName=TABLE, Item=ITEM)
+            except ClientError as e:
+                assert e.response['Error']['Code'] == 'ProvisionedThroughputExceededException'
+                errors += 1
+
+        assert 60 < errors < 140
+        assert db.stats.injected_errors == errors
+
+
+    def test_injected_latency(self):
+        db = InMemoryDynamoDB(latency_secs=0.01, latency_jitter_secs=0.01, seed=1)
+
+        db.put_item(TableName=TABLE, Item=ITEM)
+        db.get_item(TableName=TABLE, Key=KEY)
+
+        assert 0.02 <= db.stats.latency_secs <= 0.04
@@ -0,0 +1,64 @@
+import pytest
+
+from discord_lab.interactions import jsonio
+from discord_lab.interactions.aws_lambda import ADJUST_ROLL_MODAL, ASKROLL_RESPONSE
+from discord_lab.interactions.jsonio import dumps
+from discord_lab.interactions.templates import JsonTemplate, Slot
+
+ASKROLL_VALUES = {
+    'description': 'Sneak "quietly"\npast the guard ⚔',
+    'image': {'url': 'https://cdn.discordapp.com/attachments/1/2/map.png'},
+    'fields': [{'name': 'Player', 'value': '<@6>', 'inline': True}, {'name': 'Must Beat', 'value': 12, 'inline': True}],
+    'special_roll_types_custom_id': 'special_roll_types:abc~6~-~12~D20~',
+    'roll_click_custom_id': 'roll_click:abc~6~-~12~D20~',
+    'adjust_roll_click_custom_id': 'adjust_roll_click:abc~6~-~12~D20~',
+}
+
+
+class TestJsonTemplate:
+
+    def test_render_matches_dumps(self):
+        template = JsonTemplate({'type': 4, 'data': {'content': Slot('content'), 'flags': 64, 'embeds': [Slot('embed'), {'color': 1}]}})
+
+        for content in ['plain', 'with "quotes" and \\ and \n\t\x01', '🎲 ünïcode', '', None, 17, True, ['a', {'b': None}]]:
+            values = {'content': content, 'embed': {'description': content}}
+            assert template.render(**values) == dumps(template.fill(**values))
+
+
+    def test_slots(self):
+        template = JsonTemplate({'a': Slot('x'), 'b': [Slot('y'), Slot('x')]})
+
+        assert template.slots == ['x', 'y', 'x']
+        assert template.fragments == ['{"a":', ',"b":[', ',', ']}']
+        assert template.render(x=1, y='2') == '{"a":1,"b":["2",1]}'
+
+
+    def test_no_slots(self):
+        template = JsonTemplate({'type': 1})
+
+        assert template.render() == '{"type":1}'
+        assert template.fill() == {'type': 1}
+
+
+    def test_missing_value(self):
+        with pytest.raises(KeyError):
+            JsonTemplate({'a': Slot('x')}).render()
+
+
+    def test_stdlib_backend(self, monkeypatch):
+        monkeypatch.setattr(jsonio, 'orjson', None)
+        template = JsonTemplate({'a': Slot('x'), 'b': [1, 'two']})
+
+        assert template.render(x={'y': 'ü'}) == '{"a":{"y":"ü"},"b":[1,"two"]}'
+
+
+class TestAskRollTemplates:
+
+    def test_askroll_response(self):
+        assert ASKROLL_RESPONSE.render(**ASKROLL_VALUES) == dumps(ASKROLL_RESPONSE.fill(**ASKROLL_VALUES))
+        assert ASKROLL_RESPONSE.render(**{**ASKROLL_VALUES, 'image': None, 'description': None}) == dumps(ASKROLL_RESPONSE.fill(**{**ASKROLL_VALUES, 'image': None, 'description': None}))
+
+
+    def test_adjust_roll_modal(self):
+        for value in ['+2 (Bless) -1 (Wisdom)', None]:
+            assert ADJUST_ROLL_MODAL.render(custom_id='adjust_roll_save', value=value) == dumps(ADJUST_ROLL_MODAL.fill(custom_id='adjust_roll_save', value=value))
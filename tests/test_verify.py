@@ -0,0 +1,72 @@
+from nacl.signing import SigningKey
+
+from discord_lab.interactions.verify import RequestVerifier, VerifyResult
+
+NOW = 1_700_000_000
+
+
+def signed_headers(signing_key: SigningKey, body: str, timestamp: int = NOW) -> dict[str,str]:
+    signature = signing_key.sign(f'{timestamp}{body}'.encode()).signature
+
+    return {
+        'x-signature-ed25519': signature.hex(),
+        'x-signature-timestamp': str(timestamp),
+    }
+
+
+class TestRequestVerifier:
+
+    def setup_method(self):
+        self.signing_key = SigningKey.generate()
+        self.verifier = RequestVerifier(self.signing_key.verify_key.encode().hex(), max_skew_secs=60, clock=lambda: NOW)
+
+
+    def test_valid_signature(self):
+        body = '{"type":1}'
+
+        assert self.verifier.verify(signed_headers(self.signing_key, body), body) == VerifyResult.OK
+        assert self.verifier.stats.verified == 1
+        assert self.verifier.stats.rejected == 0
+
+
+    def test_key_built_once(self):
+        body = '{"type":1}'
+        self.verifier.verify(signed_headers(self.signing_key, body), body)
+        verify_key = self.verifier.verify_key
+        self.verifier.verify(signed_headers(self.signing_key, body), body)
+
+        assert self.verifier.verify_key is verify_key
+
+
+    def test_bad_signature(self):
+        headers = signed_headers(self.signing_key, '{"type":1}')
+
+        assert self.verifier.verify(headers, '{"type":2}') == VerifyResult.BAD_SIGNATURE
+        assert self.verifier.stats.rejected == 1
+
+
+    def test_stale_timestamp_rejected_before_crypto(self):
+        body = '{"type":1}'
+        headers = signed_headers(self.signing_key, body, NOW - 61)
+
+        assert self.verifier.verify(headers, body) == VerifyResult.STALE
+        assert self.verifier._verify_key is None
+
+
+    def test_future_timestamp_rejected(self):
+        body = '{"type":1}'
+        headers = signed_headers(self.signing_key, body, NOW + 61)
+
+        assert self.verifier.verify(headers, body) == VerifyResult.STALE
+
+
+    def test_malformed_headers(self):
+        body = '{"type":1}'
+        valid_headers = signed_headers(self.signing_key, body)
+
+        assert self.verifier.verify({}, body) == VerifyResult.MALFORMED
+        assert self.verifier.verify({**valid_headers, 'x-signature-timestamp': 'yesterday'}, body) == VerifyResult.MALFORMED
+        assert self.verifier.verify({**valid_headers, 'x-signature-ed25519': 'zz'}, body) == VerifyResult.MALFORMED
+        assert self.verifier.verify({**valid_headers, 'x-signature-ed25519': 'abcd'}, body) == VerifyResult.MALFORMED
+        assert self.verifier.stats.results[VerifyResult.MALFORMED] == 4
+        assert self.verifier.stats.verify_ns > 0
@@ -0,0 +1,175 @@
+from threading import Event
+
+import pytest
+
+from discord_lab.interactions.write_behind import WriteBehindQueue, WriteOp
+
+TABLE = 'rollit-askroll-queue'
+KEY = {'interaction_id': {'N': '1'}}
+
+
+class FakeDynamoDBClient:
+
+    def __init__(self, fail_times: int = 0):
+        self.calls: list[tuple[str, dict]] = []
+        self.fail_times = fail_times
+        self.release = Event()
+        self.release.set()
+
+    def put_item(self, **kwargs):
+        self._call('put_item', kwargs)
+
+    def update_item(self, **kwargs):
+        self._call('update_item', kwargs)
+
+    def _call(self, operation: str, kwargs: dict):
+        self.release.wait()
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError('Throttled')
+
+        self.calls.append((operation, kwargs))
+
+
+class TestWriteOp:
+
+    def test_update_folds_into_put(self):
+        put = WriteOp(TABLE, KEY, {**KEY, 'die_expr': {'S': 'D20'}, 'must_beat': {'N': '10'}})
+        update = WriteOp(TABLE, KEY, None, {
+            'special_roll_types': {'Value': {'SS': ['BEST']}, 'Action': 'PUT'},
+            'must_beat': {'Action': 'DELETE'},
+        })
+
+        assert put.merge(update).item == {**KEY, 'die_expr': {'S': 'D20'}, 'special_roll_types': {'SS': ['BEST']}}
+
+
+    def test_later_update_wins(self):
+        first = WriteOp(TABLE, KEY, None, {'player_roll_adjust': {'Value': {'S': '+1'}, 'Action': 'PUT'}})
+        second = WriteOp(TABLE, KEY, None, {'player_roll_adjust': {'Value': {'S': '+2'}, 'Action': 'PUT'}})
+
+        merged = first.merge(second)
+        assert merged.item is None
+        assert merged.attr_updates == {'player_roll_adjust': {'Value': {'S': '+2'}, 'Action': 'PUT'}}
+
+
+    def test_adds_coalesced(self):
+        bump = {'version': {'Value': {'N': '1'}, 'Action': 'ADD'}}
+        put = WriteOp(TABLE, KEY, {**KEY, 'version': {'N': '1'}})
+        update = WriteOp(TABLE, KEY, None, bump)
+
+        assert put.merge(update).item == {**KEY, 'version': {'N': '2'}}
+        assert update.merge(update).attr_updates == {'version': {'Value': {'N': '2'}, 'Action': 'ADD'}}
+        assert WriteOp(TABLE, KEY, None, {'version': {'Value': {'N': '3'}, 'Action': 'PUT'}}).merge(update).attr_updates == {'version': {'Value': {'N': '4'}, 'Action': 'PUT'}}
+        assert WriteOp(TABLE, KEY, None, {'version': {'Action': 'DELETE'}}).merge(update).attr_updates == {'version': {'Value': {'N': '1'}, 'Action': 'PUT'}}
+
+
+    def test_uncoalescable_action(self):
+        with pytest.raises(ValueError):
+            WriteOp(TABLE, KEY, None, {'special_roll_types': {'Value': {'SS': ['BEST']}, 'Action': 'ADD'}})
+
+
+class TestWriteBehindQueue:
+
+    def test_writes_flushed(self):
+        client = FakeDynamoDBClient()
+        queue = WriteBehindQueue(lambda: client)
+
+        queue.put_item(TABLE, {**KEY, 'die_expr': {'S': 'D20'}}, 'interaction_id')
+        assert queue.flush(5)
+
+        assert client.calls == [('put_item', {'TableName': TABLE, 'Item': {**KEY, 'die_expr': {'S': 'D20'}}})]
+        assert queue.stats.written == 1
+        assert queue.pending_count() == 0
+
+
+    def test_pending_writes_coalesced(self):
+        client = FakeDynamoDBClient()
+        client.release.clear()
+        queue = WriteBehindQueue(lambda: client)
+
+        # Hold the first write in flight, so the rest pile up behind it
+        queue.put_item(TABLE, {'interaction_id': {'N': '0'}}, 'interaction_id')
+        queue.put_item(TABLE, {**KEY, 'die_expr': {'S': 'D20'}}, 'interaction_id')
+        queue.update_item(TABLE, KEY, {'player_roll_adjust': {'Value': {'S': '+1'}, 'Action': 'PUT'}})
+        queue.update_item(TABLE, KEY, {'player_roll_adjust': {'Value': {'S': '+2'}, 'Action': 'PUT'}})
+        assert not queue.flush(0.01)
+
+        client.release.set()
+        assert queue.flush(5)
+
+        assert client.calls[1] == ('put_item', {'TableName': TABLE, 'Item': {**KEY, 'die_expr': {'S': 'D20'}, 'player_roll_adjust': {'S': '+2'}}})
+        assert len(client.calls) == 2
+        assert queue.stats.coalesced == 2
+        assert queue.stats.flush_timeouts == 1
+
+
+    def test_failed_write_retried(self):
+        client = FakeDynamoDBClient(fail_times=3)
+        slept: list[float] = []
+        queue = WriteBehindQueue(lambda: client, max_attempts=4, retry_backoff_secs=0.1, max_retry_backoff_secs=0.3, sleep=slept.append)
+
+        queue.update_item(TABLE, KEY, {'player_roll_adjust': {'Value': {'S': '+1'}, 'Action': 'PUT'}})
+        assert queue.flush(5)
+
+        assert len(client.calls) == 1
+        assert queue.stats.retried == 3
+        assert queue.stats.dropped == 0
+        assert slept == [0.1, 0.2, 0.3]
+
+
+    def test_failed_write_dropped(self):
+        client = FakeDynamoDBClient(fail_times=5)
+        slept: list[float] = []
+        queue = WriteBehindQueue(lambda: client, max_attempts=2, sleep=slept.append)
+
+        queue.update_item(TABLE, KEY, {'player_roll_adjust': {'Value': {'S': '+1'}, 'Action': 'PUT'}})
+        assert queue.flush(5)
+
+        assert client.calls == []
+        assert queue.stats.dropped == 1
+        assert len(slept) == 1
+        assert queue.stats.flush_ms(50) >= 0
+
+
+    def test_take_unflushed(self):
+        client = FakeDynamoDBClient()
+        client.release.clear()
+        queue = WriteBehindQueue(lambda: client)
+
+        queue.put_item(TABLE, {**KEY, 'die_expr': {'S': 'D20'}}, 'interaction_id')
+        queue.put_item(TABLE, {'interaction_id': {'N': '2'}, 'die_expr': {'S': 'D6'}}, 'interaction_id')
+        assert not queue.flush(0.05)
+
+        # The write that's stuck in flight is taken too, since it may never finish
+        ops = queue.take_unflushed()
+        assert [op.key for op in ops] == [KEY, {'interaction_id': {'N': '2'}}]
+        assert queue.stats.taken == 2
+
+        client.release.set()
+        assert queue.flush(5)
+        assert len(client.calls) == 1
+
+
+    def test_conflict_handed_to_on_conflict(self):
+        class ConditionalCheckFailed(Exception):
+            response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+        class ConflictingClient(FakeDynamoDBClient):
+            def update_item(self, **kwargs):
+                if 'Expected' in kwargs:
+                    raise ConditionalCheckFailed()
+                super().update_item(**kwargs)
+
+        client = ConflictingClient()
+        conflicts: list[WriteOp] = []
+        def on_conflict(op: WriteOp) -> WriteOp:
+            conflicts.append(op)
+            return WriteOp(op.table, op.key, None, op.attr_updates, None, op.attempts)
+
+        queue = WriteBehindQueue(lambda: client, on_conflict=on_conflict)
+        queue.update_item(TABLE, KEY, {'player_roll_adjust': {'Value': {'S': '+1'}, 'Action': 'PUT'}}, {'version': {'Value': {'N': '1'}}})
+        assert queue.flush(5)
+
+        assert len(conflicts) == 1
+        assert client.calls == [('update_item', {'TableName': TABLE, 'Key': KEY, 'AttributeUpdates': {'player_roll_adjust': {'Value': {'S': '+1'}, 'Action': 'PUT'}}})]
+        assert queue.stats.conflicts == 1